@@ -2,23 +2,38 @@ from dotenv import load_dotenv
 import os
 import json
 import sys
+import gzip
+import time
 import secrets
 import subprocess
 import threading
 from threading import Lock
 from pathlib import Path
 from datetime import datetime
+import click
 import psycopg2
-from psycopg2.extras import DictCursor
-from flask import Flask, render_template, jsonify, request, session
-from functools import lru_cache, wraps
+from psycopg2.extras import DictCursor, execute_values
+from flask import Flask, render_template, jsonify, request, session, Response, has_request_context
+from functools import wraps
+from markupsafe import Markup
 
 # 共通ヘルパー関数をインポート
 PROJECT_ROOT = Path(__file__).resolve().parent
 # .envファイルを読み込む（PROJECT_ROOTを明示的に指定）
 load_dotenv(dotenv_path=PROJECT_ROOT / '.env')
 sys.path.insert(0, str(PROJECT_ROOT / 'scripts'))
-from utils.db_helpers import normalize_alien_row, is_special_skill
+from utils.db_helpers import normalize_alien_row, parse_requirement_details, REQUIREMENT_PATTERN
+from utils.catalog_cache import CatalogCache
+from utils.catalog_index import CatalogIndex
+from utils.snapshot_file import (
+    MappedSnapshot, content_version, write_snapshot, publish_snapshot, load_latest_snapshot, latest_snapshot_path,
+    latest_pointer_token
+)
+from utils.static_export import export_static_site
+from utils.data_access import PostgresCatalogReader, SqliteCatalogReader
+from utils.effect_records import EffectRecord, dump_alien_effects, dump_effects_by_key
+from utils.backup_store import BackupStore
+from utils import change_journal as journal
 
 app = Flask(__name__)
 
@@ -42,6 +57,15 @@ def _strtobool(value: str) -> bool:
     return str(value).strip().lower() in {'1', 'true', 'yes', 'on'}
 
 
+def _env_seconds(name: str, default):
+    """秒数指定の環境変数を読み込む（未設定ならdefault、0以下なら無制限としてNone）"""
+    value = os.environ.get(name)
+    if value is None or not value.strip():
+        return default
+    seconds = float(value)
+    return seconds if seconds > 0 else None
+
+
 def build_scraper_subprocess_env() -> dict:
     """
     管理モードからスクレイピングスクリプトを起動する際に必要な環境変数を整備
@@ -125,104 +149,141 @@ def get_db_connection():
     conn_str = os.environ.get('DATABASE_URL')
     if not conn_str:
         raise ValueError("環境変数 'DATABASE_URL' が設定されていません。")
-    return psycopg2.connect(conn_str, sslmode='require', cursor_factory=DictCursor)
+    # DB障害時に接続待ちで長時間ブロックしないようタイムアウトを設定
+    connect_timeout = int(os.environ.get('DATABASE_CONNECT_TIMEOUT', '10'))
+    return psycopg2.connect(conn_str, sslmode='require', cursor_factory=DictCursor,
+                            connect_timeout=connect_timeout)
 
-@lru_cache(maxsize=None)
-def get_all_aliens():
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=DictCursor)
+# 読み取りレプリカ（DATABASE_READ_URL）の遅延許容秒数と、書き込み後にプライマリから読む秒数
+DATABASE_READ_MAX_LAG_SECONDS = float(os.environ.get('DATABASE_READ_MAX_LAG_SECONDS', '30'))
+DATABASE_READ_AFTER_WRITE_SECONDS = float(os.environ.get('DATABASE_READ_AFTER_WRITE_SECONDS', '60'))
+_last_primary_write_at = None  # time.monotonic() 基準（プロセス内）
+
+def note_primary_write():
+    """
+    プライマリへの書き込みを記録する（書き込み後の読み取りをプライマリへ向けるため）
     
-    # ！！！ (★修正★) 判定と表示に必要なカラムをすべてSELECTする ！！！
-    cur.execute("""
-        SELECT 
-            id, name, attribute, affiliation, attack_range, attack_area, 
-            role, type_1, type_2, type_3, type_4, 
-            skill_no1, skill_text1, skill_no2, skill_text2, skill_no3, skill_text3,
-            hp, power, motivation, size, speed, "S_Skill", "S_Skill_text" 
-        FROM alien 
-        ORDER BY id
-    """)
-    aliens = cur.fetchall()
-    cur.close()
-    conn.close()
+    プロセス単位（書き込み後のカタログ再構築用）と、セッション単位（同じ管理者の
+    後続リクエスト用）の両方に記録する
+    """
+    global _last_primary_write_at
+    _last_primary_write_at = time.monotonic()
+    if has_request_context():
+        session['db_write_at'] = time.time()
+
+def _within_read_your_writes_window():
+    if _last_primary_write_at is not None and \
+            time.monotonic() - _last_primary_write_at < DATABASE_READ_AFTER_WRITE_SECONDS:
+        return True
+    if has_request_context():
+        written_at = session.get('db_write_at')
+        if written_at and time.time() - written_at < DATABASE_READ_AFTER_WRITE_SECONDS:
+            return True
+    return False
+
+def _replica_lag_seconds(conn):
+    """レプリカの遅延秒数（WALを全て適用済み、またはレプリカでなければ0）"""
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT CASE
+                WHEN NOT pg_is_in_recovery() THEN 0
+                WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+            END
+        """)
+        return float(cur.fetchone()[0])
+    finally:
+        cur.close()
+
+def get_read_connection():
+    """
+    読み取り専用クエリ用の接続を返す
     
+    DATABASE_READ_URL が設定されていればレプリカへ接続する。ただし書き込み直後
+    （read-your-writes）やレプリカの遅延が DATABASE_READ_MAX_LAG_SECONDS を超える場合、
+    レプリカに接続できない場合はプライマリへ接続する
+    """
+    read_url = os.environ.get('DATABASE_READ_URL')
+    if not read_url or _within_read_your_writes_window():
+        return get_db_connection()
+    
+    connect_timeout = int(os.environ.get('DATABASE_CONNECT_TIMEOUT', '10'))
+    try:
+        conn = psycopg2.connect(read_url, sslmode='require', cursor_factory=DictCursor,
+                                connect_timeout=connect_timeout)
+    except psycopg2.Error as e:
+        app.logger.warning(f"読み取りレプリカに接続できないためプライマリを使用します: {e}")
+        return get_db_connection()
+    
+    try:
+        lag = _replica_lag_seconds(conn)
+    except psycopg2.Error as e:
+        app.logger.warning(f"レプリカ遅延の確認に失敗したためプライマリを使用します: {e}")
+        conn.close()
+        return get_db_connection()
+    if lag > DATABASE_READ_MAX_LAG_SECONDS:
+        app.logger.warning(f"レプリカの遅延が大きいためプライマリを使用します: {lag:.1f}秒")
+        conn.close()
+        return get_db_connection()
+    # 遅延確認で開始したトランザクションを閉じておく
+    conn.rollback()
+    return conn
+
+def open_catalog_reader():
+    """
+    カタログ構築用のリーダーを開く
+    
+    CATALOG_SQLITE_PATH が設定されていれば更新パイプラインが書き出した組み込みSQLiteから、
+    未設定ならPostgreSQLから読み取る
+    """
+    sqlite_path = os.environ.get('CATALOG_SQLITE_PATH')
+    if sqlite_path:
+        return SqliteCatalogReader(Path(sqlite_path))
+    return PostgresCatalogReader(get_read_connection())
+
+def get_all_aliens(reader):
+    # ！！！ (★修正★) 判定と表示に必要なカラムをすべてSELECTする ！！！
     # (新) S_Skill と S_Skill_text のキー名を小文字に統一（共通ヘルパー関数を使用）
     # (index.html が s_skill, s_skill_text を期待しているため)
-    aliens_list = [normalize_alien_row(dict(a)) for a in aliens]
-
-    # 辞書を作成 (JavaScriptが使用)
-    aliens_dict = {str(a['id']): a for a in aliens_list}
+    # 辞書を作成 (JavaScriptが使用)。行は1件ずつ読み込んで直接格納する
+    aliens_dict = {}
+    for row in reader.fetch_aliens():
+        alien = normalize_alien_row(row)
+        aliens_dict[str(alien['id'])] = alien
     return aliens_dict
 
-@lru_cache(maxsize=None)
-def get_all_skill_requirements_new():
+def get_all_skill_requirements_new(reader, skill_ids=None):
     """
-    (新) skill_text_verified_effectsテーブルから、
+    (新) skill_requirementテーブルから、
     味方編成要求(has_requirement = true)を持つデータを取得し、
-    skill_textをキーにした辞書として返す。
-    """
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=DictCursor)
+    skill_id（skillテーブルの整数ID）をキーにした辞書として返す。
     
-    cur.execute("""
-        SELECT skill_text, requirement_details, requirement_count
-        FROM skill_text_verified_effects
-        WHERE has_requirement = true AND requirement_details IS NOT NULL
-        ORDER BY skill_text, requirement_details, requirement_count
-    """)
-    rows = cur.fetchall()
-    
-    requirements_by_text = {}
-    seen_requirements = {} 
-
-    for row in rows:
-        skill_text = row['skill_text']
-        if skill_text not in requirements_by_text:
-            requirements_by_text[skill_text] = []
-            seen_requirements[skill_text] = set()
-
-        details = row['requirement_details']
-        is_not = False
-        
-        # ！！！ (★修正★) コロンが含まれているかチェック ！！！
-        if ':' not in details:
-            # 想定外のフォーマットの場合はログに記録してスキップ
-            # (app.logger.warning を使うとターミナルに出力される)
-            # app.logger.warning(f"Skipping invalid requirement_details format: {details} for skill_text: {skill_text}")
-            continue # この行の処理をスキップ
-
-        # コロンが含まれている場合のみ処理を続行
-        if details.endswith('!'):
-            is_not = True
-            details = details[:-1]
-            
-        try:
-            req_type, req_value = details.split(':', 1)
-        except ValueError:
-            # (念のため split エラーもここでキャッチしてスキップ)
-            # app.logger.warning(f"Could not split requirement_details: {row['requirement_details']} for skill_text: {skill_text}")
-            continue
+    要求は書き込み時に検証・分解済みのため、ここでは文字列の解析を行わない
+    skill_ids を指定するとそのスキルの分だけを読み込む（部分更新用）
+    """
+    requirements_by_skill = {}
+    # 行は skill_id 順に届くため、重複判定は現在のスキルの分だけ保持すればよい
+    seen_requirements = set()
 
-        # ！！！ (★修正★) requirement_countを整数型に統一（型の不整合を防ぐ） ！！！
-        try:
-            req_count = int(row['requirement_count']) if row['requirement_count'] is not None else 1
-        except (ValueError, TypeError):
-            # 変換できない場合はデフォルトで1とする
-            req_count = 1
-
-        req_tuple = (req_type, req_value, req_count, is_not)
-        if req_tuple not in seen_requirements[skill_text]:
-            requirements_by_text[skill_text].append({
-                "type": req_type,
-                "value": req_value,
-                "count": req_count,
-                "is_not": is_not 
+    for row in reader.fetch_requirement_rows(skill_ids):
+        skill_id = row['skill_id']
+        if skill_id not in requirements_by_skill:
+            requirements_by_skill[skill_id] = []
+            seen_requirements = set()
+
+        # 同じスキルの複数の効果が同じ要求を持つ場合は1つにまとめる
+        req_tuple = (row['req_type'], row['req_value'], row['req_count'], row['is_not'])
+        if req_tuple not in seen_requirements:
+            requirements_by_skill[skill_id].append({
+                "type": row['req_type'],
+                "value": row['req_value'],
+                "count": row['req_count'],
+                "is_not": row['is_not']
             })
-            seen_requirements[skill_text].add(req_tuple)
+            seen_requirements.add(req_tuple)
         
-    cur.close()
-    conn.close()
-    return requirements_by_text
+    return requirements_by_skill
 
 def migrate_correct_effect_names_table():
     """correct_effect_namesテーブルにtarget/condition_target関連カラムを追加するマイグレーション"""
@@ -259,117 +320,671 @@ def migrate_correct_effect_names_table():
         cur.close()
         conn.close()
 
-# アプリ起動時にマイグレーションを実行（初回のみ）
-try:
-    migrate_correct_effect_names_table()
-except Exception as e:
-    app.logger.warning(f"マイグレーション実行時にエラーが発生しました（既に実行済みの可能性があります）: {e}")
+def _enable_public_read(cur, table):
+    """Supabase: 他のテーブル同様にRLSを有効化し、公開読み取りのみ許可する"""
+    cur.execute(f"ALTER TABLE {table} ENABLE ROW LEVEL SECURITY")
+    cur.execute(f"""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_policies
+                WHERE tablename = '{table}' AND policyname = 'Enable read access for all users'
+            ) THEN
+                CREATE POLICY "Enable read access for all users" ON public.{table} FOR SELECT USING (true);
+            END IF;
+        END
+        $$
+    """)
 
-def get_correct_effect_names():
+def migrate_skill_table():
     """
-    (新) フェーズ1 効果絞り込み機能のために、効果辞書を取得する（個性用）
+    skillテーブル（skill_textの正規化）を作成し、alien・skill_text_verified_effectsに
+    整数の外部キー列を追加するマイグレーション
+    
+    - skill.text_hash は md5(skill_text) のUUID。長い日本語テキストの一意性判定と検索に使う
+    - 外部キー列はトリガーで自動設定されるため、スクレイパーや管理画面は従来どおり
+      skill_text を書き込めばよい
     """
     conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=DictCursor)
-    # categoryがS_SKILL_*で始まらないものを個性用として取得
-    cur.execute("""
-        SELECT correct_name as correct_effect_names, effect_type, category, 
-               target, condition_target, show_target, show_condition_target
-        FROM correct_effect_names 
-        WHERE category NOT LIKE 'S_SKILL_%'
-        ORDER BY category, correct_name
-    """)
-    effects = [dict(row) for row in cur.fetchall()]
-    cur.close()
-    conn.close()
-    return effects
+    cur = conn.cursor()
+    
+    try:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS skill (
+                id SERIAL PRIMARY KEY,
+                skill_text TEXT NOT NULL,
+                text_hash UUID NOT NULL UNIQUE
+            )
+        """)
+        
+        # skill_textに対応するskill.idを返す（未登録なら登録する）
+        cur.execute("""
+            CREATE OR REPLACE FUNCTION skill_id_for(p_text TEXT) RETURNS INTEGER AS $$
+            DECLARE
+                v_id INTEGER;
+            BEGIN
+                IF p_text IS NULL OR p_text = '' OR p_text = 'なし' THEN
+                    RETURN NULL;
+                END IF;
+                SELECT id INTO v_id FROM skill WHERE text_hash = md5(p_text)::uuid;
+                IF v_id IS NULL THEN
+                    INSERT INTO skill (skill_text, text_hash) VALUES (p_text, md5(p_text)::uuid)
+                    ON CONFLICT (text_hash) DO NOTHING
+                    RETURNING id INTO v_id;
+                    IF v_id IS NULL THEN
+                        SELECT id INTO v_id FROM skill WHERE text_hash = md5(p_text)::uuid;
+                    END IF;
+                END IF;
+                RETURN v_id;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        
+        cur.execute("""
+            SELECT table_name, column_name
+            FROM information_schema.columns
+            WHERE (table_name = 'skill_text_verified_effects' AND column_name = 'skill_id')
+               OR (table_name = 'alien' AND column_name IN ('skill_id1', 'skill_id2', 'skill_id3', 's_skill_id'))
+        """)
+        existing_columns = {(row[0], row[1]) for row in cur.fetchall()}
+        
+        needs_backfill = False
+        if ('skill_text_verified_effects', 'skill_id') not in existing_columns:
+            cur.execute("ALTER TABLE skill_text_verified_effects ADD COLUMN skill_id INTEGER REFERENCES skill(id)")
+            needs_backfill = True
+        for column in ('skill_id1', 'skill_id2', 'skill_id3', 's_skill_id'):
+            if ('alien', column) not in existing_columns:
+                cur.execute(f"ALTER TABLE alien ADD COLUMN {column} INTEGER REFERENCES skill(id)")
+                needs_backfill = True
+        
+        # 書き込み時に外部キー列を自動設定するトリガー
+        cur.execute("""
+            CREATE OR REPLACE FUNCTION effects_assign_skill_id() RETURNS trigger AS $$
+            BEGIN
+                NEW.skill_id := skill_id_for(NEW.skill_text);
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        cur.execute("DROP TRIGGER IF EXISTS trg_effects_assign_skill_id ON skill_text_verified_effects")
+        cur.execute("""
+            CREATE TRIGGER trg_effects_assign_skill_id
+            BEFORE INSERT OR UPDATE OF skill_text ON skill_text_verified_effects
+            FOR EACH ROW EXECUTE FUNCTION effects_assign_skill_id()
+        """)
+        cur.execute("""
+            CREATE OR REPLACE FUNCTION alien_assign_skill_ids() RETURNS trigger AS $$
+            BEGIN
+                NEW.skill_id1 := skill_id_for(NEW.skill_text1);
+                NEW.skill_id2 := skill_id_for(NEW.skill_text2);
+                NEW.skill_id3 := skill_id_for(NEW.skill_text3);
+                NEW.s_skill_id := skill_id_for(NEW."S_Skill_text");
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        cur.execute("DROP TRIGGER IF EXISTS trg_alien_assign_skill_ids ON alien")
+        cur.execute("""
+            CREATE TRIGGER trg_alien_assign_skill_ids
+            BEFORE INSERT OR UPDATE OF skill_text1, skill_text2, skill_text3, "S_Skill_text" ON alien
+            FOR EACH ROW EXECUTE FUNCTION alien_assign_skill_ids()
+        """)
+        
+        if needs_backfill:
+            # 既存データのバックフィル（集合演算で一括登録してから外部キーを設定）
+            cur.execute("""
+                INSERT INTO skill (skill_text, text_hash)
+                SELECT t, md5(t)::uuid
+                FROM (
+                    SELECT skill_text AS t FROM skill_text_verified_effects
+                    UNION SELECT skill_text1 FROM alien
+                    UNION SELECT skill_text2 FROM alien
+                    UNION SELECT skill_text3 FROM alien
+                    UNION SELECT "S_Skill_text" FROM alien
+                ) texts
+                WHERE t IS NOT NULL AND t <> '' AND t <> 'なし'
+                ON CONFLICT (text_hash) DO NOTHING
+            """)
+            cur.execute("""
+                UPDATE skill_text_verified_effects e
+                SET skill_id = s.id
+                FROM skill s
+                WHERE s.text_hash = md5(e.skill_text)::uuid
+            """)
+            cur.execute("""
+                UPDATE alien a
+                SET skill_id1 = (SELECT id FROM skill WHERE text_hash = md5(a.skill_text1)::uuid),
+                    skill_id2 = (SELECT id FROM skill WHERE text_hash = md5(a.skill_text2)::uuid),
+                    skill_id3 = (SELECT id FROM skill WHERE text_hash = md5(a.skill_text3)::uuid),
+                    s_skill_id = (SELECT id FROM skill WHERE text_hash = md5(a."S_Skill_text")::uuid)
+            """)
+        
+        _enable_public_read(cur, 'skill')
+        
+        conn.commit()
+        app.logger.info("skillテーブルのマイグレーション完了")
+    except Exception as e:
+        conn.rollback()
+        app.logger.error(f"マイグレーションエラー: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
 
-@lru_cache(maxsize=None)
-def get_s_skill_effect_names():
+def migrate_skill_requirement_table():
     """
-    特技用効果辞書を取得する
+    味方編成要求を構造化して保持する skill_requirement テーブルを作成するマイグレーション
+    
+    - requirement_details（"a:3", "a:1,e:AK!" など）を1要素1行に分解して保持する
+    - skill_text_verified_effects への書き込み時にトリガーが同期し、不正な形式は
+      書き込み自体をエラーにする（読み取り時に黙ってスキップしない）
+    - 既存データは初回のみバックフィルする（不正な行は件数をログに出してスキップ）
     """
     conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=DictCursor)
-    # categoryがS_SKILL_*で始まるものを特技用として取得
-    cur.execute("""
-        SELECT correct_name as correct_effect_names, effect_type, category, 
-               target, condition_target, show_target, show_condition_target
-        FROM correct_effect_names 
-        WHERE category LIKE 'S_SKILL_%'
-        ORDER BY category, correct_name
-    """)
-    effects = [dict(row) for row in cur.fetchall()]
-    cur.close()
-    conn.close()
-    return effects
+    cur = conn.cursor()
+    
+    try:
+        cur.execute("SELECT to_regclass('public.skill_requirement') IS NULL")
+        needs_backfill = cur.fetchone()[0]
+        
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS skill_requirement (
+                effect_id BIGINT NOT NULL REFERENCES skill_text_verified_effects(id) ON DELETE CASCADE,
+                position SMALLINT NOT NULL,
+                req_type CHAR(1) NOT NULL,
+                req_value TEXT NOT NULL,
+                is_not BOOLEAN NOT NULL DEFAULT false,
+                req_count SMALLINT NOT NULL DEFAULT 1,
+                PRIMARY KEY (effect_id, position),
+                CONSTRAINT skill_requirement_valid CHECK (
+                    req_type IN ('a', 'b', 'c', 'd', 'e', 'f')
+                    AND req_value <> ''
+                    AND req_count >= 1
+                )
+            )
+        """)
+        
+        # requirement_details を分解して skill_requirement に同期するトリガー
+        # （パターンは utils.db_helpers.parse_requirement_details と共通）
+        cur.execute(f"""
+            CREATE OR REPLACE FUNCTION effects_sync_requirements() RETURNS trigger AS $$
+            DECLARE
+                part TEXT;
+                pos INTEGER := 0;
+                m TEXT[];
+            BEGIN
+                IF TG_OP = 'UPDATE' THEN
+                    DELETE FROM skill_requirement WHERE effect_id = NEW.id;
+                END IF;
+                IF NOT COALESCE(NEW.has_requirement, false) OR COALESCE(NEW.requirement_details, '') = '' THEN
+                    RETURN NULL;
+                END IF;
+                FOREACH part IN ARRAY string_to_array(NEW.requirement_details, ',') LOOP
+                    m := regexp_match(btrim(part), '{REQUIREMENT_PATTERN.pattern}');
+                    IF m IS NULL THEN
+                        RAISE EXCEPTION USING ERRCODE = 'check_violation',
+                            MESSAGE = format('不正な要求形式です: %s（skill_text: %s）', part, NEW.skill_text);
+                    END IF;
+                    pos := pos + 1;
+                    INSERT INTO skill_requirement (effect_id, position, req_type, req_value, is_not, req_count)
+                    VALUES (NEW.id, pos, m[1], m[2], m[3] = '!', COALESCE(NEW.requirement_count, 1));
+                END LOOP;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        cur.execute("DROP TRIGGER IF EXISTS trg_effects_sync_requirements ON skill_text_verified_effects")
+        cur.execute("""
+            CREATE TRIGGER trg_effects_sync_requirements
+            AFTER INSERT OR UPDATE OF has_requirement, requirement_details, requirement_count
+            ON skill_text_verified_effects
+            FOR EACH ROW EXECUTE FUNCTION effects_sync_requirements()
+        """)
+        
+        if needs_backfill:
+            # 既存データのバックフィル（形式が不正な要素を含む効果は丸ごとスキップ）
+            cur.execute("""
+                WITH parts AS (
+                    SELECT e.id AS effect_id, p.ord AS position,
+                           regexp_match(btrim(p.part), %s) AS m,
+                           COALESCE(e.requirement_count, 1) AS req_count
+                    FROM skill_text_verified_effects e
+                    CROSS JOIN LATERAL unnest(string_to_array(e.requirement_details, ','))
+                        WITH ORDINALITY AS p(part, ord)
+                    WHERE e.has_requirement = true AND e.requirement_details <> ''
+                ),
+                invalid AS (
+                    SELECT DISTINCT effect_id FROM parts WHERE m IS NULL OR req_count < 1
+                )
+                INSERT INTO skill_requirement (effect_id, position, req_type, req_value, is_not, req_count)
+                SELECT effect_id, position, m[1], m[2], m[3] = '!', req_count
+                FROM parts
+                WHERE effect_id NOT IN (SELECT effect_id FROM invalid)
+            """, (REQUIREMENT_PATTERN.pattern,))
+            app.logger.info(f"skill_requirementのバックフィル: {cur.rowcount}件")
+            
+            cur.execute("""
+                SELECT id, skill_text, requirement_details, requirement_count
+                FROM skill_text_verified_effects e
+                WHERE has_requirement = true AND requirement_details <> ''
+                  AND NOT EXISTS (SELECT 1 FROM skill_requirement r WHERE r.effect_id = e.id)
+            """)
+            for row in cur.fetchall():
+                app.logger.warning(
+                    f"不正な要求データのためバックフィルをスキップしました: id={row[0]} "
+                    f"requirement_details={row[2]!r} requirement_count={row[3]!r} skill_text={row[1]}"
+                )
+        
+        _enable_public_read(cur, 'skill_requirement')
+        
+        conn.commit()
+        app.logger.info("skill_requirementテーブルのマイグレーション完了")
+    except Exception as e:
+        conn.rollback()
+        app.logger.error(f"マイグレーションエラー: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+# 頻出クエリ用のインデックス（scripts/check_query_plans.py で実行計画を確認する）
+HOT_QUERY_INDEXES = [
+    # skill_text = %s / skill_text = %s AND effect_name = %s（適用・バックアップ）
+    ('idx_effects_skill_text_effect_name', 'skill_text_verified_effects', '(skill_text, effect_name)'),
+    # effect_name = u.effect_name（未登録効果のskill_text）/ effect_name = %s AND skill_text = ANY(%s)（一括変更）
+    ('idx_effects_effect_name_skill_text', 'skill_text_verified_effects', '(effect_name, skill_text)'),
+    # skill_id = %s（管理画面の効果取得・カタログ構築）
+    ('idx_effects_skill_id', 'skill_text_verified_effects', '(skill_id, effect_name)'),
+    # category LIKE 'S_SKILL_%'（前方一致はロケールに依存しない text_pattern_ops が必要）
+    ('idx_correct_effect_names_category_pattern', 'correct_effect_names', '(category text_pattern_ops)'),
+    # skill_id1 = %s OR ... OR s_skill_id = %s（BitmapOrで結合される）
+    ('idx_alien_skill_id1', 'alien', '(skill_id1)'),
+    ('idx_alien_skill_id2', 'alien', '(skill_id2)'),
+    ('idx_alien_skill_id3', 'alien', '(skill_id3)'),
+    ('idx_alien_s_skill_id', 'alien', '(s_skill_id)'),
+]
+
+# 使うクエリが無くなったインデックス（書き込みのコストだけが残るため削除する）
+RETIRED_INDEXES = [
+    # "S_Skill_text" = %s（特技判定はカタログの索引で行うようになった）
+    'idx_alien_s_skill_text',
+]
+
+def migrate_hot_query_indexes():
+    """頻出クエリ用のインデックスを作成するマイグレーション（既存のものはスキップ）"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    try:
+        for index_name, table, columns in HOT_QUERY_INDEXES:
+            cur.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {table} {columns}')
+        for index_name in RETIRED_INDEXES:
+            cur.execute(f'DROP INDEX IF EXISTS {index_name}')
+        conn.commit()
+        app.logger.info("インデックスのマイグレーション完了")
+    except Exception as e:
+        conn.rollback()
+        app.logger.error(f"マイグレーションエラー: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
 
-@lru_cache(maxsize=None)
-def get_alien_effects():
+def migrate_change_journal_table():
     """
-    (新) エイリアンごとの効果リストを構築する（個性別）
-    フェーズ2: targetとcondition_targetの情報も含める
+    管理画面からの変更履歴（change_journal）テーブルを作成するマイグレーション
     
-    戻り値: {alien_id: {'1': [{effect_name, target, condition_target}], '2': [...], '3': [...]}} の形式
+    書き込みAPIが変更と同じトランザクションで変更前後の行を記録する（utils.change_journal）
     """
     conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=DictCursor)
+    cur = conn.cursor()
     
-    # skill_text_verified_effectsテーブルから効果名、target、condition_target、effect_type、category、requirement情報を取得
+    try:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS change_journal (
+                id BIGSERIAL PRIMARY KEY,
+                changeset_id UUID NOT NULL,
+                changed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                source TEXT NOT NULL,
+                table_name TEXT NOT NULL,
+                operation CHAR(1) NOT NULL CHECK (operation IN ('I', 'U', 'D')),
+                row_key JSONB NOT NULL,
+                before_image JSONB,
+                after_image JSONB,
+                undone_by UUID
+            )
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_change_journal_changeset ON change_journal (changeset_id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_change_journal_table_changed_at ON change_journal (table_name, changed_at)")
+        # 公開APIからは読み取らせない（ポリシーなしでRLSを有効化）
+        cur.execute("ALTER TABLE change_journal ENABLE ROW LEVEL SECURITY")
+        
+        conn.commit()
+        app.logger.info("change_journalテーブルのマイグレーション完了")
+    except Exception as e:
+        conn.rollback()
+        app.logger.error(f"マイグレーションエラー: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+def migrate_effect_usage_table():
+    """
+    効果名ごとの使用数（effect_usage）と未登録効果のビュー（unregistered_effects）を作成するマイグレーション
+
+    - effect_usage は skill_text_verified_effects の文単位トリガーが遷移テーブルから差分だけを加減する
+      （管理APIに限らず、取り込みスクリプトや取り消しによる書き込みでも常に一致する）
+    - 初回のみ既存データから集計する（集計中の書き込みを取りこぼさないようテーブルをロックする）
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        cur.execute("SELECT to_regclass('public.effect_usage') IS NULL")
+        needs_backfill = cur.fetchone()[0]
+
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS effect_usage (
+                effect_name TEXT PRIMARY KEY,
+                usage_count INTEGER NOT NULL CHECK (usage_count > 0)
+            )
+        """)
+
+        # 遷移テーブルは関数から参照する文が実行されるときに解決されるため、
+        # INSERT/UPDATE/DELETE の3つのトリガーで同じ関数を使える
+        cur.execute("""
+            CREATE OR REPLACE FUNCTION effects_update_usage() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO effect_usage (effect_name, usage_count)
+                    SELECT effect_name, count(*) FROM new_rows
+                    WHERE effect_name IS NOT NULL
+                    GROUP BY effect_name
+                    ORDER BY effect_name
+                    ON CONFLICT (effect_name) DO UPDATE
+                    SET usage_count = effect_usage.usage_count + EXCLUDED.usage_count;
+                END IF;
+                IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                    -- 0件になる行は CHECK 制約に触れる前に削除する
+                    WITH removed AS (
+                        SELECT effect_name, count(*) AS n FROM old_rows
+                        WHERE effect_name IS NOT NULL
+                        GROUP BY effect_name
+                    ), emptied AS (
+                        DELETE FROM effect_usage u
+                        USING removed r
+                        WHERE u.effect_name = r.effect_name AND u.usage_count <= r.n
+                    )
+                    UPDATE effect_usage u
+                    SET usage_count = u.usage_count - r.n
+                    FROM removed r
+                    WHERE u.effect_name = r.effect_name AND u.usage_count > r.n;
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        for operation, referencing in (
+            ('INSERT', 'NEW TABLE AS new_rows'),
+            ('UPDATE', 'OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+            ('DELETE', 'OLD TABLE AS old_rows'),
+        ):
+            trigger_name = f'trg_effects_usage_{operation.lower()}'
+            cur.execute(f"DROP TRIGGER IF EXISTS {trigger_name} ON skill_text_verified_effects")
+            cur.execute(f"""
+                CREATE TRIGGER {trigger_name}
+                AFTER {operation} ON skill_text_verified_effects
+                REFERENCING {referencing}
+                FOR EACH STATEMENT EXECUTE FUNCTION effects_update_usage()
+            """)
+
+        if needs_backfill:
+            cur.execute("LOCK TABLE skill_text_verified_effects IN SHARE ROW EXCLUSIVE MODE")
+            cur.execute("""
+                INSERT INTO effect_usage (effect_name, usage_count)
+                SELECT effect_name, count(*)
+                FROM skill_text_verified_effects
+                WHERE effect_name IS NOT NULL
+                GROUP BY effect_name
+            """)
+            app.logger.info(f"effect_usageのバックフィル: {cur.rowcount}件")
+
+        cur.execute("""
+            CREATE OR REPLACE VIEW unregistered_effects AS
+            SELECT u.effect_name, u.usage_count
+            FROM effect_usage u
+            WHERE NOT EXISTS (
+                SELECT 1 FROM correct_effect_names c WHERE c.correct_name = u.effect_name
+            )
+        """)
+        # 公開APIからは読み取らせない（ポリシーなしでRLSを有効化）
+        cur.execute("ALTER TABLE effect_usage ENABLE ROW LEVEL SECURITY")
+
+        conn.commit()
+        app.logger.info("effect_usageテーブルのマイグレーション完了")
+    except Exception as e:
+        conn.rollback()
+        app.logger.error(f"マイグレーションエラー: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+def migrate_skill_version_column():
+    """
+    スキル単位の楽観的排他制御のため skill.version を追加するマイグレーション
+    
+    skill_text_verified_effects への書き込みのたびに、文単位トリガーが変更されたスキルの
+    version を1増やす（管理API以外の書き込みでも増える）。apply-changes は編集開始時の
+    version と比べ、他の管理者が先に変更したスキルがあれば適用しない
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    try:
+        cur.execute("ALTER TABLE skill ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 0")
+        
+        cur.execute("""
+            CREATE OR REPLACE FUNCTION effects_bump_skill_version() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    UPDATE skill s SET version = s.version + 1
+                    WHERE s.id IN (SELECT skill_id FROM new_rows);
+                ELSIF TG_OP = 'DELETE' THEN
+                    UPDATE skill s SET version = s.version + 1
+                    WHERE s.id IN (SELECT skill_id FROM old_rows);
+                ELSE
+                    UPDATE skill s SET version = s.version + 1
+                    WHERE s.id IN (SELECT skill_id FROM new_rows UNION SELECT skill_id FROM old_rows);
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        for operation, referencing in (
+            ('INSERT', 'NEW TABLE AS new_rows'),
+            ('UPDATE', 'OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+            ('DELETE', 'OLD TABLE AS old_rows'),
+        ):
+            trigger_name = f'trg_effects_skill_version_{operation.lower()}'
+            cur.execute(f"DROP TRIGGER IF EXISTS {trigger_name} ON skill_text_verified_effects")
+            cur.execute(f"""
+                CREATE TRIGGER {trigger_name}
+                AFTER {operation} ON skill_text_verified_effects
+                REFERENCING {referencing}
+                FOR EACH STATEMENT EXECUTE FUNCTION effects_bump_skill_version()
+            """)
+        
+        conn.commit()
+        app.logger.info("skill.versionのマイグレーション完了")
+    except Exception as e:
+        conn.rollback()
+        app.logger.error(f"マイグレーションエラー: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+def lookup_skill_id(cur, skill_text):
+    """skill_textに対応するskill.idを返す（未登録ならNone）"""
+    cur.execute("SELECT id FROM skill WHERE text_hash = md5(%s)::uuid", (skill_text,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+# スキル単位のアドバイザリーロックの名前空間（pg_advisory_xact_lock(名前空間, hashtext(skill_text))）
+SKILL_LOCK_NAMESPACE = 0x534b
+
+def fetch_skill_versions(cur, skill_texts):
+    """skill_textごとの現在の version（skillテーブルに無いskill_textは0）"""
     cur.execute("""
-        SELECT skill_text, effect_name, target, condition_target, 
-               effect_type, category, has_requirement, requirement_details, requirement_count
-        FROM skill_text_verified_effects
-        WHERE effect_name IS NOT NULL
-        ORDER BY skill_text, effect_name
-    """)
-    rows = cur.fetchall()
+        SELECT t.skill_text, COALESCE(s.version, 0)
+        FROM unnest(%s::text[]) AS t(skill_text)
+        LEFT JOIN skill s ON s.text_hash = md5(t.skill_text)::uuid
+    """, (list(skill_texts),))
+    return {row[0]: row[1] for row in cur.fetchall()}
+
+def lock_skills(cur, skill_texts):
+    """
+    skill_textごとのアドバイザリーロックを取り、現在の version を返す
     
-    # correct_effect_namesからshow_targetとshow_condition_targetを取得
+    ロックはトランザクションの終了まで保持する。同じスキルを変更する管理者同士だけが待ち合い、
+    別のスキルの変更は並行して適用できる（デッドロックしないよう常に同じ順序で取る）
+    """
+    skill_texts = sorted(set(skill_texts))
     cur.execute("""
-        SELECT correct_name, category, show_target, show_condition_target
-        FROM correct_effect_names
-    """)
+        SELECT pg_advisory_xact_lock(%s, h)
+        FROM (SELECT DISTINCT hashtext(t) AS h FROM unnest(%s::text[]) AS t ORDER BY h) locks
+    """, (SKILL_LOCK_NAMESPACE, skill_texts))
+    # ロックを取った後の文で読むため、先に適用した管理者の変更が見える
+    return fetch_skill_versions(cur, skill_texts)
+
+def find_stale_skills(current_versions, expected_versions):
+    """
+    編集開始時の version から変わったスキル
+    
+    current_versions の全スキル（変更するスキル）を確認し、expected_versions に無いスキルは
+    編集開始時の version が分からないため変わったものとして扱う（expected_versions が None なら確認しない）
+    """
+    if expected_versions is None:
+        return []
+    return [
+        {'skill_text': skill_text, 'expected_version': expected_versions.get(skill_text), 'current_version': current}
+        for skill_text, current in sorted(current_versions.items())
+        if expected_versions.get(skill_text) != current
+    ]
+
+# アプリ起動時にマイグレーションを実行（初回のみ）
+for _migration in (
+    migrate_correct_effect_names_table,
+    migrate_skill_table,
+    migrate_skill_requirement_table,
+    migrate_hot_query_indexes,
+    migrate_change_journal_table,
+    migrate_effect_usage_table,
+    migrate_skill_version_column,
+):
+    try:
+        _migration()
+    except Exception as e:
+        app.logger.warning(f"マイグレーション実行時にエラーが発生しました（既に実行済みの可能性があります）: {e}")
+
+def get_correct_effect_names(reader):
+    """
+    (新) フェーズ1 効果絞り込み機能のために、効果辞書を取得する（個性用）
+    """
+    # categoryがS_SKILL_*で始まらないものを個性用として取得
+    return [dict(row) for row in reader.fetch_effect_dictionary(special=False)]
+
+def get_s_skill_effect_names(reader):
+    """
+    特技用効果辞書を取得する
+    """
+    # categoryがS_SKILL_*で始まるものを特技用として取得
+    return [dict(row) for row in reader.fetch_effect_dictionary(special=True)]
+
+def _used_skill_ids(all_aliens_dict):
+    """エイリアンが参照しているskill_id（個性1-3と特技）"""
+    used_skill_ids = set()
+    for alien_data in all_aliens_dict.values():
+        for key in ('skill_id1', 'skill_id2', 'skill_id3', 's_skill_id'):
+            if alien_data.get(key) is not None:
+                used_skill_ids.add(alien_data[key])
+    return used_skill_ids
+
+def get_skill_versions(reader, used_skill_ids, skill_ids=None):
+    """
+    skill_idごとの version（エイリアンが参照しているスキルのみ）
+    
+    ページに埋め込み、管理画面が編集開始時の version として apply-changes に送る。
+    効果より先に読むこと（間に書き込みがあっても「古い version と新しい効果」の組になり、
+    適用時に競合として検出される。逆だと他の管理者の変更を上書きしてしまう）
+    """
+    return {
+        row['skill_id']: row['version']
+        for row in reader.fetch_skill_versions(skill_ids)
+        if row['skill_id'] in used_skill_ids
+    }
+
+def get_effects_by_skill(reader, used_skill_ids, skill_ids=None):
+    """
+    (新) skill_idをキーにした効果リストを取得する
+    フェーズ2: targetとcondition_targetの情報も含める
+    
+    引数: used_skill_ids はエイリアンが参照しているskill_id（それ以外の効果は読み飛ばす）
+          skill_ids を指定するとそのスキルの効果だけを読み込む（部分更新用）
+    戻り値: {skill_id: [EffectRecord, ...]} の形式
+    """
+    # correct_effect_namesからshow_targetとshow_condition_targetを取得
     show_flags = {}
-    for flag_row in cur.fetchall():
+    for flag_row in reader.fetch_show_flags():
         key = (flag_row['correct_name'], flag_row['category'] or '')
-        show_flags[key] = {
-            'show_target': flag_row['show_target'] if flag_row['show_target'] is not None else True,
-            'show_condition_target': flag_row['show_condition_target'] if flag_row['show_condition_target'] is not None else True
-        }
+        show_flags[key] = (
+            flag_row['show_target'] if flag_row['show_target'] is not None else True,
+            flag_row['show_condition_target'] if flag_row['show_condition_target'] is not None else True
+        )
     
-    # skill_textをキーにした効果情報の辞書を作成
-    effects_by_text = {}
-    for row in rows:
-        skill_text = row['skill_text']
+    # skill_text_verified_effectsテーブルから効果名、target、condition_target、effect_type、category、requirement情報を
+    # 1行ずつ読み込み、skill_idをキーにした効果情報の辞書へ直接格納する（整数キーで結合する）
+    effects_by_skill = {}
+    for row in reader.fetch_effect_rows(skill_ids):
+        skill_id = row['skill_id']
+        if skill_id not in used_skill_ids:
+            continue
         effect_name = row['effect_name']
         category = row['category'] or ''
         # correct_effect_namesからshow_targetとshow_condition_targetを取得
         flag_key = (effect_name, category)
-        flags = show_flags.get(flag_key, {'show_target': True, 'show_condition_target': True})
-        effect_info = {
-            'effect_name': effect_name,
-            'target': row['target'] or '',
-            'condition_target': row['condition_target'] or '',
-            'effect_type': row['effect_type'] or '',
-            'category': category,
-            'has_requirement': row['has_requirement'] or False,
-            'requirement_details': row['requirement_details'] or '',
-            'requirement_count': row['requirement_count'] or 0,
-            'show_target': flags['show_target'],
-            'show_condition_target': flags['show_condition_target']
-        }
-        if skill_text not in effects_by_text:
-            effects_by_text[skill_text] = []
-        effects_by_text[skill_text].append(effect_info)
-    
-    cur.close()
-    conn.close()
+        show_target, show_condition_target = show_flags.get(flag_key, (True, True))
+        # 辞書ではなく __slots__ のレコードで保持する（文字列はインターンして共有）
+        effect_info = EffectRecord(
+            effect_name=effect_name,
+            target=row['target'] or '',
+            condition_target=row['condition_target'] or '',
+            effect_type=row['effect_type'] or '',
+            category=category,
+            has_requirement=row['has_requirement'] or False,
+            requirement_details=row['requirement_details'] or '',
+            requirement_count=row['requirement_count'] or 0,
+            show_target=show_target,
+            show_condition_target=show_condition_target
+        )
+        if skill_id not in effects_by_skill:
+            effects_by_skill[skill_id] = []
+        effects_by_skill[skill_id].append(effect_info)
     
-    # エイリアンデータを取得（skill_text1-3を参照するため）
-    all_aliens_dict = get_all_aliens()
+    return effects_by_skill
+
+def get_alien_effects(all_aliens_dict, effects_by_skill):
+    """
+    (新) エイリアンごとの効果リストを構築する（個性別）
     
-    # エイリアンごとの効果リストを構築（個性別 + 特技）
+    引数: all_aliens_dict は get_all_aliens() の戻り値（skill_id1-3, s_skill_idを参照するため）
+          effects_by_skill は get_effects_by_skill() の戻り値
+    戻り値: {alien_id: {'1': [EffectRecord, ...], '2': [...], '3': [...], 'S': [...]}} の形式
+    （同じスキルを持つエイリアン同士は同じリストを共有する。
+      JSONへの変換は utils.effect_records.dump_alien_effects を使う）
+    """
     alien_effects = {}
     for alien_id, alien_data in all_aliens_dict.items():
         alien_effects[alien_id] = {
@@ -380,48 +995,396 @@ def get_alien_effects():
         }
         # 個性1-3の効果を個別に集める
         for skill_num in [1, 2, 3]:
-            skill_text = alien_data.get(f'skill_text{skill_num}')
-            if skill_text and skill_text in effects_by_text:
-                alien_effects[alien_id][str(skill_num)] = effects_by_text[skill_text]
+            skill_id = alien_data.get(f'skill_id{skill_num}')
+            if skill_id is not None and skill_id in effects_by_skill:
+                alien_effects[alien_id][str(skill_num)] = effects_by_skill[skill_id]
         
         # 特技の効果を集める
-        s_skill_text = alien_data.get('s_skill_text')
-        if s_skill_text and s_skill_text in effects_by_text:
-            alien_effects[alien_id]['S'] = effects_by_text[s_skill_text]
+        s_skill_id = alien_data.get('s_skill_id')
+        if s_skill_id is not None and s_skill_id in effects_by_skill:
+            alien_effects[alien_id]['S'] = effects_by_skill[s_skill_id]
     
     return alien_effects
 
+def build_catalog():
+    """
+    トップページ描画に必要な全データ（カタログ）を構築する
+    
+    戻り値のキーは index.html のテンプレート変数名と一致させている
+    """
+    # 読み取りは1つの接続にまとめる
+    with open_catalog_reader() as reader:
+        return _build_catalog(reader)
+
+def _build_catalog(reader):
+    return _assemble_catalog(_load_catalog_parts(reader))
+
+def _load_catalog_parts(reader):
+    """
+    カタログの構成要素（スキル単位のデータと効果辞書）を読み込む
+    
+    部分更新では、この構成要素のうち影響を受けたskill_idの分だけを読み直して組み立て直す
+    """
+    # 1. 辞書として全エイリアンデータを取得 (JSが使用)
+    all_aliens_dict = get_all_aliens(reader)
+    used_skill_ids = _used_skill_ids(all_aliens_dict)
+    # 1-2. スキルの version（効果より先に読む）
+    versions_by_skill = get_skill_versions(reader, used_skill_ids)
+    return {
+        'all_aliens': all_aliens_dict,
+        'versions_by_skill': versions_by_skill,
+        # 2. 新しい要求データ（skill_idごと）
+        'requirements_by_skill': get_all_skill_requirements_new(reader),
+        # 3. 効果リスト（skill_idごと）
+        'effects_by_skill': get_effects_by_skill(reader, used_skill_ids),
+        # 4. 効果辞書（個性用）
+        'all_effects': get_correct_effect_names(reader),
+        # 4-2. 特技用効果辞書
+        's_skill_effects': get_s_skill_effect_names(reader),
+    }
+
+def _assemble_catalog(parts):
+    """構成要素からテンプレート変数（build_catalog()の戻り値）を組み立てる"""
+    all_aliens_dict = parts['all_aliens']
+    requirements_by_skill = parts['requirements_by_skill']
+    
+    # (★重要★) Jinjaの {% for alien in aliens %} のために、
+    # 辞書から「リスト」を作成する
+    aliens_list_for_template = sorted(all_aliens_dict.values(), key=lambda x: x['id'])
+    
+    # ALIEN_SKILL_DATA の構築
+    alien_skill_data = {}
+    for alien_id, alien_data in all_aliens_dict.items():
+        alien_skill_data[alien_id] = {
+            "1": requirements_by_skill.get(alien_data.get('skill_id1'), []),
+            "2": requirements_by_skill.get(alien_data.get('skill_id2'), []),
+            "3": requirements_by_skill.get(alien_data.get('skill_id3'), [])
+        }
+    
+    return {
+        # 1. Jinjaの {% for %} が使うエイリアン「リスト」
+        'aliens': aliens_list_for_template,
+        # 2. JavaScript が使うエイリアン「辞書」
+        'all_aliens': all_aliens_dict,
+        # 3. 新しい要求データ
+        'alien_skill_data': alien_skill_data,
+        # 4. 効果絞り込み用データ（個性用）
+        'all_effects': parts['all_effects'],
+        # 4-2. 特技用効果絞り込みデータ
+        's_skill_effects': parts['s_skill_effects'],
+        # 5. エイリアンごとの効果リスト（絞り込み用）
+        'alien_effects': get_alien_effects(all_aliens_dict, parts['effects_by_skill']),
+        # 6. スキルの version（管理画面の競合検出用。効果と同じスナップショットの値）
+        'skill_versions': {
+            str(skill_id): version for skill_id, version in sorted(parts['versions_by_skill'].items())
+        },
+    }
+
+# スナップショットファイルの保存先（データのバージョンごとに1ファイル）
+CATALOG_SNAPSHOT_DIR = Path(os.environ.get('CATALOG_SNAPSHOT_DIR') or PROJECT_ROOT / '.cache' / 'catalog')
+CATALOG_SNAPSHOT_KEEP = 3  # 古いファイルはこの数だけ残して削除
+
+def _cleanup_old_snapshots(keep_path):
+    """古いスナップショットファイルを削除する（mmap中のワーカーがあっても安全）"""
+    files = sorted(CATALOG_SNAPSHOT_DIR.glob('catalog-*.snap'), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in files[CATALOG_SNAPSHOT_KEEP:]:
+        if old == keep_path:
+            continue
+        try:
+            old.unlink()
+        except OSError as e:
+            app.logger.warning(f"古いスナップショットの削除に失敗しました: {old} ({e})")
+
+def _htmlsafe(json_text):
+    """<script>内に埋め込めるようにする（Flaskの tojson フィルタと同じエスケープ）"""
+    return Markup(
+        json_text.replace('<', '\\u003c')
+        .replace('>', '\\u003e')
+        .replace('&', '\\u0026')
+        .replace("'", '\\u0027')
+    )
+
+def dump_catalog_json(catalog):
+    """
+    catalog.json（build_catalog()の戻り値から'aliens'を除いたもの）を作る
+    
+    alien_effects はレコードから直接JSONにし、残りのキーの後ろに連結する
+    """
+    rest = json.dumps(
+        {key: value for key, value in catalog.items() if key not in ('aliens', 'alien_effects')},
+        ensure_ascii=False, separators=(',', ':')
+    )
+    effects = dump_alien_effects(catalog['alien_effects'], ensure_ascii=False)
+    return f'{rest[:-1]},"alien_effects":{effects}}}'
+
+def dump_skill_parts_json(parts):
+    """
+    skills.json（skill_idごとの要求・効果・version。部分更新で構成要素を復元するために使う）を作る
+    
+    スナップショットのバージョンに含まれるため、部分更新でキーの挿入順が変わっても
+    同じ内容なら同じバイト列になるよう skill_id 順に並べる
+    """
+    requirements = json.dumps(
+        {str(skill_id): reqs for skill_id, reqs in sorted(parts['requirements_by_skill'].items())},
+        ensure_ascii=False, separators=(',', ':')
+    )
+    effects = dump_effects_by_key(dict(sorted(parts['effects_by_skill'].items())), ensure_ascii=False)
+    versions = json.dumps(
+        {str(skill_id): version for skill_id, version in sorted(parts['versions_by_skill'].items())},
+        separators=(',', ':')
+    )
+    return f'{{"requirements":{requirements},"effects":{effects},"versions":{versions}}}'
+
+def build_catalog_snapshot():
+    """
+    カタログを構築し、トップページを事前描画・事前圧縮したスナップショットを返す
+    
+    結果はバイナリファイル（utils.snapshot_file 形式）に書き出し、mmapしたものを返す。
+    同じバージョンのファイルが既にあれば書き出さずにそれを共有する。
+    書き出したファイルは LATEST として公開し、次回起動時やDB障害時に使用する。
+    セクション: html, html.gz, catalog.json（管理機能用。'aliens'リストは除く）,
+    skills.json（部分更新用）
+    """
+    start = time.monotonic()
+    read_at = time.time()
+    with open_catalog_reader() as reader:
+        parts = _load_catalog_parts(reader)
+    return _write_catalog_snapshot(parts, start, read_at)
+
+def _snapshot_read_at(path):
+    """スナップショットのデータを読み取った時刻（ファイルの更新時刻。無ければ0）"""
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return 0.0
+
+def _write_catalog_snapshot(parts, start, read_at):
+    """
+    構成要素からスナップショットを描画・保存・公開する
+    
+    ファイルの更新時刻はデータを読み取った時刻（read_at）にする。他のワーカーはこれを見て
+    共有ファイルをそのまま使えるかを判断する（adopt_shared_snapshot）
+    """
+    catalog = _assemble_catalog(parts)
+    
+    # テンプレートはリクエストに依存しないため、アプリコンテキストだけで描画できる
+    with app.app_context():
+        html = render_template(
+            'index.html',
+            alien_effects_json=_htmlsafe(dump_alien_effects(catalog['alien_effects'])),
+            **catalog
+        ).encode('utf-8')
+    sections = {
+        'html': html,
+        'catalog.json': dump_catalog_json(catalog).encode('utf-8'),
+        'skills.json': dump_skill_parts_json(parts).encode('utf-8'),
+    }
+    # HTMLが同じでも catalog.json / skills.json が変われば別のバージョンにする
+    # （html.gz は html から決まるため含めない）
+    version = content_version(sections)
+    
+    path = CATALOG_SNAPSHOT_DIR / f'catalog-{version}.snap'
+    if not path.exists():
+        sections['html.gz'] = gzip.compress(html, compresslevel=9)
+        write_snapshot(path, sections, meta={
+            'version': version,
+            'built_at': datetime.now().isoformat(timespec='seconds'),
+            'build_duration': time.monotonic() - start,
+        })
+        os.utime(path, (read_at, read_at))
+        _cleanup_old_snapshots(path)
+    elif read_at > _snapshot_read_at(path):
+        # 内容が同じ既存ファイルを再利用する場合も、より新しく読み取ったデータとして扱う
+        os.utime(path, (read_at, read_at))
+    publish_snapshot(path)
+    
+    return MappedSnapshot(path)
+
+def _load_snapshot_parts(snapshot):
+    """
+    スナップショットからカタログの構成要素を復元する（skills.json が無い古い形式ならNone）
+    
+    load_json() のキャッシュは管理APIと共有しているため、ここでは別にデコードする
+    """
+    if 'skills.json' not in snapshot:
+        return None
+    catalog = json.loads(bytes(snapshot.section('catalog.json')).decode('utf-8'))
+    skills = json.loads(bytes(snapshot.section('skills.json')).decode('utf-8'))
+    if 'versions' not in skills:
+        return None
+    return {
+        'all_aliens': catalog['all_aliens'],
+        'versions_by_skill': {int(skill_id): version for skill_id, version in skills['versions'].items()},
+        'requirements_by_skill': {int(skill_id): reqs for skill_id, reqs in skills['requirements'].items()},
+        'effects_by_skill': {
+            int(skill_id): [EffectRecord(**effect) for effect in effects]
+            for skill_id, effects in skills['effects'].items()
+        },
+        'all_effects': catalog['all_effects'],
+        's_skill_effects': catalog['s_skill_effects'],
+    }
+
+def _patch_catalog_snapshot(snapshot, skill_texts=(), effect_names=(), dictionary=False):
+    """
+    変更のあったスキルの分だけDBから読み直し、スナップショットを作り直す
+    
+    引数: skill_texts は変更したスキル本文、effect_names は表示フラグなどを変更した効果名
+          （その効果を持つ全スキルを読み直す）、dictionary=True なら効果辞書も読み直す
+    戻り値: 新しいスナップショット（部分更新できない形式ならNone）
+    """
+    start = time.monotonic()
+    # 読み直さなかったスキルは元のスナップショットのデータのため、読み取り時刻も引き継ぐ
+    read_at = _snapshot_read_at(snapshot.path)
+    parts = _load_snapshot_parts(snapshot)
+    if parts is None:
+        return None
+    
+    with PostgresCatalogReader(get_read_connection()) as reader:
+        skill_ids = reader.fetch_skill_ids(skill_texts, effect_names)
+        used_skill_ids = _used_skill_ids(parts['all_aliens'])
+        versions = get_skill_versions(reader, used_skill_ids, skill_ids)
+        requirements = get_all_skill_requirements_new(reader, skill_ids)
+        effects = get_effects_by_skill(reader, used_skill_ids, skill_ids)
+        if dictionary:
+            parts['all_effects'] = get_correct_effect_names(reader)
+            parts['s_skill_effects'] = get_s_skill_effect_names(reader)
+    
+    for skill_id in skill_ids:
+        parts['versions_by_skill'].pop(skill_id, None)
+        parts['requirements_by_skill'].pop(skill_id, None)
+        parts['effects_by_skill'].pop(skill_id, None)
+    parts['versions_by_skill'].update(versions)
+    parts['requirements_by_skill'].update(requirements)
+    parts['effects_by_skill'].update(effects)
+    
+    app.logger.info(f"カタログを部分更新します: {len(skill_ids)}スキル (dictionary={dictionary})")
+    return _write_catalog_snapshot(parts, start, read_at)
+
+def adopt_shared_snapshot(not_before):
+    """
+    他のワーカーが公開した最新のスナップショット（LATEST）を使えるなら返す
+    
+    戻り値: (スナップショット, データの読み取り時刻)。読み取り時刻が not_before より前、
+    または読み込めない場合はNone（呼び出し元がDBから再構築する）
+    """
+    path = latest_snapshot_path(CATALOG_SNAPSHOT_DIR)
+    if path is None:
+        return None
+    read_at = _snapshot_read_at(path)
+    if read_at < not_before:
+        return None
+    current = catalog_cache.peek()
+    if current is not None and current.path == path:
+        return current, read_at
+    try:
+        snapshot = MappedSnapshot(path)
+        snapshot.verify()
+    except Exception as e:
+        app.logger.warning(f"共有スナップショットの読み込みに失敗しました: {path} ({e})")
+        return None
+    return snapshot, read_at
+
+def get_catalog_data(snapshot=None):
+    """スナップショットからカタログデータ（build_catalog()の戻り値、'aliens'を除く）を取得"""
+    snapshot = snapshot or catalog_cache.get()
+    return snapshot.load_json('catalog.json')
+
+def get_catalog_index(snapshot=None):
+    """
+    管理APIの参照用の索引（特技判定・スキルを使うエイリアン・効果辞書）を取得
+    
+    スナップショットごとに1回だけ作るため、カタログの再構築・部分更新に合わせて作り直される
+    """
+    snapshot = snapshot or catalog_cache.get()
+    return snapshot.memo('catalog_index', lambda: CatalogIndex(get_catalog_data(snapshot)))
+
+# カタログキャッシュ（再構築はシングルフライト: 同時リクエストがあってもDB問い合わせは1回）
+# - CATALOG_TTL_SECONDS: この秒数を過ぎたら、古いデータを返しつつ裏で再構築する
+# - CATALOG_MAX_STALENESS_SECONDS: この秒数を過ぎたデータは返さず、再構築を待つ
+#   （どちらも0を指定すると無制限）
+# 再構築はワーカー間でもロックファイルで1つずつ行い、先に構築したワーカーの共有ファイルが
+# 十分新しければ後続のワーカーはDBに問い合わせずそれを使う（全ワーカーのTTLが同時に切れても1回）。
+# 他のワーカーが LATEST を公開し直した（部分更新を含む）場合は、次のリクエストで取り込む
+catalog_cache = CatalogCache(
+    build_catalog_snapshot,
+    ttl=_env_seconds('CATALOG_TTL_SECONDS', 300),
+    max_staleness=_env_seconds('CATALOG_MAX_STALENESS_SECONDS', 3600),
+    adopt=adopt_shared_snapshot,
+    lock_path=CATALOG_SNAPSHOT_DIR / '.build.lock',
+    watch=lambda: latest_pointer_token(CATALOG_SNAPSHOT_DIR)
+)
+
+def invalidate_catalog_cache():
+    """
+    管理画面での変更後にカタログを無効化する
+    
+    書き込み直後の再構築がレプリカの古いデータを読まないよう、書き込みも記録する
+    """
+    note_primary_write()
+    catalog_cache.invalidate()
+
+def patch_catalog_cache(skill_texts=(), effect_names=(), dictionary=False):
+    """
+    管理画面での変更後に、変更のあったスキルの分だけカタログを部分更新する
+    
+    引数は _patch_catalog_snapshot() と同じ。部分更新はこのリクエストの中で行い、
+    LATEST として公開するため、適用直後の再読み込みはどのワーカーでも更新後のページを返す。
+    組み込みSQLiteから読み取る構成では管理画面の変更がSQLiteに反映されないため、
+    従来どおり全体を再構築する
+    """
+    if os.environ.get('CATALOG_SQLITE_PATH'):
+        invalidate_catalog_cache()
+        return
+    note_primary_write()
+    skill_texts = sorted({text for text in skill_texts if text})
+    effect_names = sorted({name for name in effect_names if name})
+    catalog_cache.patch(
+        lambda snapshot: _patch_catalog_snapshot(snapshot, skill_texts, effect_names, dictionary)
+    )
+
+def load_catalog_from_disk():
+    """
+    前回保存したスナップショットを読み込み、古いものとしてキャッシュに設定する
+    
+    戻り値: 読み込めた場合True。最初のリクエストではこのスナップショットを返しつつ、
+    バックグラウンドでDBからの再構築を試みる（DB障害中も配信を継続できる）
+    """
+    try:
+        snapshot = load_latest_snapshot(CATALOG_SNAPSHOT_DIR)
+    except Exception as e:
+        app.logger.warning(f"保存済みスナップショットの読み込みに失敗しました: {e}")
+        return False
+    if snapshot is None:
+        return False
+    catalog_cache.seed(snapshot, read_at=_snapshot_read_at(snapshot.path))
+    app.logger.info(f"保存済みスナップショットを読み込みました: version={snapshot.version} (built_at={snapshot.built_at})")
+    return True
+
+def warm_catalog():
+    """
+    ワーカーがリクエストを受け付ける前にスナップショットを用意する
+    
+    保存済みスナップショットがあればそれを読み込むだけで済ませ（DB再構築は最初の
+    リクエスト時にバックグラウンドで行う）、無ければここでDBから構築する。
+    モジュール読み込み時に実行されるため、gunicornの preload_app = True では
+    マスタープロセスで1回だけ行われ、各ワーカーへコピーオンライトで共有される
+    """
+    if load_catalog_from_disk():
+        return
+    try:
+        snapshot = catalog_cache.get()
+        app.logger.info(
+            f"カタログのウォームスタート完了: version={snapshot.version} "
+            f"({snapshot.build_duration * 1000:.0f}ms)"
+        )
+    except Exception as e:
+        # 起動自体は止めず、最初のリクエスト時に再度構築を試みる
+        app.logger.warning(f"カタログのウォームスタートに失敗しました: {e}")
+
 @app.route('/')
 def index():
     try:
-        # 1. 辞書として全エイリアンデータを取得 (JSが使用)
-        all_aliens_dict = get_all_aliens() 
-        
-        # 2. (★重要★) Jinjaの {% for alien in aliens %} のために、
-        #    辞書から「リスト」を作成する
-        aliens_list_for_template = sorted(all_aliens_dict.values(), key=lambda x: x['id'])
-
-        # 3. 新しい要求データを取得
-        requirements_by_text = get_all_skill_requirements_new()
-        
-        # 4. ALIEN_SKILL_DATA の構築
-        alien_skill_data = {}
-        for alien_id, alien_data in all_aliens_dict.items():
-            alien_skill_data[alien_id] = {
-                "1": requirements_by_text.get(alien_data.get('skill_text1'), []),
-                "2": requirements_by_text.get(alien_data.get('skill_text2'), []),
-                "3": requirements_by_text.get(alien_data.get('skill_text3'), [])
-            }
-        
-        # 5. 効果辞書も取得（個性用）
-        all_effects = get_correct_effect_names()
-        
-        # 5-2. 特技用効果辞書も取得
-        s_skill_effects = get_s_skill_effect_names()
-        
-        # 6. エイリアンごとの効果リストを取得
-        alien_effects = get_alien_effects()
-
+        snapshot = catalog_cache.get()
     except psycopg2.Error as e:
         app.logger.error(f"Database error: {e}")
         return "データベース接続エラーが発生しました。", 500
@@ -429,26 +1392,29 @@ def index():
         app.logger.error(f"An unexpected error occurred: {e}")
         return "サーバーエラーが発生しました。", 500
 
-    # (★重要★) render_template に 'aliens' と 'all_aliens' の両方を渡す
-    return render_template('index.html', 
-                           # 1. Jinjaの が使うエイリアン「リスト」
-                           aliens=aliens_list_for_template, 
-                           
-                           # 2. JavaScript が使うエイリアン「辞書」
-                           all_aliens=all_aliens_dict, 
-                           
-                           # 3. 新しい要求データ
-                           alien_skill_data=alien_skill_data,
-                           
-                           # 4. 効果絞り込み用データ（個性用）
-                           all_effects=all_effects,
-                           
-                           # 4-2. 特技用効果絞り込みデータ
-                           s_skill_effects=s_skill_effects,
-                           
-                           # 5. エイリアンごとの効果リスト（絞り込み用）
-                           alien_effects=alien_effects
-                           )
+    # 事前圧縮済みの版をAccept-Encodingに応じて返す
+    # （mmap上のバイト列をレスポンス用に一時的にコピーするのみ）
+    if request.accept_encodings['gzip']:
+        response = Response(bytes(snapshot.section('html.gz')), mimetype='text/html')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(bytes(snapshot.section('html')), mimetype='text/html')
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.set_etag(snapshot.version)
+    return response.make_conditional(request)
+
+@app.route('/healthz/ready')
+def healthz_ready():
+    """スナップショット構築済みかどうか（未構築なら503）"""
+    snapshot = catalog_cache.peek()
+    if snapshot is None:
+        return jsonify({'ready': False}), 503
+    return jsonify({
+        'ready': True,
+        'version': snapshot.version,
+        'built_at': snapshot.built_at,
+        'build_duration': snapshot.build_duration,
+    })
 
 # ============================================================================
 # 管理機能API: 認証
@@ -722,79 +1688,134 @@ def api_bug_report():
 @app.route('/api/admin/get-effects/<skill_text>')
 @require_admin
 def api_admin_get_effects(skill_text):
-    """指定したskill_textの効果を取得"""
+    """指定したskill_textの効果を取得（使用エイリアンはカタログの索引から引く）"""
     try:
-        conn = get_db_connection()
+        conn = get_read_connection()
         cur = conn.cursor(cursor_factory=DictCursor)
         
+        # 効果は編集直後の値を返すためDBから読む（長いskill_textの比較はハッシュ索引での1回だけ）
         cur.execute("""
             SELECT skill_text, effect_name, effect_type, category, target, 
                    condition_target, has_requirement, requirement_details, 
                    requirement_count, requires_awakening
             FROM skill_text_verified_effects
-            WHERE skill_text = %s
+            WHERE skill_id = (SELECT id FROM skill WHERE text_hash = md5(%s)::uuid)
             ORDER BY effect_name
         """, (skill_text,))
         
         effects = [dict(row) for row in cur.fetchall()]
-        
-        # このskill_textを使用するエイリアンを取得
-        cur.execute("""
-            SELECT id, name
-            FROM alien
-            WHERE skill_text1 = %s OR skill_text2 = %s OR skill_text3 = %s OR "S_Skill_text" = %s
-            ORDER BY id
-        """, (skill_text, skill_text, skill_text, skill_text))
-        
-        aliens = [dict(row) for row in cur.fetchall()]
+        # 編集開始時の version（apply-changes の expected_versions に渡す）
+        version = fetch_skill_versions(cur, [skill_text])[skill_text]
         
         cur.close()
         conn.close()
         
+        # このskill_textを使用するエイリアン
+        aliens = get_catalog_index().aliens_using(skill_text)
+        
         return jsonify({
             'success': True,
             'effects': effects,
-            'aliens': aliens
+            'aliens': aliens,
+            'version': version
+        })
+    except Exception as e:
+        app.logger.error(f"API error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# get-effects-batch で一度に指定できるskill_textの数
+MAX_BATCH_SKILL_TEXTS = 1000
+
+@app.route('/api/admin/get-effects-batch', methods=['POST'])
+@require_admin
+def api_admin_get_effects_batch():
+    """
+    複数のskill_textの効果と使用エイリアンをまとめて取得（get-effects の一括版）
+
+    効果は1回のクエリで全skill_textの分を読み、使用エイリアンはカタログの索引から引く。
+    結果は指定した順（重複は除く）に {'skill_text', 'effects', 'aliens', 'version'} のリストで返す
+    """
+    try:
+        data = request.json or {}
+        skill_texts = data.get('skill_texts')
+
+        if not isinstance(skill_texts, list) or not all(isinstance(text, str) for text in skill_texts):
+            return jsonify({'success': False, 'error': 'skill_textsを文字列のリストで指定してください'}), 400
+        skill_texts = list(dict.fromkeys(skill_texts))
+        if len(skill_texts) > MAX_BATCH_SKILL_TEXTS:
+            return jsonify({
+                'success': False,
+                'error': f'一度に指定できるskill_textは{MAX_BATCH_SKILL_TEXTS}件までです'
+            }), 400
+
+        effects_by_text = {text: [] for text in skill_texts}
+        versions = {}
+        if skill_texts:
+            conn = get_read_connection()
+            cur = conn.cursor(cursor_factory=DictCursor)
+
+            # skill_textはハッシュ索引で整数IDに変換してから効果を結合する
+            cur.execute("""
+                SELECT skill_text, effect_name, effect_type, category, target,
+                       condition_target, has_requirement, requirement_details,
+                       requirement_count, requires_awakening
+                FROM skill_text_verified_effects
+                WHERE skill_id IN (
+                    SELECT id FROM skill
+                    WHERE text_hash IN (SELECT md5(t)::uuid FROM unnest(%s::text[]) AS t)
+                )
+                ORDER BY skill_text, effect_name
+            """, (skill_texts,))
+
+            for row in cur.fetchall():
+                effects_by_text[row['skill_text']].append(dict(row))
+            versions = fetch_skill_versions(cur, skill_texts)
+
+            cur.close()
+            conn.close()
+
+        index = get_catalog_index()
+        return jsonify({
+            'success': True,
+            'results': [
+                {
+                    'skill_text': text,
+                    'effects': effects,
+                    'aliens': index.aliens_using(text),
+                    'version': versions.get(text, 0)
+                }
+                for text, effects in effects_by_text.items()
+            ]
         })
     except Exception as e:
         app.logger.error(f"API error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/admin/catalog-stats')
+@require_admin
+def api_admin_catalog_stats():
+    """カタログキャッシュの状態（再構築時間・経過秒数など）を取得"""
+    return jsonify({'success': True, 'stats': catalog_cache.stats()})
+
 @app.route('/api/admin/get-unregistered')
 @require_admin
 def api_admin_get_unregistered():
-    """辞書にない効果を取得"""
+    """辞書にない効果を取得（使用数は effect_usage、skill_text は未登録の効果名だけをインデックスで引く）"""
     try:
-        conn = get_db_connection()
+        conn = get_read_connection()
         cur = conn.cursor(cursor_factory=DictCursor)
         
-        # 全効果名を取得
-        cur.execute("""
-            SELECT DISTINCT effect_name
-            FROM skill_text_verified_effects
-            WHERE effect_name IS NOT NULL
-            ORDER BY effect_name
-        """)
-        all_db_effects = [row['effect_name'] for row in cur.fetchall()]
-        
-        # 辞書に登録されている効果名を取得
         cur.execute("""
-            SELECT DISTINCT correct_name
-            FROM correct_effect_names
+            SELECT u.effect_name, u.usage_count,
+                   ARRAY(
+                       SELECT DISTINCT e.skill_text
+                       FROM skill_text_verified_effects e
+                       WHERE e.effect_name = u.effect_name
+                       ORDER BY e.skill_text
+                   ) AS skill_texts
+            FROM unregistered_effects u
+            ORDER BY u.effect_name
         """)
-        registered_effects = set(row['correct_name'] for row in cur.fetchall())
-        
-        # 未登録効果を検出
-        unregistered = [e for e in all_db_effects if e not in registered_effects]
-        
-        # 使用件数とskill_textを取得
-        cur.execute("""
-            SELECT effect_name, COUNT(*) as usage_count, 
-                   ARRAY_AGG(DISTINCT skill_text) as skill_texts
-            FROM skill_text_verified_effects
-            WHERE effect_name = ANY(%s)
-            GROUP BY effect_name
-        """, (unregistered,))
         
         unregistered_with_stats = []
         for row in cur.fetchall():
@@ -818,203 +1839,288 @@ def api_admin_get_unregistered():
 # ============================================================================
 # 管理機能API: 変更管理
 # ============================================================================
-def create_backup(skill_text=None):
-    """バックアップを作成（追記形式）"""
+# 変更前の行のバックアップ（変更で触れた行だけを重複排除・圧縮して保存する）
+BACKUP_STORE_DIR = Path(os.environ.get('BACKUP_STORE_DIR') or PROJECT_ROOT / 'backups' / 'store')
+backup_store = BackupStore(BACKUP_STORE_DIR)
+
+def append_backup_rows(rows, backup_type, **meta):
+    """
+    行をバックアップストアに追記する
+    
+    引数: rows は skill_text_verified_effects の行、backup_type はバックアップの種類、
+          meta はエントリに記録する追加情報
+    戻り値: 成功した場合True
+    """
     try:
-        backup_dir = PROJECT_ROOT / 'backups'
-        backup_dir.mkdir(exist_ok=True)
-        
-        # 固定ファイル名でバックアップ（追記形式）
-        backup_path = backup_dir / 'skill_verified_effects_backup.jsonl'
-        
-        timestamp = datetime.now().strftime('%Y%m%dT%H%M%S')
-        
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=DictCursor)
-        
-        if skill_text:
-            cur.execute("""
-                SELECT * FROM skill_text_verified_effects
-                WHERE skill_text = %s
-            """, (skill_text,))
-        else:
-            cur.execute("SELECT * FROM skill_text_verified_effects")
-        
-        # 追記モードで開く
-        with open(backup_path, 'a', encoding='utf-8') as f:
-            # タイムスタンプマーカーを追加
-            f.write(json.dumps({'__backup_timestamp__': timestamp}, ensure_ascii=False) + '\n')
-            # データを追記
-            for row in cur.fetchall():
-                f.write(json.dumps(dict(row), ensure_ascii=False, default=str) + '\n')
-        
-        cur.close()
-        conn.close()
-        
-        app.logger.info(f"Backup appended: {backup_path} (timestamp: {timestamp})")
+        entry = backup_store.append(rows, backup_type, **meta)
+        app.logger.info(
+            f"Backup appended: {BACKUP_STORE_DIR} (timestamp: {entry['timestamp']}, "
+            f"rows: {len(entry['rows'])}, new: {len(entry['stored'])})"
+        )
         return True
     except Exception as e:
         app.logger.error(f"Backup error: {e}")
         return False
 
+# apply-changes で書き込む効果の列（INSERTの列順）
+EFFECT_WRITE_COLUMNS = (
+    'skill_text', 'effect_name', 'effect_type', 'category', 'target',
+    'condition_target', 'has_requirement', 'requirement_details',
+    'requirement_count', 'requires_awakening',
+)
+
+def _effect_insert_row(skill_text, effect_name, effect_data):
+    return (
+        skill_text,
+        effect_name,
+        effect_data.get('effect_type'),
+        effect_data.get('category'),
+        effect_data.get('target'),
+        effect_data.get('condition_target'),
+        effect_data.get('has_requirement', False),
+        effect_data.get('requirement_details'),
+        effect_data.get('requirement_count'),
+        effect_data.get('requires_awakening')
+    )
+
+def plan_changeset(changes):
+    """
+    apply-changes の変更一覧を検証し、変更ごとのDB操作に分解する
+    
+    戻り値: (ops, change_details)
+      ops: [(変更の位置, 削除するキー(skill_text, effect_name) or None, 挿入する行 or None), ...]
+      change_details: 変更ごとの結果（検証に失敗した変更は success=False で、opsには含めない）
+    """
+    ops = []
+    change_details = []
+    
+    for index, change in enumerate(changes):
+        change_type = change.get('type')
+        skill_text = change.get('skill_text')
+        effect_name = change.get('effect_name')
+        effect_data = change.get('data') or {}
+        
+        if change_type == 'add':
+            # 効果を追加
+            effect_name = effect_data.get('effect_name')
+            detail = {'type': 'add', 'skill_text': skill_text, 'effect_name': effect_name}
+            op = (index, None, _effect_insert_row(skill_text, effect_name, effect_data))
+        elif change_type == 'update':
+            if not effect_data:
+                # 更新内容が無い変更は何もしない
+                continue
+            # 同じskill_textとeffect_nameのレコードをすべて削除してから新規にINSERT
+            # これにより、不正な値（例：「味方」）が残らないようにする
+            new_effect_name = change.get('new_effect_name') or effect_name
+            detail = {
+                'type': 'update',
+                'skill_text': skill_text,
+                'old_effect_name': effect_name,
+                'new_effect_name': new_effect_name,
+            }
+            op = (index, (skill_text, effect_name), _effect_insert_row(skill_text, new_effect_name, effect_data))
+        elif change_type == 'delete':
+            # 効果を削除
+            detail = {'type': 'delete', 'skill_text': skill_text, 'effect_name': effect_name}
+            op = (index, (skill_text, effect_name), None)
+        else:
+            change_details.append({
+                'type': change_type, 'skill_text': skill_text, 'effect_name': effect_name,
+                'success': False, 'error': f'不明な変更タイプです: {change_type}'
+            })
+            continue
+        
+        # 要求データを事前に検証（不正な形式はDBに書き込まない）
+        error = None
+        if not skill_text:
+            error = 'skill_textが指定されていません'
+        elif not effect_name:
+            error = '効果名が指定されていません'
+        elif change_type != 'delete' and effect_data.get('has_requirement'):
+            try:
+                parse_requirement_details(effect_data.get('requirement_details'), effect_data.get('requirement_count'))
+            except ValueError as e:
+                error = str(e)
+        
+        if error:
+            change_details.append({**detail, 'effect_name': effect_name, 'success': False, 'error': error})
+        else:
+            change_details.append({**detail, 'success': True})
+            ops.append(op)
+    
+    return ops, change_details
+
+def _net_changeset(ops):
+    """
+    変更ごとの操作を、1回のDELETEと1回のINSERTにまとめる
+    
+    DELETEを先に実行するため、あるキーの削除より前にある同じキーの挿入は取り消す
+    （先頭から1件ずつ適用した場合と同じ結果になる）
+    戻り値: (削除するキーの一覧, 挿入する行の一覧)
+    """
+    delete_keys = {}
+    inserts = []
+    for _, delete_key, insert_row in ops:
+        if delete_key is not None:
+            inserts = [row for row in inserts if (row[0], row[1]) != delete_key]
+            delete_keys[delete_key] = None
+        if insert_row is not None:
+            inserts.append(insert_row)
+    return list(delete_keys), inserts
+
+def _execute_changeset(cur, delete_keys, inserts):
+    """
+    削除と挿入をそれぞれ1文で実行する
+    
+    戻り値: 変更履歴のエントリ [(操作, 変更前の行, 変更後の行), ...]（行は to_jsonb の画像）
+    """
+    entries = []
+    if delete_keys:
+        removed = execute_values(cur, """
+            DELETE FROM skill_text_verified_effects e
+            USING (VALUES %s) AS v(skill_text, effect_name)
+            WHERE e.skill_text = v.skill_text AND e.effect_name = v.effect_name
+            RETURNING to_jsonb(e)
+        """, delete_keys, page_size=len(delete_keys), fetch=True)
+        entries.extend((journal.DELETE, row[0], None) for row in removed)
+    if inserts:
+        added = execute_values(cur, f"""
+            INSERT INTO skill_text_verified_effects AS e ({', '.join(EFFECT_WRITE_COLUMNS)})
+            VALUES %s
+            RETURNING to_jsonb(e)
+        """, inserts, page_size=len(inserts), fetch=True)
+        entries.extend((journal.INSERT, None, row[0]) for row in added)
+    return entries
+
 @app.route('/api/admin/apply-changes', methods=['POST'])
 @require_admin
 def api_admin_apply_changes():
-    """変更を一括でDBに適用"""
+    """
+    変更を一括でDBに適用
+    
+    全変更を1トランザクションで、削除と挿入をそれぞれ1文にまとめて実行する。
+    不正な変更はスキップして change_details にエラーを返す（stop_on_error=true なら何も適用しない）
+    
+    expected_versions（{skill_text: 編集開始時の version}）を指定すると、変更するスキルの
+    アドバイザリーロックを取ったうえで version を比べ、他の管理者が先に変更したスキルが
+    あれば何も適用せず409で stale に一覧を返す。expected_versions に無いスキルも、
+    編集開始時から変わっていないことを確認できないため stale とする
+    """
     try:
         data = request.json
         changes = data.get('changes', [])
+        stop_on_error = bool(data.get('stop_on_error', False))
+        expected_versions = data.get('expected_versions')
         
         if not changes:
             return jsonify({'success': False, 'error': '変更がありません'}), 400
-        
-        # バックアップ作成（影響を受けるskill_textを収集）
-        affected_skill_texts = set()
-        for change in changes:
-            if 'skill_text' in change:
-                affected_skill_texts.add(change['skill_text'])
-        
-        # 全体バックアップを作成（一括適用のため）
-        create_backup()
+        if expected_versions is not None and (not isinstance(expected_versions, dict) or not all(
+            isinstance(version, int) and not isinstance(version, bool) for version in expected_versions.values()
+        )):
+            return jsonify({'success': False, 'error': 'expected_versionsの形式が不正です'}), 400
+        
+        ops, change_details = plan_changeset(changes)
+        failed_count = sum(1 for detail in change_details if not detail['success'])
+        if failed_count and (stop_on_error or not ops):
+            return jsonify({
+                'success': False,
+                'error': '不正な変更があります',
+                'change_details': change_details
+            }), 400
+        planned_skill_texts = [detail['skill_text'] for detail in change_details if detail['success']]
         
         conn = get_db_connection()
-        cur = conn.cursor()
+        cur = conn.cursor(cursor_factory=DictCursor)
+        
+        def stale_response():
+            # 変更するスキルをロックし、編集開始時から変わっていれば適用しない
+            stale = find_stale_skills(lock_skills(cur, planned_skill_texts), expected_versions)
+            if not stale:
+                return None
+            conn.rollback()
+            cur.close()
+            conn.close()
+            return jsonify({
+                'success': False,
+                'error': '他の管理者が先に変更したスキルがあります。再読み込みして最新の内容を確認してください',
+                'stale': stale,
+                'change_details': change_details
+            }), 409
         
-        applied_count = 0
-        change_details = []  # 変更内容の詳細を記録
+        conflict = stale_response()
+        if conflict:
+            return conflict
         
-        for change in changes:
-            change_type = change.get('type')
-            skill_text = change.get('skill_text')
-            effect_name = change.get('effect_name')
-            
-            try:
-                if change_type == 'add':
-                    # 効果を追加
-                    effect_data = change.get('data', {})
-                    effect_name_to_add = effect_data.get('effect_name')
-                    cur.execute("""
-                        INSERT INTO skill_text_verified_effects 
-                        (skill_text, effect_name, effect_type, category, target, 
-                         condition_target, has_requirement, requirement_details, 
-                         requirement_count, requires_awakening)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        skill_text,
-                        effect_name_to_add,
-                        effect_data.get('effect_type'),
-                        effect_data.get('category'),
-                        effect_data.get('target'),
-                        effect_data.get('condition_target'),
-                        effect_data.get('has_requirement', False),
-                        effect_data.get('requirement_details'),
-                        effect_data.get('requirement_count'),
-                        effect_data.get('requires_awakening')
-                    ))
-                    change_details.append({
-                        'type': 'add',
-                        'skill_text': skill_text,
-                        'effect_name': effect_name_to_add,
-                        'success': True
-                    })
-                    applied_count += 1
-                    
-                elif change_type == 'update':
-                    # 効果を更新
-                    updates = change.get('data', {})
-                    new_effect_name = change.get('new_effect_name') or effect_name
-                    
-                    if updates:
-                        # 同じskill_textとeffect_nameのレコードをすべて削除してから新規にINSERT
-                        # これにより、不正な値（例：「味方」）が残らないようにする
-                        cur.execute("""
-                            DELETE FROM skill_text_verified_effects
-                            WHERE skill_text = %s AND effect_name = %s
-                        """, (skill_text, effect_name))
-                        
-                        # 変更した内容を含めて新規にINSERT
-                        cur.execute("""
-                            INSERT INTO skill_text_verified_effects 
-                            (skill_text, effect_name, effect_type, category, target, 
-                             condition_target, has_requirement, requirement_details, 
-                             requirement_count, requires_awakening)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        """, (
-                            skill_text,
-                            new_effect_name,
-                            updates.get('effect_type'),
-                            updates.get('category'),
-                            updates.get('target'),
-                            updates.get('condition_target'),
-                            updates.get('has_requirement', False),
-                            updates.get('requirement_details'),
-                            updates.get('requirement_count'),
-                            updates.get('requires_awakening')
-                        ))
-                        
-                        change_details.append({
-                            'type': 'update',
-                            'skill_text': skill_text,
-                            'old_effect_name': effect_name,
-                            'new_effect_name': new_effect_name,
-                            'success': True
-                        })
-                        applied_count += 1
-                        
-                elif change_type == 'delete':
-                    # 効果を削除
-                    cur.execute("""
-                        DELETE FROM skill_text_verified_effects
-                        WHERE skill_text = %s AND effect_name = %s
-                    """, (skill_text, effect_name))
-                    change_details.append({
-                        'type': 'delete',
-                        'skill_text': skill_text,
-                        'effect_name': effect_name,
-                        'success': True
-                    })
-                    applied_count += 1
-                    
-            except Exception as e:
-                app.logger.error(f"Error applying change {change_type}: {e}")
-                change_details.append({
-                    'type': change_type,
-                    'skill_text': skill_text,
-                    'effect_name': effect_name,
-                    'success': False,
-                    'error': str(e)
-                })
-                conn.rollback()
+        try:
+            entries = _execute_changeset(cur, *_net_changeset(ops))
+        except psycopg2.Error as e:
+            # まとめて適用できない場合は、どの変更が失敗したかを特定するため1件ずつ適用し直す
+            # （ロールバックでロックも外れるため取り直す）
+            conn.rollback()
+            if stop_on_error:
                 cur.close()
                 conn.close()
+                app.logger.error(f"Apply changes error: {e}")
                 return jsonify({
-                    'success': False, 
+                    'success': False,
                     'error': f'変更の適用に失敗しました: {str(e)}',
                     'change_details': change_details
                 }), 500
+            app.logger.warning(f"一括適用に失敗したため1件ずつ適用します: {e}")
+            conflict = stale_response()
+            if conflict:
+                return conflict
+            entries = []
+            planned_details = [detail for detail in change_details if detail['success']]
+            for (_, delete_key, insert_row), detail in zip(ops, planned_details):
+                cur.execute("SAVEPOINT apply_change")
+                try:
+                    entries.extend(_execute_changeset(
+                        cur, [delete_key] if delete_key else [], [insert_row] if insert_row else []
+                    ))
+                    cur.execute("RELEASE SAVEPOINT apply_change")
+                except psycopg2.Error as change_error:
+                    cur.execute("ROLLBACK TO SAVEPOINT apply_change")
+                    app.logger.error(f"Error applying change {detail['type']}: {change_error}")
+                    detail['success'] = False
+                    detail['error'] = str(change_error).strip()
+        
+        applied_details = [detail for detail in change_details if detail['success']]
+        if not applied_details:
+            conn.rollback()
+            cur.close()
+            conn.close()
+            return jsonify({
+                'success': False,
+                'error': '変更の適用に失敗しました',
+                'change_details': change_details
+            }), 500
+        
+        # 変更前後の行を同じトランザクションで変更履歴に記録
+        changeset_id = journal.new_changeset_id()
+        journal.write_change_journal(cur, changeset_id, 'apply_changes', 'skill_text_verified_effects', entries)
+        
+        # 変更前の行（削除・更新された行）だけをバックアップ
+        removed = [before for _, before, _ in entries if before is not None]
+        if removed:
+            append_backup_rows(removed, 'apply_changes', changeset_id=changeset_id)
+        
+        # 適用後の version（続けて編集する場合の新しい基準）
+        versions = fetch_skill_versions(cur, {detail['skill_text'] for detail in applied_details})
         
         conn.commit()
         cur.close()
         conn.close()
         
-        # キャッシュクリア
-        try:
-            if hasattr(get_all_aliens, 'cache_clear'):
-                get_all_aliens.cache_clear()
-            if hasattr(get_all_skill_requirements_new, 'cache_clear'):
-                get_all_skill_requirements_new.cache_clear()
-            if hasattr(get_correct_effect_names, 'cache_clear'):
-                get_correct_effect_names.cache_clear()
-            if hasattr(get_s_skill_effect_names, 'cache_clear'):
-                get_s_skill_effect_names.cache_clear()
-            if hasattr(get_alien_effects, 'cache_clear'):
-                get_alien_effects.cache_clear()
-        except Exception as e:
-            app.logger.warning(f"Cache clear warning: {e}")
+        # 変更のあったスキルの分だけカタログを部分更新
+        patch_catalog_cache(skill_texts=[detail['skill_text'] for detail in applied_details])
         
         return jsonify({
             'success': True,
-            'applied_count': applied_count,
+            'changeset_id': changeset_id,
+            'versions': versions,
+            'applied_count': len(applied_details),
+            'failed_count': len(change_details) - len(applied_details),
             'change_details': change_details
         })
     except Exception as e:
@@ -1046,8 +2152,14 @@ def api_admin_dictionary_add():
         show_target = data.get('show_target', True)
         show_condition_target = data.get('show_condition_target', True)
         
+        # 既存の行（変更前の画像）と変更後の行を同時に返す
         cur.execute("""
-            INSERT INTO correct_effect_names (correct_name, effect_type, category, target, condition_target, show_target, show_condition_target, created_at)
+            WITH old AS (
+                SELECT * FROM correct_effect_names
+                WHERE correct_name = %s AND category = %s
+                FOR UPDATE
+            )
+            INSERT INTO correct_effect_names AS c (correct_name, effect_type, category, target, condition_target, show_target, show_condition_target, created_at)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
             ON CONFLICT (correct_name, category) DO UPDATE
             SET effect_type = EXCLUDED.effect_type,
@@ -1055,22 +2167,24 @@ def api_admin_dictionary_add():
                 condition_target = EXCLUDED.condition_target,
                 show_target = EXCLUDED.show_target,
                 show_condition_target = EXCLUDED.show_condition_target
-        """, (effect_name, effect_type, category, target, condition_target, show_target, show_condition_target, datetime.now()))
+            RETURNING (SELECT to_jsonb(old) FROM old), to_jsonb(c)
+        """, (effect_name, category,
+              effect_name, effect_type, category, target, condition_target, show_target, show_condition_target, datetime.now()))
+        before_image, after_image = cur.fetchone()
+        
+        changeset_id = journal.new_changeset_id()
+        journal.write_change_journal(cur, changeset_id, 'dictionary_add', 'correct_effect_names', [
+            (journal.UPDATE if before_image is not None else journal.INSERT, before_image, after_image)
+        ])
         
         conn.commit()
         cur.close()
         conn.close()
         
-        # キャッシュクリア
-        try:
-            if hasattr(get_correct_effect_names, 'cache_clear'):
-                get_correct_effect_names.cache_clear()
-            if hasattr(get_s_skill_effect_names, 'cache_clear'):
-                get_s_skill_effect_names.cache_clear()
-        except Exception as e:
-            app.logger.warning(f"Cache clear warning: {e}")
+        # 効果辞書と、この効果名を持つスキルの表示フラグを部分更新
+        patch_catalog_cache(effect_names=[effect_name], dictionary=True)
         
-        return jsonify({'success': True})
+        return jsonify({'success': True, 'changeset_id': changeset_id})
     except Exception as e:
         app.logger.error(f"Dictionary add error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1093,37 +2207,134 @@ def api_admin_dictionary_update_show_flags():
         cur = conn.cursor()
         
         cur.execute("""
-            UPDATE correct_effect_names
+            UPDATE correct_effect_names c
             SET show_target = %s, show_condition_target = %s
-            WHERE correct_name = %s AND category = %s
+            FROM (
+                SELECT * FROM correct_effect_names
+                WHERE correct_name = %s AND category = %s
+                FOR UPDATE
+            ) old
+            WHERE c.correct_name = old.correct_name AND c.category = old.category
+            RETURNING to_jsonb(old), to_jsonb(c)
         """, (show_target, show_condition_target, effect_name, category))
+        images = cur.fetchall()
         
-        if cur.rowcount == 0:
+        if not images:
             conn.rollback()
             cur.close()
             conn.close()
             return jsonify({'success': False, 'error': '効果名が見つかりませんでした。'}), 404
         
+        changeset_id = journal.new_changeset_id()
+        journal.write_change_journal(cur, changeset_id, 'update_show_flags', 'correct_effect_names', [
+            (journal.UPDATE, before_image, after_image) for before_image, after_image in images
+        ])
+        
         conn.commit()
         cur.close()
         conn.close()
         
-        # キャッシュクリア
-        try:
-            if hasattr(get_correct_effect_names, 'cache_clear'):
-                get_correct_effect_names.cache_clear()
-            if hasattr(get_s_skill_effect_names, 'cache_clear'):
-                get_s_skill_effect_names.cache_clear()
-            if hasattr(get_alien_effects, 'cache_clear'):
-                get_alien_effects.cache_clear()
-        except Exception as e:
-            app.logger.warning(f"Cache clear warning: {e}")
+        # 効果辞書と、この効果名を持つスキルの表示フラグを部分更新
+        patch_catalog_cache(effect_names=[effect_name], dictionary=True)
         
-        return jsonify({'success': True})
+        return jsonify({'success': True, 'changeset_id': changeset_id})
     except Exception as e:
         app.logger.error(f"Update show flags error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def parse_renames(items):
+    """
+    効果名の一括置き換えの指定を検証する
+    
+    引数: [{'old_effect_name', 'new_effect_name', 'skill_texts'(省略可。省略時は全スキル)}, ...]
+    戻り値: [(旧効果名, 新効果名, skill_textのリストまたはNone), ...]
+    不正な指定は ValueError（同じ旧効果名の重複や、置き換え後の名前をさらに置き換える連鎖も不可）
+    """
+    if not isinstance(items, list) or not items:
+        raise ValueError('置き換えが指定されていません。')
+    renames = []
+    for item in items:
+        old_name = item.get('old_effect_name') if isinstance(item, dict) else None
+        new_name = item.get('new_effect_name') if isinstance(item, dict) else None
+        if not isinstance(old_name, str) or not isinstance(new_name, str) or not old_name or not new_name:
+            raise ValueError('効果名が指定されていません。')
+        if old_name == new_name:
+            raise ValueError(f'置き換え前後の効果名が同じです: {old_name}')
+        skill_texts = item.get('skill_texts')
+        if skill_texts is not None:
+            if not isinstance(skill_texts, list) or not all(isinstance(text, str) for text in skill_texts):
+                raise ValueError(f'skill_textsは文字列のリストで指定してください: {old_name}')
+            skill_texts = list(dict.fromkeys(skill_texts))
+        renames.append((old_name, new_name, skill_texts))
+    old_names = [old_name for old_name, _, _ in renames]
+    if len(set(old_names)) != len(old_names):
+        raise ValueError('同じ効果名が複数回指定されています。')
+    chained = set(old_names) & {new_name for _, new_name, _ in renames}
+    if chained:
+        raise ValueError(f'置き換え後の効果名をさらに置き換えることはできません: {", ".join(sorted(chained))}')
+    return renames
+
+def rename_effects(cur, renames):
+    """
+    効果名をまとめて置き換える（UPDATE ... FROM unnest(...) の1文。呼び出し元のトランザクション内で実行）
+    
+    引数: parse_renames() の戻り値
+    戻り値: [(変更前の画像, 変更後の画像), ...]
+    """
+    # (旧効果名, 新効果名, skill_text) の組に展開する（skill_textがNULLなら全スキル）
+    old_names, new_names, skill_texts = [], [], []
+    for old_name, new_name, texts in renames:
+        for text in (texts if texts is not None else [None]):
+            old_names.append(old_name)
+            new_names.append(new_name)
+            skill_texts.append(text)
+    
+    # 一括更新（変更前の行と変更後の行を同時に返す）
+    cur.execute("""
+        UPDATE skill_text_verified_effects e
+        SET effect_name = old.new_effect_name
+        FROM (
+            SELECT t.*, r.new_effect_name
+            FROM skill_text_verified_effects t
+            JOIN unnest(%s::text[], %s::text[], %s::text[]) AS r(old_effect_name, new_effect_name, skill_text)
+              ON t.effect_name = r.old_effect_name
+             AND (r.skill_text IS NULL OR t.skill_text = r.skill_text)
+            FOR UPDATE OF t
+        ) old
+        WHERE e.id = old.id
+        RETURNING to_jsonb(old) - 'new_effect_name', to_jsonb(e)
+    """, (old_names, new_names, skill_texts))
+    return cur.fetchall()
+
+def _apply_renames(renames, source, **backup_meta):
+    """rename_effects() を実行して変更履歴・バックアップを記録し、カタログを部分更新する"""
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=DictCursor)
+    try:
+        images = rename_effects(cur, renames)
+        
+        changeset_id = journal.new_changeset_id()
+        journal.write_change_journal(cur, changeset_id, source, 'skill_text_verified_effects', [
+            (journal.UPDATE, before_image, after_image) for before_image, after_image in images
+        ])
+        
+        # 変更前の行をバックアップ
+        append_backup_rows(
+            [before_image for before_image, _ in images], source, changeset_id=changeset_id, **backup_meta
+        )
+        
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+    
+    # 置き換えたスキルの分だけカタログを部分更新
+    patch_catalog_cache(skill_texts=[before_image['skill_text'] for before_image, _ in images])
+    return changeset_id, images
+
 @app.route('/api/admin/dictionary/mass-update', methods=['POST'])
 @require_admin
 def api_admin_dictionary_mass_update():
@@ -1137,67 +2348,170 @@ def api_admin_dictionary_mass_update():
         if not old_effect_name or not new_effect_name:
             return jsonify({'success': False, 'error': '効果名が指定されていません。'}), 400
         
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=DictCursor)
+        changeset_id, images = _apply_renames(
+            [(old_effect_name, new_effect_name, skill_texts or [])], 'mass_update',
+            old_effect_name=old_effect_name, new_effect_name=new_effect_name
+        )
         
-        # バックアップ作成（追記形式）
-        timestamp = datetime.now().strftime('%Y%m%dT%H%M%S')
-        backup_dir = PROJECT_ROOT / 'backups'
-        backup_dir.mkdir(exist_ok=True)
-        backup_path = backup_dir / 'skill_verified_effects_backup.jsonl'
+        return jsonify({'success': True, 'changeset_id': changeset_id, 'updated_count': len(images)})
+    except Exception as e:
+        app.logger.error(f"Mass update error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/dictionary/bulk-rename', methods=['POST'])
+@require_admin
+def api_admin_dictionary_bulk_rename():
+    """
+    複数の効果名をまとめて置き換え（旧効果名 → 新効果名の対応を1文で適用）
+    
+    dry_run=true ならDBに触れず、カタログの索引から影響する行数・スキル・エイリアンを返す
+    （どのエイリアンにも使われていないスキルの行は数えない）
+    """
+    try:
+        data = request.json or {}
+        try:
+            renames = parse_renames(data.get('renames'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        if data.get('dry_run'):
+            index = get_catalog_index()
+            previews = []
+            for old_name, new_name, skill_texts in renames:
+                counts = index.skills_with_effect(old_name)
+                if skill_texts is not None:
+                    counts = {text: counts[text] for text in skill_texts if text in counts}
+                aliens = {}
+                for text in counts:
+                    for alien in index.aliens_using(text):
+                        aliens[alien['id']] = alien
+                previews.append({
+                    'old_effect_name': old_name,
+                    'new_effect_name': new_name,
+                    'row_count': sum(counts.values()),
+                    'skill_texts': sorted(counts),
+                    'aliens': [aliens[alien_id] for alien_id in sorted(aliens)],
+                })
+            return jsonify({
+                'success': True,
+                'dry_run': True,
+                'updated_count': sum(preview['row_count'] for preview in previews),
+                'renames': previews
+            })
         
-        # 更新対象のデータを取得してバックアップ
-        cur.execute("""
-            SELECT * FROM skill_text_verified_effects
-            WHERE effect_name = %s AND skill_text = ANY(%s)
-        """, (old_effect_name, skill_texts))
-        
-        with open(backup_path, 'a', encoding='utf-8') as f:
-            # タイムスタンプマーカーを追加（一括置換の場合はメタ情報も含める）
-            meta_info = {
-                '__backup_timestamp__': timestamp,
-                '__backup_type__': 'mass_update',
-                '__old_effect_name__': old_effect_name,
-                '__new_effect_name__': new_effect_name
-            }
-            f.write(json.dumps(meta_info, ensure_ascii=False) + '\n')
-            # データを追記
-            for row in cur.fetchall():
-                f.write(json.dumps(dict(row), ensure_ascii=False, default=str) + '\n')
+        changeset_id, images = _apply_renames(renames, 'bulk_rename', renames=[
+            {'old_effect_name': old_name, 'new_effect_name': new_name}
+            for old_name, new_name, _ in renames
+        ])
         
-        # 一括更新
+        updated_by_name = {}
+        for before_image, _ in images:
+            updated_by_name[before_image['effect_name']] = updated_by_name.get(before_image['effect_name'], 0) + 1
+        return jsonify({
+            'success': True,
+            'changeset_id': changeset_id,
+            'updated_count': len(images),
+            'renames': [
+                {'old_effect_name': old_name, 'new_effect_name': new_name, 'row_count': updated_by_name.get(old_name, 0)}
+                for old_name, new_name, _ in renames
+            ]
+        })
+    except Exception as e:
+        app.logger.error(f"Bulk rename error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ============================================================================
+# 管理機能API: 変更履歴
+# ============================================================================
+@app.route('/api/admin/change-journal')
+@require_admin
+def api_admin_change_journal():
+    """最近のチェンジセットの一覧（新しい順）"""
+    try:
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        conn = get_read_connection()
+        cur = conn.cursor(cursor_factory=DictCursor)
         cur.execute("""
-            UPDATE skill_text_verified_effects
-            SET effect_name = %s
-            WHERE effect_name = %s AND skill_text = ANY(%s)
-        """, (new_effect_name, old_effect_name, skill_texts))
+            SELECT changeset_id, min(changed_at) AS changed_at, min(source) AS source,
+                   count(*) AS row_count, min(undone_by::text) AS undone_by
+            FROM change_journal
+            GROUP BY changeset_id
+            ORDER BY min(id) DESC
+            LIMIT %s
+        """, (limit,))
+        changesets = [{
+            'changeset_id': str(row['changeset_id']),
+            'changed_at': row['changed_at'].isoformat(),
+            'source': row['source'],
+            'row_count': row['row_count'],
+            'undone_by': row['undone_by'],
+        } for row in cur.fetchall()]
+        cur.close()
+        conn.close()
+        return jsonify({'success': True, 'changesets': changesets})
+    except Exception as e:
+        app.logger.error(f"Change journal error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/undo-changeset', methods=['POST'])
+@require_admin
+def api_admin_undo_changeset():
+    """
+    チェンジセットを取り消す
+    
+    対象の行がその後に変更されている場合は409で該当行を返す（force=true なら上書きする）
+    """
+    try:
+        data = request.json
+        changeset_id = data.get('changeset_id')
+        force = bool(data.get('force', False))
+        
+        if not changeset_id:
+            return jsonify({'success': False, 'error': 'changeset_idが指定されていません'}), 400
+        
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            result = journal.undo_changeset(cur, changeset_id, force=force)
+        except journal.ChangesetConflict as e:
+            conn.rollback()
+            cur.close()
+            conn.close()
+            return jsonify({'success': False, 'error': str(e), 'conflicts': e.conflicts}), 409
         
-        updated_count = cur.rowcount
+        if result is None:
+            conn.rollback()
+            cur.close()
+            conn.close()
+            return jsonify({'success': False, 'error': 'チェンジセットが見つからないか、既に取り消されています'}), 404
         
         conn.commit()
         cur.close()
         conn.close()
         
-        app.logger.info(f"Mass update backup created: {backup_path}")
-        
-        # キャッシュクリア
-        try:
-            if hasattr(get_all_aliens, 'cache_clear'):
-                get_all_aliens.cache_clear()
-            if hasattr(get_all_skill_requirements_new, 'cache_clear'):
-                get_all_skill_requirements_new.cache_clear()
-            if hasattr(get_correct_effect_names, 'cache_clear'):
-                get_correct_effect_names.cache_clear()
-            if hasattr(get_s_skill_effect_names, 'cache_clear'):
-                get_s_skill_effect_names.cache_clear()
-            if hasattr(get_alien_effects, 'cache_clear'):
-                get_alien_effects.cache_clear()
-        except Exception as e:
-            app.logger.warning(f"Cache clear warning: {e}")
+        # 戻した行のスキル・効果名の分だけカタログを部分更新
+        skill_texts, effect_names = set(), set()
+        for table_name, entries in result['tables'].items():
+            for _, before_image, after_image in entries:
+                for image in (before_image, after_image):
+                    if image is None:
+                        continue
+                    if table_name == 'correct_effect_names':
+                        effect_names.add(image['correct_name'])
+                    else:
+                        skill_texts.add(image['skill_text'])
+        patch_catalog_cache(
+            skill_texts=skill_texts, effect_names=effect_names,
+            dictionary='correct_effect_names' in result['tables']
+        )
         
-        return jsonify({'success': True, 'updated_count': updated_count})
+        return jsonify({
+            'success': True,
+            'changeset_id': result['changeset_id'],
+            'reverted_count': sum(len(entries) for entries in result['tables'].values())
+        })
     except Exception as e:
-        app.logger.error(f"Mass update error: {e}")
+        app.logger.error(f"Undo changeset error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/admin/validate-targets', methods=['POST'])
@@ -1272,23 +2586,10 @@ def api_admin_validate_targets():
 @app.route('/api/admin/get-effect-info/<effect_name>')
 @require_admin
 def api_admin_get_effect_info(effect_name):
-    """効果名からeffect_typeとcategoryを取得"""
+    """効果名からeffect_typeとcategoryを取得（カタログの効果辞書の索引から引く）"""
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=DictCursor)
-        
         # 辞書から取得（個性用と特技用の両方を取得）
-        cur.execute("""
-            SELECT correct_name, effect_type, category
-            FROM correct_effect_names
-            WHERE correct_name = %s
-            ORDER BY category
-        """, (effect_name,))
-        
-        results = [dict(row) for row in cur.fetchall()]
-        
-        cur.close()
-        conn.close()
+        results = get_catalog_index().effect_options(effect_name)
         
         if results:
             # 複数のカテゴリがある場合（個性用と特技用で異なる場合）
@@ -1311,24 +2612,10 @@ def api_admin_get_effect_info(effect_name):
 @app.route('/api/admin/check-skill-type/<skill_text>')
 @require_admin
 def api_admin_check_skill_type(skill_text):
-    """skill_textが特技か個性かを判定"""
+    """skill_textが特技か個性かを判定（カタログの索引から引く）"""
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=DictCursor)
-        
-        # 特技として登録されているかチェック
-        cur.execute("""
-            SELECT COUNT(*) > 0 as is_special
-            FROM alien
-            WHERE "S_Skill_text" = %s 
-              AND "S_Skill_text" IS NOT NULL 
-              AND "S_Skill_text" != 'なし'
-        """, (skill_text,))
-        
-        is_special = bool(cur.fetchone()[0])
-        
-        cur.close()
-        conn.close()
+        # 特技として登録されているかチェック（'なし' は特技に数えない）
+        is_special = get_catalog_index().is_special_skill(skill_text)
         
         return jsonify({
             'success': True,
@@ -1341,16 +2628,12 @@ def api_admin_check_skill_type(skill_text):
 @app.route('/api/admin/get-effect-usage')
 @require_admin
 def api_admin_get_effect_usage():
-    """効果名ごとの使用数を取得"""
+    """効果名ごとの使用数を取得（書き込み時にトリガーが更新する effect_usage を読む）"""
     try:
-        conn = get_db_connection()
+        conn = get_read_connection()
         cur = conn.cursor(cursor_factory=DictCursor)
         
-        cur.execute("""
-            SELECT effect_name, COUNT(*) as usage_count
-            FROM skill_text_verified_effects
-            GROUP BY effect_name
-        """)
+        cur.execute("SELECT effect_name, usage_count FROM effect_usage")
         
         usage_stats = {row['effect_name']: row['usage_count'] for row in cur.fetchall()}
         
@@ -1365,5 +2648,29 @@ def api_admin_get_effect_usage():
         app.logger.error(f"Effect usage error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# ============================================================================
+# 静的サイト書き出し（CLI）
+# ============================================================================
+@app.cli.command('freeze')
+@click.option('--output', default=str(PROJECT_ROOT / 'dist'), show_default=True,
+              help='出力先ディレクトリ')
+def freeze_command(output):
+    """公開ページを静的サイトとして書き出す（flask --app app freeze）"""
+    # キャッシュや保存済みスナップショットではなく、DBの最新状態から構築する
+    snapshot = build_catalog_snapshot()
+    manifest = export_static_site(
+        Path(output),
+        html=bytes(snapshot.section('html')),
+        catalog_json=bytes(snapshot.section('catalog.json')),
+        version=snapshot.version,
+        built_at=snapshot.built_at,
+        static_dir=PROJECT_ROOT / 'static'
+    )
+    click.echo(f"静的サイトを書き出しました: {output} (version={manifest['version']})")
+
+# 起動時にカタログを構築（CATALOG_WARM_START=0 で無効化）
+if _strtobool(os.environ.get('CATALOG_WARM_START', '1')):
+    warm_catalog()
+
 if __name__ == '__main__':
     app.run(debug=False)
\ No newline at end of file
@@ -0,0 +1,8 @@
+"""
+gunicorn設定
+
+preload_app により app.py をマスタープロセスで読み込み、起動時のカタログ構築
+（ウォームスタート）を1回だけ行う。構築済みのスナップショットは fork 後の
+各ワーカーへコピーオンライトで共有される
+"""
+preload_app = True
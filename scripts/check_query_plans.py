@@ -0,0 +1,322 @@
+"""
+クエリ実行計画の回帰チェック
+
+app.py・db_helpers.py・スクレイパーなどに書かれたSQLを抽出し、ローカルのPostgreSQLで
+EXPLAIN (GENERIC_PLAN, FORMAT JSON) を実行する。大きなテーブルに対して、絞り込み条件が
+あるのにシーケンシャルスキャンになっているクエリ（インデックス不足）があれば失敗する
+
+使い方:
+    python scripts/check_query_plans.py                  # DATABASE_URL のDBで確認
+    python scripts/check_query_plans.py --analyze -v     # 統計情報を更新してから、全クエリの結果を表示
+
+- パラメータ(%s)を含むクエリを値なしで計画させるため、PostgreSQL 16以上が必要
+- f文字列などで組み立てる動的SQLは静的に抽出できないためスキップする（一覧は -v で表示）
+- execute_values の VALUES %s は、列の別名や INSERT の列リストから列数を求めて
+  1行分の (%s, ...) に展開する（列数が分からない場合は動的SQLとしてスキップする）
+- 絞り込み条件の無い全件読み取り（カタログ構築など）のシーケンシャルスキャンは対象外
+"""
+import argparse
+import ast
+import json
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+import psycopg2
+
+# プロジェクトルートをパスに追加
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(PROJECT_ROOT / 'scripts'))
+
+from dotenv import load_dotenv
+
+from utils.data_access import CatalogReader
+
+try:
+    if sys.stdout and sys.stdout.encoding and sys.stdout.encoding.lower() != 'utf-8':
+        sys.stdout.reconfigure(encoding='utf-8')
+except Exception:
+    pass
+
+# 環境変数読み込み
+load_dotenv(dotenv_path=PROJECT_ROOT / '.env')
+
+# SQLを抽出する対象
+SOURCE_FILES = [
+    'app.py',
+    'scripts/run_automated_update.py',
+    'scripts/utils/db_helpers.py',
+    'scripts/scraping/*.py',
+]
+
+# 第1引数(execute)または第2引数(execute_values)がSQLの呼び出し
+SQL_CALLS = {'execute': 0, 'executemany': 0, 'execute_values': 1, 'execute_batch': 1}
+
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+
+# マイグレーションなどが参照するシステムカタログは対象外
+SYSTEM_SCHEMAS = ('pg_catalog', 'information_schema')
+
+_NAMED_PARAM = re.compile(r'%\((\w+)\)s')
+
+# execute_values が行の一覧に展開するプレースホルダー
+_VALUES_PLACEHOLDER = re.compile(r'\bVALUES\s+%s', re.IGNORECASE)
+# 列数の手がかり: (VALUES %s) AS v(a, b) の別名、INSERT INTO t (a, b) VALUES %s の列リスト
+_VALUES_ALIAS = re.compile(r'\bVALUES\s+%s\s*\)\s*(?:AS\s+)?\w+\s*\(([^)]*)\)', re.IGNORECASE)
+_INSERT_COLUMNS = re.compile(
+    r'\bINSERT\s+INTO\s+[\w."]+(?:\s+AS\s+\w+)?\s*\(([^)]*)\)\s*VALUES\s+%s', re.IGNORECASE
+)
+
+
+class Query(NamedTuple):
+    location: str
+    sql: str
+
+
+class Violation(NamedTuple):
+    query: Query
+    relation: str
+    relation_rows: float
+    plan_rows: float
+    filter: str
+
+
+def _call_name(node: ast.Call) -> Optional[str]:
+    func = node.func
+    return func.attr if isinstance(func, ast.Attribute) else getattr(func, 'id', None)
+
+
+def _sql_argument(node: ast.Call) -> Optional[ast.AST]:
+    name = _call_name(node)
+    if name not in SQL_CALLS:
+        return None
+    index = SQL_CALLS[name]
+    return node.args[index] if len(node.args) > index else None
+
+
+def expand_values_placeholder(sql: str) -> Optional[str]:
+    """
+    execute_values の VALUES %s を1行分の VALUES (%s, ...) に置き換える
+
+    Returns:
+        展開したSQL（列数が分からない場合はNone）
+    """
+    match = _VALUES_ALIAS.search(sql) or _INSERT_COLUMNS.search(sql)
+    if match is None or len(_VALUES_PLACEHOLDER.findall(sql)) != 1:
+        return None
+    arity = len([column for column in match.group(1).split(',') if column.strip()])
+    row = '(' + ', '.join(['%s'] * arity) + ')'
+    return _VALUES_PLACEHOLDER.sub(lambda _: f'VALUES {row}', sql)
+
+
+def extract_queries(path: Path, skipped: List[str]) -> Iterator[Query]:
+    """ソースファイルから文字列リテラルのSQLを抽出する"""
+    tree = ast.parse(path.read_text(encoding='utf-8'), filename=str(path))
+    rel_path = path.relative_to(PROJECT_ROOT).as_posix()
+    calls = [node for node in ast.walk(tree) if isinstance(node, ast.Call)]
+    for node in sorted(calls, key=lambda n: n.lineno):
+        arg = _sql_argument(node)
+        if arg is None:
+            continue
+        location = f'{rel_path}:{node.lineno}'
+        if not (isinstance(arg, ast.Constant) and isinstance(arg.value, str)):
+            skipped.append(location)
+            continue
+        sql = arg.value
+        if _call_name(node) == 'execute_values':
+            sql = expand_values_placeholder(sql)
+            if sql is None:
+                skipped.append(location)
+                continue
+        yield Query(location, sql)
+
+
+class _RecordingReader(CatalogReader):
+    """カタログ構築用リーダーが発行するSQLを記録する（DBには接続しない）"""
+
+    def __init__(self):
+        super().__init__(conn=None)
+        self.queries = []
+
+    def _stream(self, sql, params=()):
+        self.queries.append(sql)
+        return iter(())
+
+
+def catalog_reader_queries() -> Iterator[Query]:
+    """utils.data_access のカタログ読み取りクエリ"""
+    reader = _RecordingReader()
+    calls = [
+        ('fetch_aliens', ()),
+        ('fetch_requirement_rows', ()),
+        ('fetch_requirement_rows', ([1, 2],)),  # 部分更新（skill_idで絞り込み）
+        ('fetch_effect_rows', ()),
+        ('fetch_effect_rows', ([1, 2],)),
+        ('fetch_skill_versions', ()),
+        ('fetch_skill_versions', ([1, 2],)),
+        ('fetch_show_flags', ()),
+        ('fetch_effect_dictionary', (False,)),
+        ('fetch_effect_dictionary', (True,)),
+    ]
+    for name, args in calls:
+        getattr(reader, name)(*args)
+        yield Query(f'CatalogReader.{name}{args if args else ""}', reader.queries[-1])
+
+
+def to_generic_sql(sql: str) -> str:
+    """psycopg2形式のパラメータ(%s, %(name)s)をPostgreSQLの $n に置き換える"""
+    names = {}
+
+    def named(match):
+        return names.setdefault(match.group(1), f'${len(names) + 1}')
+
+    sql = _NAMED_PARAM.sub(named, sql)
+    parts = sql.split('%%')
+    counter = len(names)
+    converted = []
+    for part in parts:
+        pieces = part.split('%s')
+        for i, piece in enumerate(pieces[:-1]):
+            counter += 1
+            pieces[i] = f'{piece}${counter}'
+        converted.append(''.join(pieces))
+    return '%'.join(converted)
+
+
+def _walk_plan(plan: Dict) -> Iterator[Dict]:
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from _walk_plan(child)
+
+
+class PlanChecker:
+    def __init__(self, conn, min_rows: float, max_selectivity: float):
+        self.conn = conn
+        self.min_rows = min_rows
+        self.max_selectivity = max_selectivity
+        self._relation_rows = {}
+
+    def relation_rows(self, schema: str, relation: str) -> float:
+        key = (schema, relation)
+        if key not in self._relation_rows:
+            with self.conn.cursor() as cur:
+                cur.execute("""
+                    SELECT c.reltuples
+                    FROM pg_class c
+                    JOIN pg_namespace n ON n.oid = c.relnamespace
+                    WHERE n.nspname = %s AND c.relname = %s
+                """, (schema, relation))
+                row = cur.fetchone()
+            self._relation_rows[key] = max(float(row[0]), 0.0) if row else 0.0
+        return self._relation_rows[key]
+
+    def explain(self, query: Query) -> Dict:
+        with self.conn.cursor() as cur:
+            try:
+                cur.execute(f'EXPLAIN (GENERIC_PLAN, VERBOSE, FORMAT JSON) {to_generic_sql(query.sql)}')
+                result = cur.fetchone()[0]
+            finally:
+                # EXPLAIN はクエリを実行しないが、エラー時にトランザクションを戻すため毎回ロールバックする
+                self.conn.rollback()
+        if isinstance(result, str):
+            result = json.loads(result)
+        return result[0]['Plan']
+
+    def check(self, query: Query) -> List[Violation]:
+        violations = []
+        for node in _walk_plan(self.explain(query)):
+            if node.get('Node Type') != 'Seq Scan' or 'Filter' not in node:
+                continue
+            schema = node.get('Schema', 'public')
+            if schema in SYSTEM_SCHEMAS:
+                continue
+            relation_rows = self.relation_rows(schema, node['Relation Name'])
+            if relation_rows < self.min_rows:
+                continue
+            if node['Plan Rows'] <= relation_rows * self.max_selectivity:
+                violations.append(Violation(
+                    query, node['Relation Name'], relation_rows, node['Plan Rows'], node['Filter']
+                ))
+        return violations
+
+
+def collect_queries(skipped: List[str]) -> List[Query]:
+    queries = []
+    for pattern in SOURCE_FILES:
+        for path in sorted(PROJECT_ROOT.glob(pattern)):
+            queries.extend(extract_queries(path, skipped))
+    queries.extend(catalog_reader_queries())
+    return [q for q in queries if q.sql.lstrip().split(None, 1)[0].upper() in EXPLAINABLE]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='クエリ実行計画の回帰チェック')
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'),
+                        help='確認に使うPostgreSQL（デフォルト: DATABASE_URL）')
+    parser.add_argument('--min-rows', type=float, default=1000,
+                        help='この行数以上のテーブルのシーケンシャルスキャンを確認する（デフォルト: 1000）')
+    parser.add_argument('--max-selectivity', type=float, default=0.1,
+                        help='推定行数がテーブルのこの割合以下ならインデックス不足とみなす（デフォルト: 0.1）')
+    parser.add_argument('--analyze', action='store_true', help='確認前に ANALYZE で統計情報を更新する')
+    parser.add_argument('-v', '--verbose', action='store_true', help='全クエリの結果とスキップしたSQLを表示する')
+    args = parser.parse_args()
+
+    if not args.dsn:
+        print('エラー: --dsn または環境変数 DATABASE_URL を指定してください')
+        return 2
+
+    skipped = []
+    queries = collect_queries(skipped)
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        if conn.server_version < 160000:
+            print(f'エラー: PostgreSQL 16以上が必要です（接続先: {conn.server_version}）')
+            return 2
+        if args.analyze:
+            with conn.cursor() as cur:
+                cur.execute('ANALYZE')
+            conn.commit()
+
+        checker = PlanChecker(conn, args.min_rows, args.max_selectivity)
+        violations = []
+        errors = []
+        for query in queries:
+            try:
+                found = checker.check(query)
+            except psycopg2.Error as e:
+                errors.append((query, str(e).strip()))
+                continue
+            violations.extend(found)
+            if args.verbose:
+                print(f"{'NG' if found else 'OK'}  {query.location}")
+    finally:
+        conn.close()
+
+    print(f'\n確認したクエリ: {len(queries)}件 / スキップした動的SQL: {len(skipped)}件')
+    if args.verbose:
+        for location in skipped:
+            print(f'  スキップ: {location}')
+
+    for query, error in errors:
+        print(f'\n[ERROR] {query.location}\n  {error}')
+
+    for v in violations:
+        print(
+            f'\n[SEQ SCAN] {v.query.location}\n'
+            f'  テーブル: {v.relation}（約{v.relation_rows:.0f}行）→ 推定{v.plan_rows:.0f}行\n'
+            f'  条件: {v.filter}'
+        )
+
+    if violations or errors:
+        print(f'\n失敗: インデックス不足 {len(violations)}件 / EXPLAINエラー {len(errors)}件')
+        return 1
+    print('\nすべてのクエリがインデックスを利用できます')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,314 @@
+"""
+JSONLバックアップから skill_text_verified_effects へ一括取り込み（COPY + 集合演算のマージ）
+
+backups/skill_list_fixed.jsonl や special_skill_analysis.jsonl（export_skill_list_backup の形式）を
+1行ずつ検証・正規化しながら COPY FROM STDIN で一時テーブルに流し込み、1文でマージする。
+
+マージは (skill_text, effect_name) 単位で行う。取り込むファイルとDBで、そのキーの行の内容
+（重複行を含む）が異なるキーだけを、DBの行を削除してファイルの行で置き換える。
+内容はエクスポートと同じ式（EXPORT_EXPRESSIONS）で比べ、内容が同じキーには触れないため、
+エクスポートしたファイルをそのまま取り込み直しても何も書き込まない。
+change_journal テーブルがあれば、削除・追加した行を source='import' として記録する
+
+使い方:
+    python scripts/import_effects_jsonl.py backups/skill_list_fixed.jsonl backups/special_skill_analysis.jsonl
+    python scripts/import_effects_jsonl.py backups/skill_list_fixed.jsonl --dry-run
+    python scripts/import_effects_jsonl.py backups/skill_list_fixed.jsonl --prune   # ファイルに無い効果も削除
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import psycopg2
+
+# プロジェクトルートをパスに追加
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'scripts'))
+
+from dotenv import load_dotenv
+
+from utils.db_helpers import parse_requirement_details
+
+try:
+    if sys.stdout and sys.stdout.encoding and sys.stdout.encoding.lower() != 'utf-8':
+        sys.stdout.reconfigure(encoding='utf-8')
+except Exception:
+    pass
+
+# 環境変数読み込み
+load_dotenv(dotenv_path=PROJECT_ROOT / '.env')
+
+# 取り込む列（export_skill_list_backup の出力と同じ）
+IMPORT_COLUMNS = (
+    'skill_text', 'effect_name', 'effect_type', 'category', 'condition_target',
+    'requires_awakening', 'target', 'has_requirement', 'requirement_details', 'requirement_count',
+)
+TEXT_COLUMNS = ('skill_text', 'effect_name', 'effect_type', 'category', 'condition_target', 'target')
+
+# export_skill_list_backup が NULL を既定値に置き換えて書き出す列の式
+# （行の内容の比較もこの式で行い、DBの NULL とファイルの既定値を同じものとして扱う）
+EXPORT_EXPRESSIONS = {
+    'requirement_details': "COALESCE({alias}.requirement_details, '')",
+    'requirement_count': 'COALESCE({alias}.requirement_count, 1)',
+}
+
+MAX_REPORTED_ERRORS = 20
+
+
+def normalize_record(record: Dict[str, Any]) -> Tuple:
+    """
+    JSONLの1行を検証・正規化して IMPORT_COLUMNS 順のタプルにする（不正ならValueError）
+
+    - 文字列は前後の空白を除く（空文字は NULL にせずそのまま取り込む。エクスポートした値と一致させるため）
+    - has_requirement が真なら要求の形式を検証する（トリガーで取り込み全体が失敗しないように）
+    """
+    if not isinstance(record, dict):
+        raise ValueError('JSONオブジェクトではありません')
+    values = {}
+    for column in TEXT_COLUMNS:
+        value = record.get(column)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f'{column} が文字列ではありません: {value!r}')
+        values[column] = value.strip() if value is not None else None
+    if not values['skill_text']:
+        raise ValueError('skill_text がありません')
+    if not values['effect_name']:
+        raise ValueError('effect_name がありません')
+
+    for column in ('has_requirement', 'requires_awakening'):
+        value = record.get(column)
+        if value is not None and not isinstance(value, bool):
+            raise ValueError(f'{column} が真偽値ではありません: {value!r}')
+        values[column] = value
+    values['has_requirement'] = bool(values['has_requirement'])
+
+    details = record.get('requirement_details')
+    if details is not None and not isinstance(details, str):
+        raise ValueError(f'requirement_details が文字列ではありません: {details!r}')
+    values['requirement_details'] = details.strip() if details is not None else None
+
+    count = record.get('requirement_count')
+    if count is not None and (isinstance(count, bool) or not isinstance(count, int)):
+        raise ValueError(f'requirement_count が整数ではありません: {count!r}')
+    values['requirement_count'] = count
+
+    if values['has_requirement']:
+        parse_requirement_details(values['requirement_details'], count)
+
+    return tuple(values[column] for column in IMPORT_COLUMNS)
+
+
+def _copy_value(value: Any) -> str:
+    """COPY のテキスト形式の1値"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return (
+        str(value).replace('\\', '\\\\').replace('\t', '\\t')
+        .replace('\n', '\\n').replace('\r', '\\r')
+    )
+
+
+class _CopySource:
+    """行のイテレータを COPY FROM STDIN に渡せるファイル風オブジェクトにする"""
+
+    def __init__(self, lines: Iterator[str]):
+        self._lines = lines
+        self._buffer = b''
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line.encode('utf-8')
+        if size < 0:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+class Importer:
+    def __init__(self, paths: List[Path]):
+        self.paths = paths
+        self.row_count = 0
+        self.errors: List[Tuple[str, str]] = []
+
+    def copy_lines(self) -> Iterator[str]:
+        """全ファイルを1行ずつ読み、正規化した行を COPY のテキスト形式で返す（不正な行は記録して除外）"""
+        line_no = 0
+        for path in self.paths:
+            with path.open(encoding='utf-8') as f:
+                for file_line_no, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        values = normalize_record(json.loads(line))
+                    except ValueError as e:  # json.JSONDecodeError も含む
+                        self.errors.append((f'{path.name}:{file_line_no}', str(e)))
+                        continue
+                    line_no += 1
+                    self.row_count += 1
+                    yield '\t'.join(_copy_value(v) for v in (*values, line_no)) + '\n'
+
+    def load(self, cur) -> None:
+        """一時テーブル effects_import を作り、全ファイルを COPY で流し込む（不正な行は errors に記録）"""
+        # 型は本テーブルと同じにする（制約・デフォルト値は持たない）
+        cur.execute(f"""
+            CREATE TEMP TABLE effects_import ON COMMIT DROP AS
+            SELECT {', '.join(IMPORT_COLUMNS)} FROM skill_text_verified_effects WITH NO DATA
+        """)
+        cur.execute("ALTER TABLE effects_import ADD COLUMN line_no INTEGER")
+        cur.copy_expert(
+            f"COPY effects_import ({', '.join(IMPORT_COLUMNS)}, line_no) FROM STDIN",
+            _CopySource(self.copy_lines())
+        )
+
+    def merge(self, cur, prune: bool = False) -> Tuple[int, int, bool]:
+        """
+        load() した行を skill_text_verified_effects にマージする（コミットは呼び出し元で行う）
+
+        Returns:
+            (削除した行数, 追加した行数, 変更履歴を記録したか)
+        """
+        cur.execute("SELECT to_regclass('public.change_journal') IS NOT NULL")
+        journal = cur.fetchone()[0]
+        cur.execute("ANALYZE effects_import")
+        cur.execute(_merge_sql(prune, journal), {'changeset_id': str(uuid.uuid4())})
+        operations = [row[0] for row in cur.fetchall()]
+        return operations.count('D'), operations.count('I'), journal
+
+
+def _merge_sql(prune: bool, journal: bool) -> str:
+    columns = ', '.join(IMPORT_COLUMNS)
+    # 行の内容（重複行を含む）をキーごとに比較するための指紋（エクスポートと同じ式の値で比べる）
+    row_values = ', '.join(EXPORT_EXPRESSIONS.get(c, '{alias}.' + c) for c in IMPORT_COLUMNS)
+    row_digest = f"md5(row({row_values})::text)"
+    fingerprint = f'array_agg({row_digest} ORDER BY {row_digest})'
+    prune_sql = """
+        , pruned AS (
+            DELETE FROM skill_text_verified_effects e
+            WHERE e.skill_text IN (SELECT skill_text FROM incoming)
+              AND NOT EXISTS (
+                  SELECT 1 FROM incoming i
+                  WHERE i.skill_text = e.skill_text AND i.effect_name = e.effect_name
+              )
+            RETURNING to_jsonb(e) AS image
+        )""" if prune else """
+        , pruned AS (SELECT NULL::jsonb AS image WHERE false)"""
+    if journal:
+        tail = """
+        INSERT INTO change_journal (changeset_id, source, table_name, operation, row_key, before_image, after_image)
+        SELECT %(changeset_id)s::uuid, 'import', 'skill_text_verified_effects', op, jsonb_build_object('id', image->'id'),
+               CASE WHEN op = 'D' THEN image END, CASE WHEN op = 'I' THEN image END
+        FROM (
+            SELECT 'D' AS op, image FROM removed
+            UNION ALL SELECT 'D', image FROM pruned
+            UNION ALL SELECT 'I', image FROM added
+        ) changes
+        RETURNING operation"""
+    else:
+        tail = """
+        SELECT 'D' FROM removed
+        UNION ALL SELECT 'D' FROM pruned
+        UNION ALL SELECT 'I' FROM added"""
+    return f"""
+        WITH incoming AS (
+            SELECT skill_text, effect_name, {fingerprint.format(alias='s')} AS fingerprint
+            FROM effects_import s
+            GROUP BY skill_text, effect_name
+        ), existing AS (
+            SELECT e.skill_text, e.effect_name, {fingerprint.format(alias='e')} AS fingerprint
+            FROM skill_text_verified_effects e
+            JOIN incoming i ON i.skill_text = e.skill_text AND i.effect_name = e.effect_name
+            GROUP BY e.skill_text, e.effect_name
+        ), changed AS (
+            SELECT i.skill_text, i.effect_name
+            FROM incoming i
+            LEFT JOIN existing x ON x.skill_text = i.skill_text AND x.effect_name = i.effect_name
+            WHERE x.fingerprint IS DISTINCT FROM i.fingerprint
+        ), removed AS (
+            DELETE FROM skill_text_verified_effects e
+            USING changed c
+            WHERE e.skill_text = c.skill_text AND e.effect_name = c.effect_name
+            RETURNING to_jsonb(e) AS image
+        ), added AS (
+            INSERT INTO skill_text_verified_effects AS e ({columns})
+            SELECT {', '.join('s.' + c for c in IMPORT_COLUMNS)}
+            FROM effects_import s
+            JOIN changed c ON c.skill_text = s.skill_text AND c.effect_name = s.effect_name
+            ORDER BY s.line_no
+            RETURNING to_jsonb(e) AS image
+        ){prune_sql}
+        {tail}
+    """
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='JSONLバックアップから skill_text_verified_effects へ一括取り込み')
+    parser.add_argument('paths', nargs='+', type=Path, help='取り込むJSONLファイル')
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'),
+                        help='取り込み先のPostgreSQL（デフォルト: DATABASE_URL）')
+    parser.add_argument('--prune', action='store_true',
+                        help='ファイルに含まれるスキルについて、ファイルに無い効果をDBから削除する')
+    parser.add_argument('--skip-invalid', action='store_true',
+                        help='不正な行を除外して取り込みを続ける（デフォルトは1行でもあれば中止）')
+    parser.add_argument('--dry-run', action='store_true', help='マージ結果の件数だけを表示してロールバックする')
+    args = parser.parse_args()
+
+    if not args.dsn:
+        print('エラー: --dsn または環境変数 DATABASE_URL を指定してください')
+        return 2
+    for path in args.paths:
+        if not path.exists():
+            print(f'エラー: ファイルが見つかりません: {path}')
+            return 2
+
+    start = time.monotonic()
+    importer = Importer(args.paths)
+    conn = psycopg2.connect(args.dsn)
+    try:
+        with conn.cursor() as cur:
+            importer.load(cur)
+            copied = time.monotonic()
+
+            for location, message in importer.errors[:MAX_REPORTED_ERRORS]:
+                print(f'  不正な行 {location}: {message}')
+            if len(importer.errors) > MAX_REPORTED_ERRORS:
+                print(f'  ...ほか{len(importer.errors) - MAX_REPORTED_ERRORS}行')
+            if importer.errors and not args.skip_invalid:
+                conn.rollback()
+                print(f'\n中止: 不正な行が{len(importer.errors)}行あります（--skip-invalid で除外して取り込み）')
+                return 1
+
+            deleted, inserted, journal = importer.merge(cur, args.prune)
+
+        if args.dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    elapsed = time.monotonic() - start
+    print(f'読み込み: {importer.row_count}行（不正 {len(importer.errors)}行）COPY {copied - start:.1f}秒')
+    print(f'マージ: 削除 {deleted}行 / 追加 {inserted}行 合計 {elapsed:.1f}秒' + ('（dry-run: ロールバック）' if args.dry_run else ''))
+    if not journal:
+        print('注意: change_journal テーブルが無いため変更履歴は記録していません')
+    if (deleted or inserted) and not args.dry_run:
+        print('公開ページのカタログは次回の再構築（CATALOG_TTL_SECONDS 経過後）で反映されます')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+バックアップストア（backups/store/）の操作
+
+使い方:
+    python scripts/manage_backups.py list [--since 20260101T000000]
+    python scripts/manage_backups.py show 20260105T120000 > rows.jsonl     # その時刻以前で最新のバックアップの行
+    python scripts/manage_backups.py import-legacy backups/skill_verified_effects_backup.jsonl
+
+import-legacy は旧形式（タイムスタンプマーカー行 + 全行のJSONL）を取り込む。
+同じ内容の行は1回しか保存しないため、全体バックアップの繰り返しも小さくなる
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'scripts'))
+
+from utils.backup_store import BackupStore
+
+try:
+    if sys.stdout and sys.stdout.encoding and sys.stdout.encoding.lower() != 'utf-8':
+        sys.stdout.reconfigure(encoding='utf-8')
+except Exception:
+    pass
+
+DEFAULT_STORE_DIR = Path(os.environ.get('BACKUP_STORE_DIR') or PROJECT_ROOT / 'backups' / 'store')
+
+
+def cmd_list(store: BackupStore, args) -> int:
+    entries = store.entries(since=args.since, until=args.until)
+    for entry in entries:
+        meta = ' '.join(f'{key}={value}' for key, value in entry['meta'].items() if value is not None)
+        print(f"{entry['timestamp']}  {entry['type']:<14} 行数 {len(entry['rows']):>6}  新規 {len(entry['stored']):>6}  {meta}")
+    print(f'\n{len(entries)}件')
+    return 0
+
+
+def cmd_show(store: BackupStore, args) -> int:
+    entries = store.entries(until=args.timestamp)
+    if not entries:
+        print(f'エラー: {args.timestamp} 以前のバックアップがありません', file=sys.stderr)
+        return 1
+    entry = entries[-1]
+    print(f"{entry['timestamp']} ({entry['type']}) {len(entry['rows'])}行", file=sys.stderr)
+    for row in store.read(entry):
+        print(json.dumps(row, ensure_ascii=False))
+    return 0
+
+
+def _read_legacy(path: Path):
+    """旧形式のJSONLを (マーカー, 行リスト) に分けて返す"""
+    marker, rows = None, []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if '__backup_timestamp__' in record:
+                if marker is not None:
+                    yield marker, rows
+                marker, rows = record, []
+            else:
+                rows.append(record)
+    if marker is not None:
+        yield marker, rows
+
+
+def cmd_import_legacy(store: BackupStore, args) -> int:
+    count = 0
+    for marker, rows in _read_legacy(Path(args.path)):
+        meta = {
+            key.strip('_'): value for key, value in marker.items()
+            if key not in ('__backup_timestamp__', '__backup_type__')
+        }
+        entry = store.append(
+            rows, marker.get('__backup_type__', 'legacy'),
+            timestamp=marker['__backup_timestamp__'], **meta
+        )
+        count += 1
+        print(f"{entry['timestamp']}: {len(entry['rows'])}行（新規 {len(entry['stored'])}行）")
+    print(f'\n{count}件のバックアップを取り込みました')
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='バックアップストアの操作')
+    parser.add_argument('--store', default=str(DEFAULT_STORE_DIR), help='バックアップストアのディレクトリ')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = subparsers.add_parser('list', help='バックアップの一覧')
+    list_parser.add_argument('--since', help='この時刻以降（YYYYMMDDTHHMMSS）')
+    list_parser.add_argument('--until', help='この時刻以前（YYYYMMDDTHHMMSS）')
+
+    show_parser = subparsers.add_parser('show', help='指定時刻以前で最新のバックアップの行をJSONLで出力')
+    show_parser.add_argument('timestamp', help='YYYYMMDDTHHMMSS')
+
+    import_parser = subparsers.add_parser('import-legacy', help='旧形式のJSONLバックアップを取り込む')
+    import_parser.add_argument('path')
+
+    args = parser.parse_args()
+    store = BackupStore(Path(args.store))
+    commands = {'list': cmd_list, 'show': cmd_show, 'import-legacy': cmd_import_legacy}
+    return commands[args.command](store, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
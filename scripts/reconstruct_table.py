@@ -0,0 +1,98 @@
+"""
+変更履歴（change_journal）からテーブルを指定時刻の状態に復元する
+
+現在のテーブルを読み込み、指定時刻より後の変更を新しい順に打ち消す。
+スナップショット全体を戻すのではなく、その後に記録された変更の数だけ処理する。
+結果はJSONLで出力する（DBは変更しない）
+
+使い方:
+    python scripts/reconstruct_table.py 2026-01-05T12:00:00+09:00 > effects_asof.jsonl
+    python scripts/reconstruct_table.py 2026-01-05T12:00:00 --table correct_effect_names --changed-only
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+import psycopg2
+
+# プロジェクトルートをパスに追加
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'scripts'))
+
+from dotenv import load_dotenv
+
+from utils.change_journal import JOURNAL_TABLES, reconstruct_table
+from utils.data_access import FETCH_BATCH_SIZE
+
+try:
+    if sys.stdout and sys.stdout.encoding and sys.stdout.encoding.lower() != 'utf-8':
+        sys.stdout.reconfigure(encoding='utf-8')
+except Exception:
+    pass
+
+# 環境変数読み込み
+load_dotenv(dotenv_path=PROJECT_ROOT / '.env')
+
+
+def _stream(conn, name, sql, params):
+    # 全行をメモリに読み込まないよう名前付き（サーバーサイド）カーソルで読む
+    cur = conn.cursor(name)
+    cur.itersize = FETCH_BATCH_SIZE
+    try:
+        cur.execute(sql, params)
+        yield from cur
+    finally:
+        cur.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='変更履歴からテーブルを指定時刻の状態に復元する')
+    parser.add_argument('as_of', help='復元する時刻（ISO 8601。タイムゾーン省略時はDBのタイムゾーン）')
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'),
+                        help='読み取るPostgreSQL（デフォルト: DATABASE_URL）')
+    parser.add_argument('--table', default='skill_text_verified_effects', choices=sorted(JOURNAL_TABLES))
+    parser.add_argument('--changed-only', action='store_true',
+                        help='現在と異なる行だけを出力する（現在は存在しない行も含む）')
+    args = parser.parse_args()
+
+    if not args.dsn:
+        print('エラー: --dsn または環境変数 DATABASE_URL を指定してください', file=sys.stderr)
+        return 2
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        # 読み取りの間にテーブルと変更履歴がずれないよう、同じスナップショットで読む
+        conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+        current_rows = (row[0] for row in _stream(
+            conn, 'reconstruct_current', f'SELECT to_jsonb(t) FROM {args.table} t', None
+        ))
+        current_images = set()
+        if args.changed_only:
+            current_rows = list(current_rows)
+            current_images = {json.dumps(row, sort_keys=True) for row in current_rows}
+        journal_rows = _stream(conn, 'reconstruct_journal', """
+            SELECT operation, row_key, before_image
+            FROM change_journal
+            WHERE table_name = %s AND changed_at > %s::timestamptz
+            ORDER BY id DESC
+        """, (args.table, args.as_of))
+        rows = reconstruct_table(current_rows, journal_rows, args.table)
+    finally:
+        conn.close()
+
+    written = 0
+    # 主キーに NULL（correct_effect_names.category）が含まれても並べられるように、NULL を末尾にする
+    for key in sorted(rows, key=lambda k: tuple((v is None, v if v is not None else '') for v in k)):
+        row = rows[key]
+        if args.changed_only and json.dumps(row, sort_keys=True) in current_images:
+            continue
+        print(json.dumps(row, ensure_ascii=False))
+        written += 1
+    print(f'{args.table} @ {args.as_of}: {len(rows)}行（出力 {written}行）', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
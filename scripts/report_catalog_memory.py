@@ -0,0 +1,136 @@
+"""
+カタログ（ALIEN_EFFECTS）のメモリ使用量レポート
+
+効果情報をレコード（utils.effect_records.EffectRecord）で保持した場合と、
+従来の辞書（1効果ごとに10キーの dict、文字列は行ごとに別オブジェクト）で保持した場合の
+保持メモリ・構築時のピークメモリ・JSON変換時間を比較する
+
+使い方:
+    python scripts/report_catalog_memory.py                       # DATABASE_URL から読み取り
+    python scripts/report_catalog_memory.py --sqlite .cache/catalog.sqlite
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+try:
+    if sys.stdout and sys.stdout.encoding and sys.stdout.encoding.lower() != 'utf-8':
+        sys.stdout.reconfigure(encoding='utf-8')
+except Exception:
+    pass
+
+
+def deep_size(obj) -> int:
+    """オブジェクトが参照する全オブジェクトの合計サイズ（共有オブジェクトは1回だけ数える）"""
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set)):
+            stack.extend(item)
+        elif hasattr(item, '__slots__'):
+            stack.extend(getattr(item, name) for name in item.__slots__)
+    return total
+
+
+def _copy_str(value):
+    # DBドライバが行ごとに別の文字列オブジェクトを返していた状態を再現する
+    return value.encode('utf-8').decode('utf-8') if isinstance(value, str) else value
+
+
+def to_legacy(alien_effects):
+    """レコードを従来の辞書形式に変換する（比較用）"""
+    converted = {}
+    legacy_lists = {}
+    for alien_id, slots in alien_effects.items():
+        converted[alien_id] = {}
+        for slot, records in slots.items():
+            key = id(records)
+            if key not in legacy_lists:
+                legacy_lists[key] = [
+                    {field: _copy_str(value) for field, value in record.to_dict().items()}
+                    for record in records
+                ]
+            converted[alien_id][slot] = legacy_lists[key]
+    return converted
+
+
+def measure(func):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def _mb(size: int) -> str:
+    return f'{size / 1024 / 1024:8.2f} MB'
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='カタログのメモリ使用量レポート')
+    parser.add_argument('--sqlite', help='組み込みSQLiteのカタログから読み取る（CATALOG_SQLITE_PATH と同じ）')
+    args = parser.parse_args()
+
+    if args.sqlite:
+        os.environ['CATALOG_SQLITE_PATH'] = args.sqlite
+    # レポートのためだけにスナップショットを構築・公開しない
+    os.environ['CATALOG_WARM_START'] = '0'
+
+    import app as app_module
+    from utils.effect_records import dump_alien_effects
+
+    catalog, build_time, build_peak = measure(app_module.build_catalog)
+    alien_effects = catalog['alien_effects']
+    legacy = to_legacy(alien_effects)
+
+    record_count = sum(len(records) for records in {
+        id(records): records for slots in alien_effects.values() for records in slots.values()
+    }.values())
+    record_size = deep_size(alien_effects)
+    legacy_size = deep_size(legacy)
+
+    _, record_dump_time, record_dump_peak = measure(
+        lambda: dump_alien_effects(alien_effects))
+    _, legacy_dump_time, legacy_dump_peak = measure(
+        lambda: json.dumps(legacy, sort_keys=True, separators=(',', ':')))
+
+    print('=== カタログ メモリレポート ===')
+    print(f'エイリアン数: {len(alien_effects)} / 効果レコード数（共有分を除く）: {record_count}')
+    print()
+    print(f'カタログ構築      : {build_time * 1000:8.1f} ms  ピーク {_mb(build_peak)}')
+    print()
+    print('ALIEN_EFFECTS の保持メモリ')
+    print(f'  レコード（__slots__ + インターン）: {_mb(record_size)}')
+    print(f'  辞書（従来の形式）                : {_mb(legacy_size)}')
+    if legacy_size:
+        print(f'  削減率                            : {(1 - record_size / legacy_size) * 100:7.1f} %')
+    print()
+    print('ALIEN_EFFECTS のJSON変換')
+    print(f'  レコードから直接: {record_dump_time * 1000:8.1f} ms  ピーク {_mb(record_dump_peak)}')
+    print(f'  辞書を json.dumps: {legacy_dump_time * 1000:8.1f} ms  ピーク {_mb(legacy_dump_peak)}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
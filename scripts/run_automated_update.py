@@ -6,10 +6,12 @@
 import os
 import json
 import sys
+import hashlib
 import argparse
+import tempfile
 import subprocess
 from pathlib import Path
-from typing import List, Set, Dict, Optional
+from typing import List, Set, Dict, Optional, Tuple
 import psycopg2
 from psycopg2.extras import DictCursor
 
@@ -117,6 +119,7 @@ utils_dir = PROJECT_ROOT / 'scripts' / 'utils'
 sys.path.insert(0, str(utils_dir))
 
 from utils.discord_notifier import DiscordNotifier, send_scraping_result_detailed
+from utils.data_access import export_sqlite_catalog, FETCH_BATCH_SIZE
 
 # combined_scraperのインポート
 import importlib.util
@@ -204,48 +207,98 @@ def ensure_connection(conn):
     return conn
 
 
-def export_skill_list_backup(conn, output_path: Path) -> int:
+def _file_sha256(path: Path) -> Optional[str]:
+    if not path.exists():
+        return None
+    digest = hashlib.sha256()
+    with path.open('rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def export_skill_list_backup(conn, output_path: Path) -> Tuple[int, bool]:
     """
     skill_text_verified_effectsテーブルの最新状態をJSONLにエクスポートする
+    
+    サーバーサイドカーソルで読みながら一時ファイルへ書き出し、内容のハッシュが
+    既存ファイルと異なる場合だけ置き換える（変更が無ければファイルに触れない）
+    
+    Returns:
+        (出力件数, ファイルを更新したか)
     """
     conn = ensure_connection(conn)
-    with conn.cursor(cursor_factory=DictCursor) as cur:
-        cur.execute("""
-            SELECT
-                skill_text,
-                effect_name,
-                effect_type,
-                category,
-                condition_target,
-                requires_awakening,
-                target,
-                has_requirement,
-                COALESCE(requirement_details, '') AS requirement_details,
-                COALESCE(requirement_count, 1) AS requirement_count
-            FROM skill_text_verified_effects
-            ORDER BY skill_text, effect_name
-        """)
-        rows = cur.fetchall()
-    
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    with output_path.open('w', encoding='utf-8') as f:
-        for row in rows:
-            record = {
-                "skill_text": row["skill_text"],
-                "effect_name": row["effect_name"],
-                "effect_type": row["effect_type"],
-                "category": row["category"],
-                "condition_target": row["condition_target"],
-                "requires_awakening": row["requires_awakening"],
-                "target": row["target"],
-                "has_requirement": row["has_requirement"],
-                "requirement_details": row["requirement_details"],
-                "requirement_count": row["requirement_count"],
-            }
-            f.write(json.dumps(record, ensure_ascii=False))
-            f.write('\n')
-    
-    return len(rows)
+    fd, tmp_path = tempfile.mkstemp(dir=str(output_path.parent), prefix=output_path.name, suffix='.tmp')
+    digest = hashlib.sha256()
+    count = 0
+    try:
+        with os.fdopen(fd, 'wb') as f, conn.cursor('export_skill_list', cursor_factory=DictCursor) as cur:
+            cur.itersize = FETCH_BATCH_SIZE
+            cur.execute("""
+                SELECT
+                    skill_text,
+                    effect_name,
+                    effect_type,
+                    category,
+                    condition_target,
+                    requires_awakening,
+                    target,
+                    has_requirement,
+                    COALESCE(requirement_details, '') AS requirement_details,
+                    COALESCE(requirement_count, 1) AS requirement_count
+                FROM skill_text_verified_effects
+                ORDER BY skill_text, effect_name
+            """)
+            for row in cur:
+                record = {
+                    "skill_text": row["skill_text"],
+                    "effect_name": row["effect_name"],
+                    "effect_type": row["effect_type"],
+                    "category": row["category"],
+                    "condition_target": row["condition_target"],
+                    "requires_awakening": row["requires_awakening"],
+                    "target": row["target"],
+                    "has_requirement": row["has_requirement"],
+                    "requirement_details": row["requirement_details"],
+                    "requirement_count": row["requirement_count"],
+                }
+                line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+                digest.update(line)
+                f.write(line)
+                count += 1
+        # サーバーサイドカーソルの読み取りトランザクションを終了する
+        conn.commit()
+        
+        if digest.hexdigest() == _file_sha256(output_path):
+            os.remove(tmp_path)
+            return count, False
+        os.replace(tmp_path, output_path)
+        return count, True
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def freeze_static_site(output_dir: Path) -> bool:
+    """
+    公開ページを静的サイトとして書き出す（app.py の freeze コマンドを実行）
+    """
+    env = os.environ.copy()
+    # 書き出しはDBの最新状態から行うため、起動時のカタログ構築は不要
+    env['CATALOG_WARM_START'] = '0'
+    result = subprocess.run(
+        [sys.executable, '-m', 'flask', '--app', 'app', 'freeze', '--output', str(output_dir)],
+        cwd=str(PROJECT_ROOT),
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or result.stdout.strip() or 'freeze failed')
+    print(f"  -> {result.stdout.strip()}")
+    return True
 
 
 def expand_id_argument(raw: str) -> List[int]:
@@ -285,7 +338,9 @@ def main(
     skip_images: bool = False,
     discord_webhook_url: str = None,
     full_scrape: bool = False,
-    scrape_ids: Optional[List[int]] = None
+    scrape_ids: Optional[List[int]] = None,
+    freeze_output: Optional[Path] = None,
+    sqlite_output: Optional[Path] = None
 ) -> int:
     """
     メイン処理
@@ -296,6 +351,8 @@ def main(
         discord_webhook_url: Discord Webhook URL
         full_scrape: 全体スクレイピングを実行するか
         scrape_ids: 特定のIDのみスクレイピング
+        freeze_output: 静的サイトの出力先（Noneなら書き出さない）
+        sqlite_output: カタログ読み取り用SQLiteの出力先（Noneなら書き出さない）
     
     Returns:
         終了コード（0=成功、1=失敗）
@@ -434,13 +491,36 @@ def main(
         
         # skill_list_fixed.jsonl を最新状態に更新
         try:
-            exported_count = export_skill_list_backup(conn, PROJECT_ROOT / 'backups' / 'skill_list_fixed.jsonl')
-            print(f"  -> skill_list_fixed.jsonl を更新しました ({exported_count}件)")
+            exported_count, exported_changed = export_skill_list_backup(conn, PROJECT_ROOT / 'backups' / 'skill_list_fixed.jsonl')
+            if exported_changed:
+                print(f"  -> skill_list_fixed.jsonl を更新しました ({exported_count}件)")
+            else:
+                print(f"  -> skill_list_fixed.jsonl は変更ありません ({exported_count}件)")
         except Exception as e:
             error_msg = f"バックアップ出力エラー: {str(e)}"
             errors.append(error_msg)
             print(f"エラー: {error_msg}")
         
+        # 静的サイトを書き出し（公開ページを静的ホスティングから配信するため）
+        if freeze_output is not None:
+            try:
+                freeze_static_site(freeze_output)
+            except Exception as e:
+                error_msg = f"静的サイト書き出しエラー: {str(e)}"
+                errors.append(error_msg)
+                print(f"エラー: {error_msg}")
+        
+        # カタログ読み取り用のSQLiteファイルを書き出し（app.py の CATALOG_SQLITE_PATH で使用）
+        if sqlite_output is not None:
+            try:
+                conn = ensure_connection(conn)
+                counts = export_sqlite_catalog(conn, sqlite_output)
+                print(f"  -> {sqlite_output.name} を更新しました ({', '.join(f'{k}: {v}件' for k, v in counts.items())})")
+            except Exception as e:
+                error_msg = f"SQLite書き出しエラー: {str(e)}"
+                errors.append(error_msg)
+                print(f"エラー: {error_msg}")
+        
         # ステップ2: 最終結果をDiscordに通知
         if notifier and discord_webhook_url:
             # エラー情報を準備
@@ -552,6 +632,21 @@ if __name__ == '__main__':
         action='store_true',
         help='全体スクレイピングを実行（デフォルトは逆順スクレイピング）'
     )
+    parser.add_argument(
+        '--skip-freeze',
+        action='store_true',
+        help='静的サイトの書き出しをスキップ'
+    )
+    parser.add_argument(
+        '--freeze-output',
+        type=str,
+        help='静的サイトの出力先（環境変数STATIC_EXPORT_DIRでも指定可能、既定: dist）'
+    )
+    parser.add_argument(
+        '--export-sqlite',
+        action='store_true',
+        help='カタログ読み取り用のSQLiteを書き出す（環境変数CATALOG_SQLITE_PATHが設定されていれば常に書き出す、既定: .cache/catalog.sqlite）'
+    )
     parser.add_argument(
         '--scrape-ids',
         type=str,
@@ -587,7 +682,13 @@ if __name__ == '__main__':
         skip_images=args.skip_images,
         discord_webhook_url=discord_webhook_url,
         full_scrape=args.full_scrape,
-        scrape_ids=scrape_ids if scrape_ids else None
+        scrape_ids=scrape_ids if scrape_ids else None,
+        freeze_output=None if args.skip_freeze else Path(
+            args.freeze_output or os.environ.get('STATIC_EXPORT_DIR') or PROJECT_ROOT / 'dist'
+        ),
+        sqlite_output=Path(
+            os.environ.get('CATALOG_SQLITE_PATH') or PROJECT_ROOT / '.cache' / 'catalog.sqlite'
+        ) if args.export_sqlite or os.environ.get('CATALOG_SQLITE_PATH') else None
     )
     
     sys.exit(exit_code)
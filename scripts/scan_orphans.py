@@ -0,0 +1,198 @@
+"""
+どのエイリアンにも使われていない効果・辞書の検出と削除
+
+スクレイパーがエイリアンのスキルテキストを更新しても、古いスキルテキストの
+skill_text_verified_effects の行は残り続ける。これらを集合演算のSQLで検出して報告し、
+--delete を指定するとバックアップストアへ退避してから削除する
+
+- 孤立した効果: skill_id がどのエイリアンの skill_id1-3・s_skill_id からも参照されていない行
+  （skill_id が NULL の行はトリガーでまだ紐付けられていないか旧データのため、件数だけを報告して削除しない）
+- 孤立した辞書: correct_effect_names のうち、どの効果にも使われていない効果名（effect_usage にない名前）
+  辞書は使う前に登録しておくこともあるため、削除は --delete-dictionary を指定した場合のみ
+
+削除は change_journal に source='orphan_scan' として記録するため、管理画面の取り消し
+（/api/admin/undo-changeset）で戻せる。退避先は効果が --store、辞書が --dictionary-store
+（既定は <store>-dictionary。行の形式が異なるため同じストアに混ぜない）
+
+使い方:
+    python scripts/scan_orphans.py                        # 報告のみ
+    python scripts/scan_orphans.py --delete               # 孤立した効果を退避して削除
+    python scripts/scan_orphans.py --delete --delete-dictionary
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import psycopg2
+from psycopg2.extras import DictCursor
+
+# プロジェクトルートをパスに追加
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'scripts'))
+
+from dotenv import load_dotenv
+
+from utils.backup_store import BackupStore
+from utils.change_journal import DELETE, new_changeset_id, write_change_journal
+
+try:
+    if sys.stdout and sys.stdout.encoding and sys.stdout.encoding.lower() != 'utf-8':
+        sys.stdout.reconfigure(encoding='utf-8')
+except Exception:
+    pass
+
+# 環境変数読み込み
+load_dotenv(dotenv_path=PROJECT_ROOT / '.env')
+
+DEFAULT_STORE_DIR = Path(os.environ.get('BACKUP_STORE_DIR') or PROJECT_ROOT / 'backups' / 'store')
+
+
+def dictionary_store_dir(store_dir: Path) -> Path:
+    """辞書（correct_effect_names）の行を退避するストア（効果のストアの隣）"""
+    return store_dir.with_name(store_dir.name + '-dictionary')
+
+# エイリアンが参照しているskill_id
+USED_SKILL_IDS_SQL = """
+    SELECT skill_id1 AS skill_id FROM alien WHERE skill_id1 IS NOT NULL
+    UNION SELECT skill_id2 FROM alien WHERE skill_id2 IS NOT NULL
+    UNION SELECT skill_id3 FROM alien WHERE skill_id3 IS NOT NULL
+    UNION SELECT s_skill_id FROM alien WHERE s_skill_id IS NOT NULL
+"""
+
+ORPHAN_EFFECTS_CONDITION = f"""
+    e.skill_id IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM ({USED_SKILL_IDS_SQL}) used WHERE used.skill_id = e.skill_id
+    )
+"""
+
+ORPHAN_DICTIONARY_CONDITION = """
+    NOT EXISTS (SELECT 1 FROM effect_usage u WHERE u.effect_name = c.correct_name)
+"""
+
+
+def _truncate(text: str, length: int = 60) -> str:
+    text = text.replace('\n', ' ')
+    return text if len(text) <= length else text[:length] + '…'
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='どのエイリアンにも使われていない効果・辞書の検出と削除')
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'),
+                        help='対象のPostgreSQL（デフォルト: DATABASE_URL）')
+    parser.add_argument('--delete', action='store_true', help='孤立した効果をバックアップストアへ退避して削除する')
+    parser.add_argument('--delete-dictionary', action='store_true',
+                        help='どの効果にも使われていない辞書の効果名も退避して削除する（--delete と併用）')
+    parser.add_argument('--store', default=str(DEFAULT_STORE_DIR), help='効果の退避先のバックアップストア')
+    parser.add_argument('--dictionary-store', default=None,
+                        help='辞書の退避先のバックアップストア（デフォルト: <--store>-dictionary）')
+    parser.add_argument('--max-fraction', type=float, default=0.5,
+                        help='孤立した効果がこの割合を超えたら削除しない（スクレイピング失敗時の誤削除防止）')
+    parser.add_argument('--force', action='store_true', help='--max-fraction の確認を行わない')
+    parser.add_argument('--limit', type=int, default=30, help='報告に表示するスキルテキストの数')
+    args = parser.parse_args()
+
+    if not args.dsn:
+        print('エラー: --dsn または環境変数 DATABASE_URL を指定してください')
+        return 2
+    if args.delete_dictionary and not args.delete:
+        print('エラー: --delete-dictionary は --delete と併用してください')
+        return 2
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        with conn.cursor(cursor_factory=DictCursor) as cur:
+            cur.execute("SELECT count(*) FROM alien")
+            alien_count = cur.fetchone()[0]
+            cur.execute(f"""
+                SELECT e.skill_text, count(*) AS row_count
+                FROM skill_text_verified_effects e
+                WHERE {ORPHAN_EFFECTS_CONDITION}
+                GROUP BY e.skill_text
+                ORDER BY row_count DESC, e.skill_text
+            """)
+            orphan_skills = cur.fetchall()
+            cur.execute("""
+                SELECT count(*) AS total_rows, count(*) FILTER (WHERE skill_id IS NULL) AS unlinked_rows
+                FROM skill_text_verified_effects
+            """)
+            total_rows, unlinked_rows = cur.fetchone()
+            cur.execute(f"""
+                SELECT c.correct_name, c.category
+                FROM correct_effect_names c
+                WHERE {ORPHAN_DICTIONARY_CONDITION}
+                ORDER BY c.category, c.correct_name
+            """)
+            orphan_dictionary = cur.fetchall()
+
+            orphan_rows = sum(row['row_count'] for row in orphan_skills)
+            print(f'エイリアン: {alien_count}体 / 効果: {total_rows}行')
+            print(f'\n孤立した効果: {len(orphan_skills)}スキル {orphan_rows}行')
+            for row in orphan_skills[:args.limit]:
+                print(f"  {row['row_count']:>4}行  {_truncate(row['skill_text'])}")
+            if len(orphan_skills) > args.limit:
+                print(f'  ...ほか{len(orphan_skills) - args.limit}スキル')
+            if unlinked_rows:
+                print(f'\nskill_id が未設定の効果: {unlinked_rows}行（孤立の判定・削除の対象外）')
+            print(f'\n使われていない辞書の効果名: {len(orphan_dictionary)}件')
+            for row in orphan_dictionary[:args.limit]:
+                print(f"  {row['correct_name']} ({row['category']})")
+            if len(orphan_dictionary) > args.limit:
+                print(f'  ...ほか{len(orphan_dictionary) - args.limit}件')
+
+            if not args.delete:
+                return 0
+
+            if not args.force and (alien_count == 0 or orphan_rows > total_rows * args.max_fraction):
+                print(f'\n中止: 孤立した効果が全体の{args.max_fraction:.0%}を超えています'
+                      '（エイリアンの取得に失敗している可能性があります。確認のうえ --force で実行）')
+                return 1
+
+            # 検出と同じ条件で削除する（検出後に参照されるようになった行は削除しない）
+            changeset_id = new_changeset_id()
+            store = BackupStore(Path(args.store))
+            cur.execute(f"""
+                DELETE FROM skill_text_verified_effects e
+                WHERE {ORPHAN_EFFECTS_CONDITION}
+                RETURNING to_jsonb(e)
+            """)
+            removed_effects = [row[0] for row in cur.fetchall()]
+            write_change_journal(cur, changeset_id, 'orphan_scan', 'skill_text_verified_effects', [
+                (DELETE, image, None) for image in removed_effects
+            ])
+            if removed_effects:
+                store.append(removed_effects, 'orphan_scan', changeset_id=changeset_id)
+
+            removed_dictionary = []
+            if args.delete_dictionary:
+                # 効果の削除で effect_usage も減っているため、ここで改めて判定する
+                cur.execute(f"""
+                    DELETE FROM correct_effect_names c
+                    WHERE {ORPHAN_DICTIONARY_CONDITION}
+                    RETURNING to_jsonb(c)
+                """)
+                removed_dictionary = [row[0] for row in cur.fetchall()]
+                write_change_journal(cur, changeset_id, 'orphan_scan', 'correct_effect_names', [
+                    (DELETE, image, None) for image in removed_dictionary
+                ])
+                if removed_dictionary:
+                    dictionary_store = BackupStore(
+                        Path(args.dictionary_store) if args.dictionary_store else dictionary_store_dir(Path(args.store))
+                    )
+                    dictionary_store.append(removed_dictionary, 'orphan_dictionary', changeset_id=changeset_id)
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    print(f'\n削除しました: 効果 {len(removed_effects)}行 / 辞書 {len(removed_dictionary)}件 (changeset_id={changeset_id})')
+    if removed_dictionary:
+        print('公開ページの効果辞書は次回の再構築（CATALOG_TTL_SECONDS 経過後）で反映されます')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
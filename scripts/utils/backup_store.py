@@ -0,0 +1,223 @@
+"""
+skill_text_verified_effects の変更前バックアップ（追記専用・重複排除・圧縮）
+
+変更のたびにテーブル全体を1つのJSONLファイルへ追記する代わりに、変更で触れた行だけを
+保存する。行は内容のハッシュで識別し、既に保存済みの行は再度書き込まない。
+
+ディレクトリ構成:
+    index.jsonl       : バックアップ1回につき1行（時刻・種類・セグメント内の位置・行ハッシュの一覧）
+    seg-000001.gz ... : 新しく保存する行を、バックアップ1回につき1つのgzipメンバーとして追記したもの
+                        （SEGMENT_MAX_BYTES を超えたら次のファイルへ）
+
+バックアップの読み出しは、index.jsonl から行ハッシュの保存先を引き、必要なgzipメンバーだけを展開する
+"""
+import gzip
+import hashlib
+import json
+import re
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, time
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows（ワーカーが1プロセスの開発環境のみを想定）
+    fcntl = None
+
+
+INDEX_FILE = 'index.jsonl'
+LOCK_FILE = '.lock'
+TIMESTAMP_FORMAT = '%Y%m%dT%H%M%S'
+
+
+# 日時の文字列（str(datetime) の "2025-11-03 12:47:31.838655" と to_jsonb の "2025-11-03T12:47:31.8386"）
+_TIMESTAMP_PATTERN = re.compile(
+    r'^(\d{4}-\d{2}-\d{2})[ T](\d{2}:\d{2}:\d{2})(?:\.(\d{1,6}))?(Z|[+-]\d{2}(?::?\d{2})?)?$'
+)
+
+
+def _normalize_value(key: str, value: Any) -> Any:
+    """
+    値の表現を揃える
+
+    行の取得元（to_jsonb の画像・DictCursor の行・旧形式のJSONL）によって日時や数値の表現が
+    異なるため、そのままでは同じ行でもハッシュが一致しない
+    - 日時（*_at 列）は "YYYY-MM-DDTHH:MM:SS.ffffff+HH:MM"（小数秒は6桁、0なら省略）
+    - 数値は整数なら int、そうでなければ float（Decimal と jsonb の数値を揃える）
+    """
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (datetime, date, time)):
+        value = value.isoformat()
+    if isinstance(value, str):
+        match = _TIMESTAMP_PATTERN.match(value) if key.endswith('_at') else None
+        if not match:
+            return value
+        day, clock, fraction, offset = match.groups()
+        fraction = (fraction or '').ljust(6, '0')
+        text = f'{day}T{clock}' + (f'.{fraction}' if fraction.strip('0') else '')
+        if offset:
+            if offset == 'Z':
+                offset = '+00:00'
+            elif len(offset) == 3:
+                offset += ':00'
+            elif ':' not in offset:
+                offset = f'{offset[:3]}:{offset[3:]}'
+            text += offset
+        return text
+    if isinstance(value, Decimal):
+        if not value.is_finite():
+            return str(value)
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def encode_row(row: Mapping[str, Any]) -> bytes:
+    """行を正規化したJSON（キー順固定）にする。ハッシュと保存の両方に使う"""
+    normalized = {key: _normalize_value(key, value) for key, value in dict(row).items()}
+    return json.dumps(normalized, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def row_hash(encoded: bytes) -> str:
+    return hashlib.sha256(encoded).hexdigest()[:32]
+
+
+class BackupStore:
+    """
+    追記専用のバックアップストア
+
+    複数のワーカープロセスから同時に書き込んでも、ロックファイル（fcntl）で直列化する
+    """
+
+    SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        # index.jsonl の読み込み済み位置と内容（追記専用のため末尾だけを読み足す）
+        self._index_pos = 0
+        self._entries: List[Dict[str, Any]] = []
+        self._stored: Dict[str, int] = {}  # 行ハッシュ → その行を保存したエントリの番号
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(self.root / LOCK_FILE, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh_index()
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh_index(self) -> None:
+        """他のプロセスが追記したエントリを読み込む"""
+        index_path = self.root / INDEX_FILE
+        if not index_path.exists():
+            return
+        with open(index_path, 'rb') as f:
+            f.seek(self._index_pos)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # 書きかけの行（書き込み中に異常終了した場合）は読み飛ばす
+                    break
+                self._index_pos += len(line)
+                entry = json.loads(line)
+                number = len(self._entries)
+                self._entries.append(entry)
+                for digest in entry['stored']:
+                    self._stored.setdefault(digest, number)
+
+    def _current_segment(self, incoming: int) -> Path:
+        segments = sorted(self.root.glob('seg-*.gz'))
+        if segments and segments[-1].stat().st_size + incoming <= self.SEGMENT_MAX_BYTES:
+            return segments[-1]
+        number = int(segments[-1].stem.split('-')[1]) + 1 if segments else 1
+        return self.root / f'seg-{number:06d}.gz'
+
+    def append(
+        self,
+        rows: Iterable[Mapping[str, Any]],
+        backup_type: str,
+        timestamp: Optional[str] = None,
+        **meta: Any
+    ) -> Dict[str, Any]:
+        """
+        行をバックアップする（保存済みの行はハッシュの参照だけを記録する）
+
+        Args:
+            rows: バックアップする行（変更前の値）
+            backup_type: バックアップの種類（apply_changes, mass_update など）
+            timestamp: 記録する時刻（TIMESTAMP_FORMAT。省略時は現在時刻。旧形式の取り込み用）
+            **meta: エントリに記録する追加情報
+        Returns:
+            index.jsonl に追記したエントリ
+        """
+        encoded_rows = [encode_row(row) for row in rows]
+        digests = [row_hash(encoded) for encoded in encoded_rows]
+
+        with self._locked():
+            new_rows = {}
+            for digest, encoded in zip(digests, encoded_rows):
+                if digest not in self._stored and digest not in new_rows:
+                    new_rows[digest] = encoded
+
+            segment, offset, length = None, 0, 0
+            if new_rows:
+                member = gzip.compress(b'\n'.join(new_rows.values()), compresslevel=6)
+                segment_path = self._current_segment(len(member))
+                with open(segment_path, 'ab') as f:
+                    offset = f.seek(0, 2)
+                    f.write(member)
+                    f.flush()
+                segment, length = segment_path.name, len(member)
+
+            entry = {
+                'timestamp': timestamp or datetime.now().strftime(TIMESTAMP_FORMAT),
+                'type': backup_type,
+                'meta': meta,
+                'segment': segment,
+                'offset': offset,
+                'length': length,
+                'stored': list(new_rows),
+                'rows': digests,
+            }
+            # セグメントを書き終えてからインデックスに追記する（異常終了しても未参照のデータが残るだけ）
+            with open(self.root / INDEX_FILE, 'ab') as f:
+                f.write(json.dumps(entry, ensure_ascii=False).encode('utf-8') + b'\n')
+            self._refresh_index()
+        return entry
+
+    def entries(self, since: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        バックアップの一覧（古い順）。since/until は TIMESTAMP_FORMAT の時刻（両端を含む）
+        """
+        with self._locked():
+            entries = list(self._entries)
+        return [
+            entry for entry in entries
+            if (since is None or entry['timestamp'] >= since) and (until is None or entry['timestamp'] <= until)
+        ]
+
+    def _read_member(self, entry: Mapping[str, Any]) -> Dict[str, Dict[str, Any]]:
+        with open(self.root / entry['segment'], 'rb') as f:
+            f.seek(entry['offset'])
+            data = gzip.decompress(f.read(entry['length']))
+        return {digest: json.loads(line) for digest, line in zip(entry['stored'], data.split(b'\n'))}
+
+    def read(self, entry: Mapping[str, Any]) -> List[Dict[str, Any]]:
+        """エントリに記録された行を、バックアップ時の順序で返す"""
+        with self._locked():
+            owners = {digest: self._stored[digest] for digest in entry['rows']}
+            members = {number: self._entries[number] for number in set(owners.values())}
+        rows_by_hash = {}
+        for member in members.values():
+            rows_by_hash.update(self._read_member(member))
+        return [rows_by_hash[digest] for digest in entry['rows']]
@@ -0,0 +1,360 @@
+"""
+カタログ（トップページ描画用の全データ）のスナップショットキャッシュ
+
+再構築をシングルフライト化し、キャッシュ無効化直後やワーカー起動直後に
+同時リクエストが一斉にDBへ問い合わせる（キャッシュスタンピード）のを防ぐ。
+鮮度切れのスナップショットはバックグラウンドで再構築しつつ返す（stale-while-revalidate）
+
+複数のワーカープロセスでは、再構築をロックファイルで直列化し、他のプロセスが
+先に構築した十分新しいスナップショット（共有ファイル）があればDBに問い合わせずそれを使う。
+他のプロセスが共有ファイルを公開した（部分更新を含む）ことを検出した場合も、次の get() で取り込む
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows（ワーカーが1プロセスの開発環境のみを想定）
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogCache:
+    """
+    シングルフライトで再構築されるスナップショットキャッシュ
+
+    - 再構築は常に1スレッドのみが実行する
+    - スナップショットが存在しない間は、他のスレッドは構築完了を待つ
+    - ttl を過ぎた（または無効化された）スナップショットはそのまま返し、
+      裏で1スレッドだけが再構築して差し替える
+    - max_staleness を過ぎたスナップショットは返さず、再構築完了を待つ
+      （再構築に失敗した場合のみ直前のスナップショットを返す）
+    - 再構築に失敗した直後（FAILURE_BACKOFF 秒）は再構築せず、直前のスナップショットを返すか
+      失敗時の例外を送出する（DB障害中に待機中のスレッドが1つずつ再構築を繰り返さない）
+    - lock_path を指定すると、再構築はプロセス間でも1つずつ行う。adopt を指定すると、
+      再構築の前に他のプロセスが構築したスナップショットを探し、このキャッシュにとって
+      新しいもの（ttl 以内、かつ最後の invalidate() 以降に読み取ったデータ）ならそれを使う
+    - watch を指定すると、get() のたびに共有スナップショットの公開を確認し、
+      他のプロセスが公開していればそれを取り込む
+    """
+
+    # 再構築に失敗した直後は、この秒数だけ待たずに古いスナップショットを返す
+    FAILURE_BACKOFF = 5.0
+
+    def __init__(
+        self,
+        builder: Callable[[], Any],
+        ttl: Optional[float] = None,
+        max_staleness: Optional[float] = None,
+        adopt: Optional[Callable[[float], Optional[Tuple[Any, float]]]] = None,
+        lock_path: Optional[Path] = None,
+        watch: Optional[Callable[[], Any]] = None
+    ):
+        """
+        Args:
+            builder: スナップショットを構築する関数（引数なし）
+            ttl: 鮮度の有効期間（秒）。Noneなら無効化されるまで期限切れにならない
+            max_staleness: 古いスナップショットを返してよい上限（秒）。Noneなら無制限
+            adopt: 他のプロセスが構築したスナップショットを探す関数。引数の時刻（time.time() 基準）
+                以降に読み取ったデータのものがあれば (スナップショット, 読み取り時刻) を、無ければNoneを返す
+            lock_path: プロセス間で再構築を直列化するロックファイル（Noneならプロセス内のみ）
+            watch: 共有スナップショットが公開されるたびに変わる値を返す関数（adopt と併用する）
+        """
+        self._builder = builder
+        self.ttl = ttl
+        self.max_staleness = max_staleness
+        self._adopt = adopt
+        self._lock_path = Path(lock_path) if lock_path is not None else None
+        self._watch = watch
+        self._build_lock = threading.Lock()
+        self._snapshot = None
+        self._built_at = 0.0  # time.monotonic() 基準
+        self._failed_at = None
+        self._failure = None  # 直前の再構築で発生した例外
+        self._published = None  # 最後に確認した watch() の値
+        # invalidate() のたびに増加し、構築開始時点の値と比較して鮮度を判定する
+        self._generation = 0
+        self._built_generation = -1
+        self._invalidated_at = 0.0  # 最後に invalidate() された時刻（time.time() 基準）
+        self._stats = {
+            'build_count': 0,
+            'failure_count': 0,
+            'last_build_duration': None,
+            'max_build_duration': None,
+            'total_build_duration': 0.0,
+            'last_built_at': None,
+            'last_error': None,
+            'patch_count': 0,
+            'last_patch_duration': None,
+            'adopt_count': 0,
+        }
+        if hasattr(os, 'register_at_fork'):
+            # preload_app で fork された時点で再構築中だった場合に備え、子プロセスのロックを作り直す
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self) -> None:
+        self._build_lock = threading.Lock()
+
+    def _age(self) -> float:
+        return time.monotonic() - self._built_at
+
+    def _is_fresh(self) -> bool:
+        if self._snapshot is None or self._built_generation != self._generation:
+            return False
+        return self.ttl is None or self._age() < self.ttl
+
+    def _in_failure_backoff(self) -> bool:
+        return self._failed_at is not None and time.monotonic() - self._failed_at < self.FAILURE_BACKOFF
+
+    def _published_changed(self) -> bool:
+        """他のプロセスが共有スナップショットを公開したか"""
+        return self._watch is not None and self._adopt is not None and self._watch() != self._published
+
+    def _is_too_stale(self) -> bool:
+        if self.max_staleness is None or self._age() < self.max_staleness:
+            return False
+        # 直前の再構築が失敗している間（DB障害中など）は待たせない
+        return not self._in_failure_backoff()
+
+    def get(self) -> Any:
+        """
+        スナップショットを取得する（必要に応じて再構築）
+
+        Returns:
+            builderが返したスナップショット
+        """
+        if self._published_changed():
+            with self._build_lock:
+                if self._published_changed():
+                    self._adopt_published()
+
+        snapshot = self._snapshot
+        if self._is_fresh():
+            return snapshot
+
+        if snapshot is not None and not self._is_too_stale():
+            # 古いスナップショットを返しつつ、裏で再構築する
+            if not self._in_failure_backoff():
+                self.refresh_in_background()
+            return snapshot
+
+        # 未構築、または許容範囲を超えて古い場合は再構築完了を待つ
+        with self._build_lock:
+            # ロック待ちの間に他のスレッドが構築を終えていればそれを使う
+            if self._snapshot is not None and self._snapshot is not snapshot:
+                return self._snapshot
+            if self._is_fresh():
+                return self._snapshot
+            # 待っている間に再構築が失敗していれば、繰り返さずにその結果を返す
+            if self._in_failure_backoff():
+                if snapshot is not None:
+                    return snapshot
+                raise self._failure
+            return self._rebuild(fallback=snapshot)
+
+    def refresh_in_background(self) -> bool:
+        """
+        バックグラウンドスレッドで再構築を開始する
+
+        Returns:
+            再構築を開始した場合True（既に再構築中ならFalse）
+        """
+        if not self._build_lock.acquire(blocking=False):
+            return False
+
+        def run():
+            try:
+                self._rebuild(fallback=self._snapshot)
+            except Exception as e:
+                logger.error(f"カタログのバックグラウンド再構築エラー: {e}")
+            finally:
+                self._build_lock.release()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return True
+
+    @contextmanager
+    def _process_lock(self) -> Iterator[None]:
+        """他のワーカープロセスの再構築と排他にする（lock_path 未指定時は何もしない）"""
+        if self._lock_path is None or fcntl is None:
+            yield
+            return
+        self._lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _adopt_not_before(self) -> float:
+        """他のプロセスのスナップショットを使ってよい、データの読み取り時刻の下限"""
+        not_before = self._invalidated_at
+        if self.ttl is not None:
+            not_before = max(not_before, time.time() - self.ttl)
+        return not_before
+
+    def _set_adopted(self, adopted: Tuple[Any, float], generation: int) -> Any:
+        snapshot, read_at = adopted
+        self._snapshot = snapshot
+        # 鮮度はデータを読み取った時刻から数える（構築したプロセスと同じ時刻に期限切れになる）
+        self._built_at = time.monotonic() - max(0.0, time.time() - read_at)
+        self._built_generation = generation
+        self._failed_at = None
+        self._stats['adopt_count'] += 1
+        logger.info(f"他のプロセスが構築したカタログを使用します: {(time.time() - read_at):.1f}秒前のデータ")
+        return snapshot
+
+    def _adopt_published(self) -> None:
+        """
+        他のプロセスが公開した共有スナップショットを取り込む（_build_lock を取得して呼ぶこと）
+
+        公開はプロセス間のロック内で行われ、常にその時点の最新の共有スナップショットを基にするため、
+        前回確認した後に公開されたものは読み取り時刻によらず取り込む
+        """
+        published = self._watch()
+        try:
+            adopted = self._adopt(0.0)
+        except Exception as e:
+            logger.warning(f"共有スナップショットの取り込みに失敗しました: {e}")
+            adopted = None
+        self._published = published
+        if adopted is not None and adopted[0] is not self._snapshot:
+            # このプロセスで invalidate() する前に読み取ったデータなら、取り込んでも古いままとする
+            fresh = adopted[1] >= self._invalidated_at
+            self._set_adopted(adopted, self._generation if fresh else self._generation - 1)
+
+    def _rebuild(self, fallback: Optional[Any] = None) -> Any:
+        generation = self._generation
+        not_before = self._adopt_not_before()
+        start = time.monotonic()
+        try:
+            with self._process_lock():
+                # ロック待ちの間に他のプロセスが構築を終えていればそれを使う
+                adopted = self._adopt(not_before) if self._adopt is not None else None
+                snapshot = self._builder() if adopted is None else None
+                if self._watch is not None:
+                    self._published = self._watch()
+        except Exception as e:
+            self._failed_at = time.monotonic()
+            self._failure = e
+            self._stats['failure_count'] += 1
+            self._stats['last_error'] = str(e)
+            if fallback is None:
+                raise
+            logger.warning(f"カタログ再構築に失敗したため直前のスナップショットを返します: {e}")
+            return fallback
+
+        if adopted is not None:
+            return self._set_adopted(adopted, generation)
+
+        duration = time.monotonic() - start
+        self._snapshot = snapshot
+        self._built_at = time.monotonic()
+        # 構築中に invalidate() された場合は古いままとして扱い、次回再構築させる
+        self._built_generation = generation
+        self._failed_at = None
+
+        stats = self._stats
+        stats['build_count'] += 1
+        stats['last_build_duration'] = duration
+        stats['max_build_duration'] = max(stats['max_build_duration'] or 0.0, duration)
+        stats['total_build_duration'] += duration
+        stats['last_built_at'] = time.time()
+        stats['last_error'] = None
+        logger.info(f"カタログ再構築完了: {duration * 1000:.1f}ms")
+        return snapshot
+
+    def seed(self, snapshot: Any, read_at: Optional[float] = None) -> None:
+        """
+        外部（ディスクなど）から読み込んだスナップショットを古いものとして設定する
+
+        次回 get() ではこのスナップショットを返しつつ、バックグラウンドで再構築する。
+        経過秒数は read_at（スナップショットのデータを読み取った時刻、time.time() 基準）から数え、
+        max_staleness を過ぎていれば次回 get() で再構築を待つ（省略時は読み込んだ時刻から数える）
+        """
+        if self._watch is not None:
+            self._published = self._watch()
+        self._snapshot = snapshot
+        self._built_at = time.monotonic()
+        if read_at is not None:
+            self._built_at -= max(0.0, time.time() - read_at)
+        self._built_generation = self._generation - 1
+
+    def peek(self) -> Optional[Any]:
+        """再構築を行わずに現在のスナップショットを返す（未構築ならNone）"""
+        return self._snapshot
+
+    def invalidate(self) -> None:
+        """
+        スナップショットを古いものとしてマークし、バックグラウンドで再構築を開始する
+        （未構築の場合は次回get()で構築される）
+        """
+        self._generation += 1
+        self._invalidated_at = time.time()
+        if self._snapshot is not None:
+            self.refresh_in_background()
+
+    def patch(self, updater: Callable[[Any], Optional[Any]]) -> None:
+        """
+        現在のスナップショットを部分更新する（完了するまで戻らない）
+
+        updater は現在のスナップショットを受け取り、更新後のスナップショットを返す。
+        Noneを返した場合・例外が発生した場合は全体を再構築し、未構築の場合は invalidate() と同じく
+        次回 get() で構築する。書き込み直後の get() が更新前のデータを返さないよう、呼び出し元の
+        スレッドで実行する。部分更新は全体の再構築とは排他で、構築中なら完了を待ってから行う。
+        他のプロセスが公開した共有スナップショットがあれば、それを取り込んでから部分更新する
+        （鮮度の基準時刻は変えないため、ttl による定期的な全体再構築は引き続き行われる）
+        """
+        with self._build_lock:
+            start = time.monotonic()
+            with self._process_lock():
+                if self._published_changed():
+                    self._adopt_published()
+                if self._snapshot is None:
+                    snapshot = None
+                else:
+                    try:
+                        snapshot = updater(self._snapshot)
+                    except Exception as e:
+                        logger.warning(f"カタログの部分更新に失敗したため全体を再構築します: {e}")
+                        snapshot = None
+                if snapshot is not None:
+                    self._snapshot = snapshot
+                    if self._watch is not None:
+                        self._published = self._watch()
+
+            if snapshot is None:
+                self._generation += 1
+                self._invalidated_at = time.time()
+                if self._snapshot is None:
+                    return
+                try:
+                    self._rebuild(fallback=self._snapshot)
+                except Exception as e:
+                    logger.error(f"カタログの再構築エラー: {e}")
+                return
+            duration = time.monotonic() - start
+            self._stats['patch_count'] += 1
+            self._stats['last_patch_duration'] = duration
+            logger.info(f"カタログ部分更新完了: {duration * 1000:.1f}ms")
+
+    def stats(self) -> Dict[str, Any]:
+        """再構築回数・再構築時間（refresh latency）・スナップショットの経過秒数などを返す"""
+        stats = dict(self._stats)
+        total = stats.pop('total_build_duration')
+        stats['avg_build_duration'] = total / stats['build_count'] if stats['build_count'] else None
+        stats['age'] = self._age() if self._snapshot is not None else None
+        stats['is_fresh'] = self._is_fresh()
+        stats['refreshing'] = self._build_lock.locked()
+        stats['ttl'] = self.ttl
+        stats['max_staleness'] = self.max_staleness
+        return stats
@@ -0,0 +1,80 @@
+"""
+管理APIの参照用の索引（カタログスナップショットの catalog.json から作る）
+
+特技判定・スキルを使うエイリアン・効果辞書の引き当ては、リクエストごとにDBへ問い合わせず
+この索引の辞書引きで返す。索引はスナップショットごとに1回だけ作るため
+（MappedSnapshot.memo）、カタログの再構築・部分更新で新しいスナップショットに
+切り替わると自動的に作り直される
+"""
+from typing import Any, Dict, FrozenSet, List, Mapping
+
+# スキルが無いことを表す値（skill テーブルには登録されない）
+NO_SKILL_TEXT = 'なし'
+
+SKILL_TEXT_KEYS = ('skill_text1', 'skill_text2', 'skill_text3', 's_skill_text')
+
+
+class CatalogIndex:
+    """catalog.json（build_catalog() の戻り値から 'aliens' を除いたもの）から作る索引"""
+
+    def __init__(self, catalog: Mapping[str, Any]):
+        aliens_by_skill_text: Dict[str, List[Dict[str, Any]]] = {}
+        special_skill_texts = set()
+        # 効果名 → {skill_text: 行数}（同じスキルを持つエイリアンは同じ効果リストを持つため1回だけ数える）
+        skills_by_effect: Dict[str, Dict[str, int]] = {}
+        counted_skill_texts = set()
+        alien_effects = catalog['alien_effects']
+        for alien in sorted(catalog['all_aliens'].values(), key=lambda a: a['id']):
+            entry = {'id': alien['id'], 'name': alien['name']}
+            slots = alien_effects.get(str(alien['id']), {})
+            for slot, key in (('1', 'skill_text1'), ('2', 'skill_text2'), ('3', 'skill_text3'), ('S', 's_skill_text')):
+                skill_text = alien.get(key)
+                if not skill_text or skill_text in counted_skill_texts:
+                    continue
+                counted_skill_texts.add(skill_text)
+                for effect in slots.get(slot, []):
+                    counts = skills_by_effect.setdefault(effect['effect_name'], {})
+                    counts[skill_text] = counts.get(skill_text, 0) + 1
+            # 同じスキルを複数の枠に持つエイリアンも1回だけ数える
+            for skill_text in {alien.get(key) for key in SKILL_TEXT_KEYS}:
+                if skill_text and skill_text != NO_SKILL_TEXT:
+                    aliens_by_skill_text.setdefault(skill_text, []).append(entry)
+            s_skill_text = alien.get('s_skill_text')
+            if s_skill_text and s_skill_text != NO_SKILL_TEXT:
+                special_skill_texts.add(s_skill_text)
+        self._aliens_by_skill_text = aliens_by_skill_text
+        self._special_skill_texts: FrozenSet[str] = frozenset(special_skill_texts)
+        self._skills_by_effect = skills_by_effect
+
+        effect_options: Dict[str, List[Dict[str, Any]]] = {}
+        for entry in (*catalog['all_effects'], *catalog['s_skill_effects']):
+            effect_options.setdefault(entry['correct_effect_names'], []).append({
+                'correct_name': entry['correct_effect_names'],
+                'effect_type': entry['effect_type'],
+                'category': entry['category'],
+            })
+        # DBの ORDER BY category と同じく、category が NULL の登録は最後に並べる
+        for options in effect_options.values():
+            options.sort(key=lambda option: (option['category'] is None, option['category'] or ''))
+        self._effect_options = effect_options
+
+    def is_special_skill(self, skill_text: str) -> bool:
+        """特技のスキルテキストか（いずれかのエイリアンの S_Skill_text か）"""
+        return skill_text in self._special_skill_texts
+
+    def aliens_using(self, skill_text: str) -> List[Dict[str, Any]]:
+        """スキルを個性1-3または特技に持つエイリアン（{'id', 'name'} の id 順）"""
+        return self._aliens_by_skill_text.get(skill_text, [])
+
+    def skills_with_effect(self, effect_name: str) -> Dict[str, int]:
+        """
+        効果を持つスキル（{skill_text: 行数}）
+
+        カタログに載るのはいずれかのエイリアンが使っているスキルだけのため、
+        どのエイリアンにも使われていないスキルの行は含まない
+        """
+        return self._skills_by_effect.get(effect_name, {})
+
+    def effect_options(self, effect_name: str) -> List[Dict[str, Any]]:
+        """効果辞書の登録内容（{'correct_name', 'effect_type', 'category'} の category 順、NULLは最後）"""
+        return self._effect_options.get(effect_name, [])
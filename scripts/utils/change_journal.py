@@ -0,0 +1,221 @@
+"""
+管理画面からの変更履歴（change_journal テーブル）
+
+書き込みAPIは変更と同じトランザクションで、変更前後の行（to_jsonb の画像）を1行ずつ記録する。
+1回のAPI呼び出しで記録した行は同じ changeset_id を持ち、次の2つに使う
+
+- 取り消し（undo_changeset）: そのチェンジセットの行だけを変更前の画像に戻す
+- 時点復元（reconstruct_table）: 現在のテーブルから、指定時刻より後の変更を新しい順に打ち消す
+"""
+import uuid
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from psycopg2.extras import Json, execute_values
+
+
+# 変更履歴の対象テーブルと主キー（列名, 型）
+JOURNAL_TABLES = {
+    'skill_text_verified_effects': (('id', 'bigint'),),
+    'correct_effect_names': (('correct_name', 'text'), ('category', 'text')),
+}
+
+# 操作の種類（I: 追加, U: 更新, D: 削除）
+INSERT, UPDATE, DELETE = 'I', 'U', 'D'
+
+
+def new_changeset_id() -> str:
+    return str(uuid.uuid4())
+
+
+def row_key(table_name: str, image: Mapping[str, Any]) -> Dict[str, Any]:
+    """行の画像から主キーを取り出す"""
+    return {column: image[column] for column, _ in JOURNAL_TABLES[table_name]}
+
+
+def _key_tuple(table_name: str, key: Mapping[str, Any]) -> Tuple:
+    return tuple(key[column] for column, _ in JOURNAL_TABLES[table_name])
+
+
+def _key_condition(table_name: str, alias: str = 't') -> str:
+    """
+    対象テーブル(alias)の行と change_journal j の row_key を結合する条件
+
+    先頭の列は NULL にならないため = で比較してインデックスを使い、2列目以降は
+    NULL になりうる（correct_effect_names.category）ため IS NOT DISTINCT FROM で比較する
+    """
+    return ' AND '.join(
+        f"{alias}.{column} {'=' if index == 0 else 'IS NOT DISTINCT FROM'} (j.row_key->>'{column}')::{column_type}"
+        for index, (column, column_type) in enumerate(JOURNAL_TABLES[table_name])
+    )
+
+
+def write_change_journal(
+    cur,
+    changeset_id: str,
+    source: str,
+    table_name: str,
+    entries: Iterable[Tuple[str, Optional[Mapping[str, Any]], Optional[Mapping[str, Any]]]]
+) -> int:
+    """
+    変更履歴を記録する（呼び出し元のトランザクション内で実行すること）
+
+    Args:
+        changeset_id: new_changeset_id() の値（1回の変更操作で共通）
+        source: 変更元（apply_changes, dictionary_add, update_show_flags, mass_update, undo）
+        table_name: JOURNAL_TABLES のテーブル名
+        entries: (操作, 変更前の画像, 変更後の画像) の一覧。画像は RETURNING to_jsonb(...) の値
+    Returns:
+        記録した行数
+    """
+    rows = []
+    for operation, before_image, after_image in entries:
+        image = after_image if after_image is not None else before_image
+        rows.append((
+            changeset_id, source, table_name, operation,
+            Json(row_key(table_name, image)),
+            Json(before_image) if before_image is not None else None,
+            Json(after_image) if after_image is not None else None,
+        ))
+    if rows:
+        execute_values(cur, """
+            INSERT INTO change_journal
+                (changeset_id, source, table_name, operation, row_key, before_image, after_image)
+            VALUES %s
+        """, rows, page_size=len(rows))
+    return len(rows)
+
+
+def _table_columns(cur, table_name: str) -> List[str]:
+    cur.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = %s
+        ORDER BY ordinal_position
+    """, (table_name,))
+    return [row[0] for row in cur.fetchall()]
+
+
+class ChangesetConflict(Exception):
+    """取り消し対象の行が、その後の変更で書き換えられている"""
+
+    def __init__(self, conflicts: List[Dict[str, Any]]):
+        super().__init__(f'{len(conflicts)}件の行がその後に変更されています')
+        self.conflicts = conflicts
+
+
+def undo_changeset(cur, changeset_id: str, force: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    チェンジセットを取り消す（呼び出し元のトランザクション内で実行すること）
+
+    取り消し自体も新しいチェンジセット（source='undo'）として記録するため、時点復元の対象になる。
+    対象の行がその後に変更されている場合は ChangesetConflict を送出する（force=True なら上書きする）
+
+    Returns:
+        {'changeset_id': 取り消しのチェンジセット, 'tables': {テーブル名: [(操作, 変更前, 変更後), ...]}}
+        （取り消し済み、または存在しないチェンジセットならNone）
+    """
+    cur.execute("""
+        SELECT DISTINCT table_name FROM change_journal
+        WHERE changeset_id = %s AND undone_by IS NULL
+    """, (changeset_id,))
+    table_names = [row[0] for row in cur.fetchall() if row[0] in JOURNAL_TABLES]
+    if not table_names:
+        return None
+    # 同じチェンジセットを同時に取り消さないようロックする
+    cur.execute("SELECT id FROM change_journal WHERE changeset_id = %s FOR UPDATE", (changeset_id,))
+
+    current_images = {}
+    conflicts = []
+    for table_name in table_names:
+        first_key = JOURNAL_TABLES[table_name][0][0]
+        cur.execute(f"""
+            SELECT j.operation, j.row_key, to_jsonb(t) AS current_image,
+                   CASE WHEN j.operation = 'D' THEN t.{first_key} IS NOT NULL
+                        ELSE t.{first_key} IS NULL OR to_jsonb(t) <> j.after_image
+                   END AS conflicted
+            FROM change_journal j
+            LEFT JOIN {table_name} t ON {_key_condition(table_name)}
+            WHERE j.changeset_id = %s AND j.table_name = %s
+        """, (changeset_id, table_name))
+        for operation, key, current_image, conflicted in cur.fetchall():
+            if current_image is not None and current_image.get(first_key) is not None:
+                current_images[(table_name, _key_tuple(table_name, key))] = current_image
+            if conflicted:
+                conflicts.append({'table': table_name, 'operation': operation, 'row_key': key})
+    if conflicts and not force:
+        raise ChangesetConflict(conflicts)
+
+    undo_id = new_changeset_id()
+    reverted = {}
+    for table_name in table_names:
+        condition = _key_condition(table_name)
+        entries = []
+
+        # 追加した行を削除する
+        cur.execute(f"""
+            DELETE FROM {table_name} t
+            USING change_journal j
+            WHERE j.changeset_id = %s AND j.table_name = %s AND j.operation = 'I' AND {condition}
+            RETURNING to_jsonb(t)
+        """, (changeset_id, table_name))
+        entries.extend((DELETE, row[0], None) for row in cur.fetchall())
+
+        # 更新した行を変更前の値に戻す（画像に無い列は現在の値のまま）
+        columns = [f'"{column}"' for column in _table_columns(cur, table_name)]
+        cur.execute(f"""
+            UPDATE {table_name} t
+            SET ({', '.join(columns)}) = (
+                SELECT {', '.join(f'r.{column}' for column in columns)}
+                FROM jsonb_populate_record(t, j.before_image) r
+            )
+            FROM change_journal j
+            WHERE j.changeset_id = %s AND j.table_name = %s AND j.operation = 'U' AND {condition}
+            RETURNING j.row_key, to_jsonb(t)
+        """, (changeset_id, table_name))
+        for key, after_image in cur.fetchall():
+            before_image = current_images.get((table_name, _key_tuple(table_name, key)))
+            entries.append((UPDATE, before_image, after_image))
+
+        # 削除した行を戻す
+        cur.execute(f"""
+            INSERT INTO {table_name} AS t
+            SELECT r.*
+            FROM change_journal j
+            CROSS JOIN LATERAL jsonb_populate_record(NULL::{table_name}, j.before_image) r
+            WHERE j.changeset_id = %s AND j.table_name = %s AND j.operation = 'D'
+            RETURNING to_jsonb(t)
+        """, (changeset_id, table_name))
+        entries.extend((INSERT, None, row[0]) for row in cur.fetchall())
+
+        write_change_journal(cur, undo_id, 'undo', table_name, entries)
+        reverted[table_name] = entries
+
+    cur.execute("""
+        UPDATE change_journal SET undone_by = %s
+        WHERE changeset_id = %s AND undone_by IS NULL
+    """, (undo_id, changeset_id))
+    return {'changeset_id': undo_id, 'tables': reverted}
+
+
+def reconstruct_table(
+    current_rows: Iterable[Mapping[str, Any]],
+    journal_rows: Iterable[Sequence[Any]],
+    table_name: str
+) -> Dict[Tuple, Dict[str, Any]]:
+    """
+    現在の行に、指定時刻より後の変更を新しい順に打ち消して適用し、その時点の行を返す
+
+    Args:
+        current_rows: 現在のテーブルの行（to_jsonb の画像）
+        journal_rows: 指定時刻より後の (操作, row_key, 変更前の画像) を id の降順で
+        table_name: JOURNAL_TABLES のテーブル名
+    Returns:
+        {主キーのタプル: 行}
+    """
+    rows = {_key_tuple(table_name, row_key(table_name, row)): dict(row) for row in current_rows}
+    for operation, key, before_image in journal_rows:
+        key = _key_tuple(table_name, key)
+        if operation == INSERT:
+            rows.pop(key, None)
+        else:
+            rows[key] = before_image
+    return rows
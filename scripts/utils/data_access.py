@@ -0,0 +1,321 @@
+"""
+カタログ読み取り用のデータアクセス層
+
+カタログ構築（トップページ用データ）の読み取りクエリをまとめ、PostgreSQLと
+組み込みSQLiteのどちらからでも同じ形式で読めるようにする。
+SQLiteファイルは更新パイプラインがPostgreSQLのテーブルから書き出す（export_sqlite_catalog）
+
+読み取りは全件を一度にメモリへ載せず、行を逐次返す（PostgreSQLはサーバーサイドカーソル）。
+効果テーブルが大きくなっても、再構築中のメモリ使用量は最終的なカタログの大きさで頭打ちになる
+"""
+import itertools
+import os
+import sqlite3
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from psycopg2.extras import DictCursor
+
+
+ALIEN_COLUMNS = [
+    'id', 'name', 'attribute', 'affiliation', 'attack_range', 'attack_area',
+    'role', 'type_1', 'type_2', 'type_3', 'type_4',
+    'skill_no1', 'skill_text1', 'skill_no2', 'skill_text2', 'skill_no3', 'skill_text3',
+    'hp', 'power', 'motivation', 'size', 'speed', '"S_Skill"', '"S_Skill_text"',
+    'skill_id1', 'skill_id2', 'skill_id3', 's_skill_id',
+]
+
+EFFECT_COLUMNS = [
+    'id', 'skill_id', 'skill_text', 'effect_name', 'effect_type', 'category', 'target',
+    'condition_target', 'has_requirement', 'requirement_details',
+    'requirement_count', 'requires_awakening',
+]
+
+SKILL_COLUMNS = ['id', 'skill_text', 'version']
+
+REQUIREMENT_COLUMNS = ['effect_id', 'position', 'req_type', 'req_value', 'is_not', 'req_count']
+
+# サーバーサイドカーソルで1回に取得する行数
+FETCH_BATCH_SIZE = 2000
+
+DICTIONARY_COLUMNS = [
+    'correct_name', 'effect_type', 'category', 'target', 'condition_target',
+    'show_target', 'show_condition_target',
+]
+
+# SQLiteレプリカのスキーマ（カタログ構築に必要な列のみ）
+SQLITE_SCHEMA = """
+CREATE TABLE alien (
+    id INTEGER PRIMARY KEY, name TEXT, attribute INTEGER, affiliation INTEGER,
+    attack_range INTEGER, attack_area INTEGER, role INTEGER,
+    type_1, type_2, type_3, type_4,
+    skill_no1 TEXT, skill_text1 TEXT, skill_no2 TEXT, skill_text2 TEXT,
+    skill_no3 TEXT, skill_text3 TEXT,
+    hp INTEGER, power INTEGER, motivation INTEGER, size INTEGER, speed INTEGER,
+    "S_Skill" TEXT, "S_Skill_text" TEXT,
+    skill_id1 INTEGER, skill_id2 INTEGER, skill_id3 INTEGER, s_skill_id INTEGER
+);
+CREATE TABLE skill (
+    id INTEGER PRIMARY KEY, skill_text TEXT, version INTEGER
+);
+CREATE TABLE skill_text_verified_effects (
+    id INTEGER PRIMARY KEY, skill_id INTEGER, skill_text TEXT, effect_name TEXT, effect_type TEXT,
+    category TEXT, target TEXT, condition_target TEXT, has_requirement BOOLEAN,
+    requirement_details TEXT, requirement_count INTEGER, requires_awakening BOOLEAN
+);
+CREATE TABLE skill_requirement (
+    effect_id INTEGER, position INTEGER, req_type TEXT, req_value TEXT,
+    is_not BOOLEAN, req_count INTEGER,
+    PRIMARY KEY (effect_id, position)
+);
+CREATE TABLE correct_effect_names (
+    correct_name TEXT, effect_type TEXT, category TEXT, target TEXT,
+    condition_target TEXT, show_target BOOLEAN, show_condition_target BOOLEAN,
+    PRIMARY KEY (correct_name, category)
+);
+CREATE INDEX idx_effects_skill_id ON skill_text_verified_effects (skill_id, effect_name);
+CREATE INDEX idx_dictionary_category ON correct_effect_names (category, correct_name);
+CREATE INDEX idx_alien_s_skill_id ON alien (s_skill_id);
+"""
+
+# BOOLEAN列をPythonのboolとして読み込む（PostgreSQLと同じ値になるように）
+sqlite3.register_converter('BOOLEAN', lambda value: value not in (b'0', b''))
+
+
+class CatalogReader:
+    """
+    カタログ構築用の読み取りクエリ（PostgreSQL/SQLiteで共通のSQL）
+
+    サブクラスは _stream() で行を逐次返す（各行は列名で参照できるマッピング）。
+    fetch_* は行のイテレータを返すため、1つ読み終えてから次を呼び出すこと
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def _stream(self, sql: str, params: Sequence[Any] = ()) -> Iterator[Mapping[str, Any]]:
+        raise NotImplementedError
+
+    def fetch_aliens(self) -> Iterator[Mapping[str, Any]]:
+        """判定と表示に必要な全エイリアンの列"""
+        return self._stream(f"""
+            SELECT {', '.join(ALIEN_COLUMNS)}
+            FROM alien
+            ORDER BY id
+        """)
+
+    # パラメータのプレースホルダ（psycopg2は %s、sqlite3は ?）
+    PLACEHOLDER = '%s'
+
+    # 文字列の並び順（バイト順。PostgreSQLの既定の照合順序はDBのロケールに依存し、
+    # SQLiteの既定（BINARY）と一致しないため、どちらもUTF-8のバイト順＝コードポイント順で並べる）
+    BYTE_ORDER = 'COLLATE "C"'
+
+    def _skill_filter(self, column: str, skill_ids: Optional[Iterable[int]]) -> Tuple[str, List[int]]:
+        """skill_ids を指定した場合の絞り込み条件（指定なしなら全件）"""
+        if skill_ids is None:
+            return '', []
+        skill_ids = sorted(set(skill_ids))
+        if not skill_ids:
+            return ' AND false', []
+        placeholders = ', '.join([self.PLACEHOLDER] * len(skill_ids))
+        return f' AND {column} IN ({placeholders})', skill_ids
+
+    def fetch_requirement_rows(self, skill_ids: Optional[Iterable[int]] = None) -> Iterator[Mapping[str, Any]]:
+        """
+        味方編成要求(has_requirement = true)を持つ効果の要求（skill_requirement）
+
+        skill_ids を指定するとそのスキルの要求だけを返す（カタログの部分更新用）
+        """
+        condition, params = self._skill_filter('e.skill_id', skill_ids)
+        return self._stream(f"""
+            SELECT e.skill_id, r.req_type, r.req_value, r.is_not, r.req_count
+            FROM skill_requirement r
+            JOIN skill_text_verified_effects e ON e.id = r.effect_id
+            WHERE e.has_requirement = true{condition}
+            ORDER BY e.skill_id, r.req_type {self.BYTE_ORDER}, r.req_value {self.BYTE_ORDER}, r.is_not, r.req_count
+        """, params)
+
+    def fetch_effect_rows(self, skill_ids: Optional[Iterable[int]] = None) -> Iterator[Mapping[str, Any]]:
+        """
+        効果名が設定された全効果
+
+        skill_ids を指定するとそのスキルの効果だけを返す（カタログの部分更新用）
+        """
+        condition, params = self._skill_filter('skill_id', skill_ids)
+        return self._stream(f"""
+            SELECT skill_id, effect_name, target, condition_target,
+                   effect_type, category, has_requirement, requirement_details, requirement_count
+            FROM skill_text_verified_effects
+            WHERE effect_name IS NOT NULL{condition}
+            ORDER BY skill_id, effect_name {self.BYTE_ORDER}
+        """, params)
+
+    def fetch_skill_versions(self, skill_ids: Optional[Iterable[int]] = None) -> Iterator[Mapping[str, Any]]:
+        """
+        スキルの version（管理画面が編集開始時の値として apply-changes に送る）
+
+        skill_ids を指定するとそのスキルの分だけを返す（カタログの部分更新用）
+        """
+        condition, params = self._skill_filter('id', skill_ids)
+        return self._stream(f"""
+            SELECT id AS skill_id, version
+            FROM skill
+            WHERE true{condition}
+        """, params)
+
+    def fetch_show_flags(self) -> Iterator[Mapping[str, Any]]:
+        """効果辞書の target/condition_target 表示フラグ"""
+        return self._stream("""
+            SELECT correct_name, category, show_target, show_condition_target
+            FROM correct_effect_names
+        """)
+
+    def fetch_effect_dictionary(self, special: bool) -> Iterator[Mapping[str, Any]]:
+        """
+        効果辞書（special=True なら特技用の S_SKILL_* カテゴリ、Falseなら個性用）
+        """
+        condition = "category LIKE 'S_SKILL_%'" if special else "category NOT LIKE 'S_SKILL_%'"
+        return self._stream(f"""
+            SELECT correct_name as correct_effect_names, effect_type, category,
+                   target, condition_target, show_target, show_condition_target
+            FROM correct_effect_names
+            WHERE {condition}
+            ORDER BY category {self.BYTE_ORDER}, correct_name {self.BYTE_ORDER}
+        """)
+
+
+class PostgresCatalogReader(CatalogReader):
+    """PostgreSQL（psycopg2接続）からの読み取り（名前付きのサーバーサイドカーソル）"""
+
+    _cursor_ids = itertools.count()
+
+    def _stream(self, sql, params=()):
+        cur = self.conn.cursor(f'catalog_reader_{next(self._cursor_ids)}', cursor_factory=DictCursor)
+        cur.itersize = FETCH_BATCH_SIZE
+        try:
+            # 空のタプルでもpsycopg2は % を展開しようとするため、パラメータが無ければNoneを渡す
+            cur.execute(sql, params or None)
+            yield from cur
+        finally:
+            cur.close()
+
+    def fetch_skill_ids(self, skill_texts: Iterable[str] = (), effect_names: Iterable[str] = ()) -> List[int]:
+        """
+        スキル本文、またはその効果名に該当するskill_idの一覧（カタログの部分更新用）
+
+        本文は skill.text_hash（md5）で照合し、効果名は効果テーブルから逆引きする
+        """
+        skill_texts = list(skill_texts)
+        effect_names = list(effect_names)
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                SELECT id FROM skill WHERE text_hash = ANY(
+                    SELECT md5(t)::uuid FROM unnest(%s::text[]) AS t
+                )
+                UNION
+                SELECT DISTINCT skill_id FROM skill_text_verified_effects
+                WHERE effect_name = ANY(%s::text[]) AND skill_id IS NOT NULL
+            """, (skill_texts, effect_names))
+            return sorted(row[0] for row in cur.fetchall())
+
+
+class SqliteCatalogReader(CatalogReader):
+    """組み込みSQLiteファイル（読み取り専用）からの読み取り"""
+
+    def __init__(self, path: Path):
+        conn = sqlite3.connect(
+            f'file:{Path(path).as_posix()}?mode=ro', uri=True,
+            detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        super().__init__(conn)
+
+    PLACEHOLDER = '?'
+    BYTE_ORDER = 'COLLATE BINARY'
+
+    def fetch_skill_versions(self, skill_ids=None):
+        # version 列の追加前に書き出したファイルでは返さない（次回の書き出しで追加される）
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(skill)')}
+        if 'version' not in columns:
+            return iter(())
+        return super().fetch_skill_versions(skill_ids)
+
+    def _stream(self, sql, params=()):
+        cur = self.conn.execute(sql, params)
+        try:
+            yield from cur
+        finally:
+            cur.close()
+
+
+def _copy_table(pg_conn, sqlite_conn, table: str, columns: List[str], batch_size: int = FETCH_BATCH_SIZE) -> int:
+    column_list = ', '.join(columns)
+    insert_sql = f"INSERT INTO {table} ({column_list}) VALUES ({', '.join('?' * len(columns))})"
+    count = 0
+    # サーバーサイドカーソルで batch_size 行ずつ転送する
+    with pg_conn.cursor(f'export_{table}') as cur:
+        cur.itersize = batch_size
+        cur.execute(f"SELECT {column_list} FROM {table}")
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            sqlite_conn.executemany(insert_sql, [tuple(row) for row in rows])
+            count += len(rows)
+    return count
+
+
+def export_sqlite_catalog(pg_conn, output_path: Path) -> Dict[str, int]:
+    """
+    PostgreSQLのカタログ関連テーブルをSQLiteファイルに書き出す
+
+    一時ファイルに書き出してから置き換えるため、読み取り中のワーカーには影響しない
+
+    Args:
+        pg_conn: PostgreSQL接続
+        output_path: 出力先のSQLiteファイル
+
+    Returns:
+        {テーブル名: 行数}
+    """
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=str(output_path.parent), prefix=output_path.name, suffix='.tmp')
+    os.close(fd)
+    try:
+        sqlite_conn = sqlite3.connect(tmp_path)
+        try:
+            sqlite_conn.executescript(SQLITE_SCHEMA)
+            counts = {
+                'skill': _copy_table(pg_conn, sqlite_conn, 'skill', SKILL_COLUMNS),
+                'alien': _copy_table(pg_conn, sqlite_conn, 'alien', ALIEN_COLUMNS),
+                'skill_text_verified_effects': _copy_table(
+                    pg_conn, sqlite_conn, 'skill_text_verified_effects', EFFECT_COLUMNS),
+                'skill_requirement': _copy_table(
+                    pg_conn, sqlite_conn, 'skill_requirement', REQUIREMENT_COLUMNS),
+                'correct_effect_names': _copy_table(
+                    pg_conn, sqlite_conn, 'correct_effect_names', DICTIONARY_COLUMNS),
+            }
+            sqlite_conn.commit()
+            sqlite_conn.execute('ANALYZE')
+        finally:
+            sqlite_conn.close()
+        os.replace(tmp_path, output_path)
+        return counts
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -3,9 +3,18 @@
 
 命名規則の統一と判定ロジックの共通化を目的とする
 """
+import re
 import psycopg2
 from psycopg2.extras import DictCursor
-from typing import Dict, Optional, Any
+from typing import Dict, List, Optional, Any
+
+
+# 味方編成要求の種類（a:属性, b:所属, c:攻撃エリア, d:攻撃範囲, e:タイプ, f:役割）
+REQUIREMENT_TYPES = ('a', 'b', 'c', 'd', 'e', 'f')
+
+# requirement_details の1要素（例: "a:3", "e:AK!"。末尾の ! は「以外」）
+# skill_requirement テーブルのトリガー（app.py）と同じ規則
+REQUIREMENT_PATTERN = re.compile(rf"^([{''.join(REQUIREMENT_TYPES)}]):([^:!,]+)(!?)$")
 
 
 def normalize_alien_row(row: dict) -> dict:
@@ -36,39 +45,6 @@ def normalize_alien_row(row: dict) -> dict:
     return normalized
 
 
-def is_special_skill(skill_text: str, conn) -> bool:
-    """
-    特技かどうかを判定（skill_textから判定）
-    
-    Args:
-        skill_text: 判定するスキルテキスト
-        conn: データベース接続オブジェクト
-    
-    Returns:
-        True if 特技, False if 個性
-    """
-    if not skill_text or skill_text == 'なし':
-        return False
-    
-    cur = conn.cursor()
-    try:
-        cur.execute("""
-            SELECT COUNT(*) > 0 as is_special
-            FROM alien
-            WHERE "S_Skill_text" = %s 
-              AND "S_Skill_text" IS NOT NULL 
-              AND "S_Skill_text" != 'なし'
-        """, (skill_text,))
-        result = cur.fetchone()[0]
-        return bool(result)
-    except Exception as e:
-        # エラーの場合はFalseを返す（安全側に倒す）
-        print(f"Warning: is_special_skill判定エラー: {e}")
-        return False
-    finally:
-        cur.close()
-
-
 def is_special_skill_by_category(category: Optional[str]) -> bool:
     """
     カテゴリから特技かどうかを判定
@@ -123,3 +99,39 @@ def is_personality_skill(skill_text: str, special_skill_texts: set) -> bool:
         return False
     return skill_text not in special_skill_texts
 
+
+def parse_requirement_details(details: Optional[str], count: Optional[Any] = None) -> List[Dict[str, Any]]:
+    """
+    requirement_details 文字列を構造化された要求のリストに変換
+    
+    Args:
+        details: "a:3" や "a:1,e:AK!" のような要求文字列（カンマ区切りで複数指定可）
+        count: requirement_count（Noneなら1）
+    
+    Returns:
+        [{'req_type', 'req_value', 'is_not', 'req_count'}, ...]（detailsが空なら空リスト）
+    
+    Raises:
+        ValueError: 形式が不正な場合
+    """
+    if not details:
+        return []
+    try:
+        req_count = int(count) if count is not None else 1
+    except (ValueError, TypeError):
+        raise ValueError(f"要求数が数値ではありません: {count!r}")
+    if req_count < 1:
+        raise ValueError(f"要求数は1以上で指定してください: {req_count}")
+    
+    requirements = []
+    for part in details.split(','):
+        match = REQUIREMENT_PATTERN.match(part.strip())
+        if not match:
+            raise ValueError(f"不正な要求形式です: {part!r}（例: a:3, e:AK!）")
+        requirements.append({
+            'req_type': match.group(1),
+            'req_value': match.group(2),
+            'is_not': match.group(3) == '!',
+            'req_count': req_count,
+        })
+    return requirements
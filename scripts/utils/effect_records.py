@@ -0,0 +1,121 @@
+"""
+カタログ内の効果情報（ALIEN_EFFECTS）のコンパクトな表現
+
+効果1件を10キーの辞書ではなく __slots__ のレコードで保持し、繰り返し現れる文字列
+（カテゴリ・効果タイプ・対象など）はインターンして1つのオブジェクトを共有する。
+JSONへの変換も辞書を経由せずレコードから直接行う
+"""
+import json
+import sys
+from typing import Any, Dict, List, Mapping
+
+
+class EffectRecord:
+    """ALIEN_EFFECTS の効果1件"""
+
+    FIELDS = (
+        'effect_name', 'target', 'condition_target', 'effect_type', 'category',
+        'has_requirement', 'requirement_details', 'requirement_count',
+        'show_target', 'show_condition_target',
+    )
+    __slots__ = FIELDS
+
+    def __init__(
+        self,
+        effect_name: str,
+        target: str,
+        condition_target: str,
+        effect_type: str,
+        category: str,
+        has_requirement: bool,
+        requirement_details: str,
+        requirement_count: int,
+        show_target: bool,
+        show_condition_target: bool
+    ):
+        intern = sys.intern
+        self.effect_name = intern(effect_name)
+        self.target = intern(target)
+        self.condition_target = intern(condition_target)
+        self.effect_type = intern(effect_type)
+        self.category = intern(category)
+        self.has_requirement = has_requirement
+        self.requirement_details = intern(requirement_details)
+        self.requirement_count = requirement_count
+        self.show_target = show_target
+        self.show_condition_target = show_condition_target
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, EffectRecord):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.FIELDS)
+
+    __hash__ = None
+
+
+# JSONのキー順（Flaskの tojson と同じくキーでソートする）
+_SORTED_FIELDS = tuple(sorted(EffectRecord.FIELDS))
+
+
+class _EffectJSONWriter:
+    """レコードを直接JSON文字列にする（同じ値・同じリストの変換結果は再利用する）"""
+
+    def __init__(self, ensure_ascii: bool):
+        self._encode = json.JSONEncoder(ensure_ascii=ensure_ascii).encode
+        self._values = {}
+        self._lists = {}
+
+    def value(self, value: Any) -> str:
+        # bool と int は等価比較で衝突するため型もキーに含める
+        key = (type(value), value)
+        encoded = self._values.get(key)
+        if encoded is None:
+            encoded = self._values[key] = self._encode(value)
+        return encoded
+
+    def record(self, record: EffectRecord) -> str:
+        value = self.value
+        return '{' + ','.join(
+            f'"{field}":{value(getattr(record, field))}' for field in _SORTED_FIELDS
+        ) + '}'
+
+    def records(self, records: List[EffectRecord]) -> str:
+        # 同じ個性を持つエイリアン同士は同じリストを共有しているため、1回だけ変換する
+        # （リストは変換中ずっと生存しているので id() は衝突しない）
+        key = id(records)
+        encoded = self._lists.get(key)
+        if encoded is None:
+            encoded = self._lists[key] = '[' + ','.join(self.record(r) for r in records) + ']'
+        return encoded
+
+
+def dump_alien_effects(alien_effects: Mapping[str, Mapping[str, List[EffectRecord]]], ensure_ascii: bool = True) -> str:
+    """
+    {alien_id: {'1': [EffectRecord, ...], ..., 'S': [...]}} をJSON文字列にする
+
+    キーはソートし、区切り文字は空白なし（json.dumps(..., sort_keys=True,
+    separators=(',', ':')) にレコードの to_dict() を渡した場合と同じ結果）
+    """
+    writer = _EffectJSONWriter(ensure_ascii)
+    encode_key = writer.value
+    parts = []
+    for alien_id in sorted(alien_effects):
+        slots = alien_effects[alien_id]
+        body = ','.join(f'{encode_key(slot)}:{writer.records(slots[slot])}' for slot in sorted(slots))
+        parts.append(f'{encode_key(alien_id)}:{{{body}}}')
+    return '{' + ','.join(parts) + '}'
+
+
+def dump_effects_by_key(effects_by_key: Mapping[Any, List[EffectRecord]], ensure_ascii: bool = True) -> str:
+    """
+    {key: [EffectRecord, ...]}（skill_id ごとの効果など）をJSON文字列にする
+
+    キーは文字列に変換し、json.dumps と同じく挿入順のまま出力する
+    """
+    writer = _EffectJSONWriter(ensure_ascii)
+    return '{' + ','.join(
+        f'{writer.value(str(key))}:{writer.records(records)}' for key, records in effects_by_key.items()
+    ) + '}'
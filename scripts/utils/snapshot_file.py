@@ -0,0 +1,287 @@
+"""
+カタログスナップショットのバイナリファイル形式
+
+ビルダーがデータのバージョンごとに1回だけ書き出し、各ワーカーは mmap で
+読み取り専用に共有する。ワーカーはPythonオブジェクトとしてのコピーを持たないため、
+ワーカーを増やしてもメモリはほとんど増えない（ページキャッシュを共有する）
+
+ファイル構成（リトルエンディアン）:
+    ヘッダー        : マジック(8) + 形式バージョン(u32) + セクション数(u32)
+                      + 文字列テーブル位置(u64) + 文字列テーブル長(u64)
+    セクション表    : セクション数 × (名前の文字列番号 u32, 予約 u32, 位置 u64, 長さ u64)
+    文字列テーブル  : 文字列数(u32) + 終端位置配列(u32 × 文字列数) + UTF-8本体
+    データ本体      : 各セクションのバイト列（8バイト境界に整列）
+
+meta セクションには他の全セクションのSHA-256（checksum）を格納し、
+読み込み時に破損や書きかけのファイルを検出できるようにしている
+
+コピー無しで共有できるのは、公開ページの配信に使う html / html.gz（バイト列をそのまま返す）だけ。
+catalog.json / skills.json は固定長レコードに詰めずJSONのまま格納しており、管理API・部分更新で
+使うワーカーがそれぞれデコードしてPythonオブジェクトとして保持する（load_json() の memo）。
+管理APIは辞書・リストとして引くため、固定長レイアウトにしてもその時点で展開が必要になり、
+節約できるのは管理機能を使ったワーカーの分だけのため
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+MAGIC = b'ELTSNAP\x00'
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct('<8sIIQQ')
+_SECTION = struct.Struct('<IIQQ')
+_U32 = struct.Struct('<I')
+
+META_SECTION = 'meta'
+LATEST_POINTER = 'LATEST'
+
+
+class SnapshotFormatError(ValueError):
+    """スナップショットファイルの形式が不正"""
+
+
+def _align(offset: int, boundary: int = 8) -> int:
+    return (offset + boundary - 1) // boundary * boundary
+
+
+def _encode_string_table(strings: List[str]) -> bytes:
+    encoded = [s.encode('utf-8') for s in strings]
+    ends = []
+    position = 0
+    for item in encoded:
+        position += len(item)
+        ends.append(position)
+    parts = [_U32.pack(len(encoded))]
+    parts.extend(_U32.pack(end) for end in ends)
+    parts.extend(encoded)
+    return b''.join(parts)
+
+
+def _decode_string_table(buf, offset: int, length: int) -> List[str]:
+    count = _U32.unpack_from(buf, offset)[0]
+    ends_offset = offset + _U32.size
+    body_offset = ends_offset + _U32.size * count
+    if body_offset > offset + length:
+        raise SnapshotFormatError('文字列テーブルが破損しています')
+    strings = []
+    start = 0
+    for i in range(count):
+        end = _U32.unpack_from(buf, ends_offset + _U32.size * i)[0]
+        strings.append(bytes(buf[body_offset + start:body_offset + end]).decode('utf-8'))
+        start = end
+    return strings
+
+
+def _checksum(sections: Dict[str, Any]) -> str:
+    digest = hashlib.sha256()
+    for name in sorted(sections):
+        if name == META_SECTION:
+            continue
+        data = sections[name]
+        digest.update(name.encode('utf-8'))
+        digest.update(struct.pack('<Q', len(data)))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def content_version(sections: Dict[str, Any], length: int = 16) -> str:
+    """
+    セクションの内容から決まるバージョン（全セクションのSHA-256の先頭 length 文字）
+
+    どのセクションが変わってもバージョンが変わるため、バージョンをETagなどに使える
+    """
+    return _checksum(sections)[:length]
+
+
+def write_snapshot(path: Path, sections: Dict[str, bytes], meta: Dict[str, Any]) -> None:
+    """
+    スナップショットファイルを書き出す（一時ファイル経由で原子的に置き換える）
+
+    Args:
+        path: 出力先
+        sections: セクション名 → バイト列
+        meta: バージョンなどのメタ情報（JSONとして meta セクションに格納）
+    """
+    sections = dict(sections)
+    meta = dict(meta, checksum=_checksum(sections))
+    sections[META_SECTION] = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+    names = list(sections)
+
+    string_table = _encode_string_table(names)
+    directory_offset = _HEADER.size
+    string_table_offset = directory_offset + _SECTION.size * len(names)
+    data_offset = _align(string_table_offset + len(string_table))
+
+    entries = []
+    layout = []
+    position = data_offset
+    for index, name in enumerate(names):
+        data = sections[name]
+        entries.append(_SECTION.pack(index, 0, position, len(data)))
+        layout.append((position, data))
+        position = _align(position + len(data))
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=path.name, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(names), string_table_offset, len(string_table)))
+            f.write(b''.join(entries))
+            f.write(string_table)
+            for offset, data in layout:
+                f.write(b'\x00' * (offset - f.tell()))
+                f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class MappedSnapshot:
+    """
+    mmap で読み取り専用に開いたスナップショット
+
+    section() はコピーを作らない memoryview を返す
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self._sections = self._read_directory()
+        self.meta = json.loads(bytes(self.section(META_SECTION)).decode('utf-8'))
+        self._json_cache = {}
+        self._memo = {}
+
+    def _read_directory(self) -> Dict[str, tuple]:
+        buf = self._mmap
+        if len(buf) < _HEADER.size:
+            raise SnapshotFormatError('ヘッダーが不足しています')
+        magic, format_version, count, table_offset, table_length = _HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise SnapshotFormatError('スナップショットファイルではありません')
+        if format_version != FORMAT_VERSION:
+            raise SnapshotFormatError(f'未対応の形式バージョンです: {format_version}')
+        names = _decode_string_table(buf, table_offset, table_length)
+
+        sections = {}
+        for i in range(count):
+            name_index, _, offset, length = _SECTION.unpack_from(buf, _HEADER.size + _SECTION.size * i)
+            if name_index >= len(names) or offset + length > len(buf):
+                raise SnapshotFormatError('セクション表が破損しています')
+            sections[names[name_index]] = (offset, length)
+        return sections
+
+    def section(self, name: str) -> memoryview:
+        """セクションのバイト列をコピーせずに返す"""
+        offset, length = self._sections[name]
+        return self._view[offset:offset + length]
+
+    def section_names(self) -> Iterable[str]:
+        return self._sections.keys()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._sections
+
+    def __getattr__(self, name: str) -> Any:
+        # version / built_at / build_duration などのメタ情報を属性として参照できるようにする
+        meta = self.__dict__.get('meta')
+        if meta is not None and name in meta:
+            return meta[name]
+        raise AttributeError(name)
+
+    def verify(self) -> None:
+        """チェックサムを検証する（不一致なら SnapshotFormatError）"""
+        sections = {name: self.section(name) for name in self._sections}
+        if self.meta.get('checksum') != _checksum(sections):
+            raise SnapshotFormatError(f'チェックサムが一致しません: {self.path}')
+
+    def load_json(self, name: str) -> Optional[Any]:
+        """
+        JSONセクションを読み込む（存在しなければNone）
+
+        初回のみデコードし、以降は同じオブジェクトを返す（mmap の共有ではなくワーカーごとのコピー）。
+        公開ページの配信では呼ばれないため、管理機能を使ったワーカーだけがこのメモリを消費する
+        """
+        if name not in self._sections:
+            return None
+        if name not in self._json_cache:
+            self._json_cache[name] = json.loads(bytes(self.section(name)).decode('utf-8'))
+        return self._json_cache[name]
+
+    def memo(self, name: str, factory: Callable[[], Any]) -> Any:
+        """
+        スナップショットから作る派生データ（管理APIの索引など）を初回のみ作って保持する
+
+        スナップショットは読み取り専用のため、同じオブジェクトを使う限り作り直す必要はない
+        （同時に呼ばれた場合は二重に作られることがあるが、結果は同じ）
+        """
+        if name not in self._memo:
+            self._memo[name] = factory()
+        return self._memo[name]
+
+
+def publish_snapshot(path: Path) -> None:
+    """
+    同じディレクトリの LATEST ポインタを path に向ける（原子的に置き換える）
+    """
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=LATEST_POINTER, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(path.name)
+    os.replace(tmp_path, path.parent / LATEST_POINTER)
+
+
+def latest_snapshot_path(directory: Path) -> Optional[Path]:
+    """LATEST ポインタが指すスナップショットのパス（ポインタやファイルが無い場合はNone）"""
+    pointer = Path(directory) / LATEST_POINTER
+    try:
+        name = pointer.read_text(encoding='utf-8').strip()
+    except FileNotFoundError:
+        return None
+    path = pointer.parent / name
+    if not name or not path.exists():
+        return None
+    return path
+
+
+def latest_pointer_token(directory: Path) -> Optional[tuple]:
+    """
+    LATEST ポインタの識別値（publish_snapshot() のたびに変わる。ポインタが無ければNone）
+
+    ポインタは一時ファイルからの置き換えで公開するため、同じファイルを指し直した場合も変わる
+    """
+    try:
+        stat = (Path(directory) / LATEST_POINTER).stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns)
+
+
+def load_latest_snapshot(directory: Path) -> Optional[MappedSnapshot]:
+    """
+    LATEST ポインタが指すスナップショットを検証して開く
+
+    Returns:
+        MappedSnapshot（ポインタやファイルが無い場合はNone）
+
+    Raises:
+        SnapshotFormatError: ファイルが破損している場合
+    """
+    path = latest_snapshot_path(directory)
+    if path is None:
+        return None
+    snapshot = MappedSnapshot(path)
+    snapshot.verify()
+    return snapshot
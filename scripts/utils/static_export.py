@@ -0,0 +1,166 @@
+"""
+静的サイト書き出し（freeze）
+
+事前描画したトップページとカタログJSON、static/ 配下の資産を1つのディレクトリに
+書き出し、PythonやPostgreSQLを介さずに静的ホスティング（CDN）から配信できるようにする
+
+出力構成:
+    index.html / index.html.gz     JS/CSSの参照をフィンガープリント付きに書き換えたHTML
+    data/catalog.<version>.json    バージョン付きカタログJSON
+    static/                        static/ 配下のコピー（JS/CSSはフィンガープリント付きも配置）
+    version.json                   バージョン・構築日時・カタログJSONのパス
+
+ビルドは <出力先>.builds/ 配下に書き出し、出力先のシンボリックリンクを原子的に差し替えて公開する
+（直前のビルドは配信中のリクエストのために1つだけ残す）
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+
+# HTML内で参照される /static/ 配下のJS/CSS
+_ASSET_REF_PATTERN = re.compile(r'((?:src|href)=")/static/([^"?#]+\.(?:js|css))(")')
+
+
+def _fingerprint_assets(html: str, static_dir: Path, output_static_dir: Path) -> Tuple[str, Dict[str, str]]:
+    """
+    HTMLが参照するJS/CSSをハッシュ付きのファイル名でコピーし、参照を書き換える
+
+    Service Workerなど、HTMLから参照されない資産は元のパスのまま残す
+    """
+    renamed = {}
+
+    def replace(match):
+        rel_path = match.group(2)
+        if rel_path not in renamed:
+            source = static_dir / rel_path
+            if not source.exists():
+                return match.group(0)
+            digest = hashlib.sha256(source.read_bytes()).hexdigest()[:10]
+            fingerprinted = str(Path(rel_path).with_name(f'{source.stem}.{digest}{source.suffix}').as_posix())
+            target = output_static_dir / fingerprinted
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(source, target)
+            renamed[rel_path] = fingerprinted
+        return f'{match.group(1)}/static/{renamed[rel_path]}{match.group(3)}'
+
+    return _ASSET_REF_PATTERN.sub(replace, html), renamed
+
+
+def _link_target(path: Path) -> Optional[Path]:
+    """シンボリックリンクが指すディレクトリ（リンクでなければNone）"""
+    if not path.is_symlink():
+        return None
+    return (path.parent / os.readlink(path)).resolve()
+
+
+def _swap_into_place(build_dir: Path, output_dir: Path) -> None:
+    """
+    出力先を build_dir に切り替える
+
+    出力先のシンボリックリンクを一時リンクとの os.replace で差し替えるため、
+    出力先が存在しない瞬間は無い。シンボリックリンクを作れない環境や、出力先が
+    通常のディレクトリ（旧形式）の場合は、古いビルドを退避してから新しいビルドを移し、
+    移動に失敗したら退避したビルドを戻す
+    """
+    link_tmp = output_dir.with_name(output_dir.name + '.link.tmp')
+    if link_tmp.is_symlink() or link_tmp.exists():
+        link_tmp.unlink()
+    try:
+        os.symlink(os.path.relpath(build_dir, output_dir.parent), link_tmp, target_is_directory=True)
+    except (OSError, NotImplementedError):
+        link_tmp = None
+
+    if link_tmp is not None and (output_dir.is_symlink() or not output_dir.exists()):
+        os.replace(link_tmp, output_dir)
+        return
+
+    # 初回（出力先がまだ無い）は退避するものが無い
+    old_dir = output_dir.with_name(output_dir.name + '.old') if output_dir.exists() else None
+    if old_dir is not None:
+        if old_dir.exists():
+            shutil.rmtree(old_dir)
+        output_dir.rename(old_dir)
+    try:
+        if link_tmp is not None:
+            os.replace(link_tmp, output_dir)
+        else:
+            build_dir.rename(output_dir)
+    except Exception:
+        if old_dir is not None:
+            old_dir.rename(output_dir)
+        raise
+    if old_dir is not None:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def export_static_site(
+    output_dir: Path,
+    html: bytes,
+    catalog_json: bytes,
+    version: str,
+    built_at: str,
+    static_dir: Path
+) -> Dict[str, str]:
+    """
+    静的サイトを書き出す
+
+    新しいビルドのディレクトリに全体を書き出してから出力先を切り替えるため、
+    書き出し途中の不完全な状態や、出力先が存在しない状態が配信されることはない
+
+    Args:
+        output_dir: 出力先ディレクトリ
+        html: 事前描画済みのトップページ
+        catalog_json: カタログJSON
+        version: スナップショットのバージョン
+        built_at: 構築日時
+        static_dir: コピー元の static/ ディレクトリ
+
+    Returns:
+        version.json の内容
+    """
+    output_dir = Path(output_dir)
+    builds_dir = output_dir.with_name(output_dir.name + '.builds')
+    builds_dir.mkdir(parents=True, exist_ok=True)
+    work_dir = Path(tempfile.mkdtemp(dir=str(builds_dir), prefix=f'{version}-'))
+    work_dir.chmod(0o755)  # mkdtemp は所有者のみ読み取り可で作るため
+    previous = _link_target(output_dir)
+
+    try:
+        output_static_dir = work_dir / 'static'
+        shutil.copytree(static_dir, output_static_dir)
+
+        page, renamed = _fingerprint_assets(html.decode('utf-8'), Path(static_dir), output_static_dir)
+        page_bytes = page.encode('utf-8')
+        (work_dir / 'index.html').write_bytes(page_bytes)
+        (work_dir / 'index.html.gz').write_bytes(gzip.compress(page_bytes, compresslevel=9))
+
+        catalog_path = f'data/catalog.{version}.json'
+        (work_dir / 'data').mkdir()
+        (work_dir / catalog_path).write_bytes(catalog_json)
+
+        manifest = {
+            'version': version,
+            'built_at': built_at,
+            'catalog': catalog_path,
+            'assets': {f'static/{k}': f'static/{v}' for k, v in renamed.items()},
+        }
+        (work_dir / 'version.json').write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding='utf-8')
+
+        _swap_into_place(work_dir, output_dir)
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+
+    # 現在と直前のビルド以外を削除する
+    current = _link_target(output_dir)
+    for build in builds_dir.iterdir():
+        if build.resolve() not in (current, previous):
+            shutil.rmtree(build, ignore_errors=True)
+    return manifest
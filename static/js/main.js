@@ -1,7 +1,7 @@
 // ==========================================================================
 //  main.js - エリたま編成ジェネレーター メインJavaScript
 //  注意: このファイルより先にindex.htmlでJinja2変数が定義されている必要があります
-//  - ALL_ALIENS, ALIEN_SKILL_DATA, ALL_EFFECTS, S_SKILL_EFFECTS, ALIEN_EFFECTS
+//  - ALL_ALIENS, ALIEN_SKILL_DATA, ALL_EFFECTS, S_SKILL_EFFECTS, ALIEN_EFFECTS, SKILL_VERSIONS
 // ==========================================================================
 
 
@@ -168,6 +168,8 @@ function getCategoryDisplayName(category, effectType) {
 // ==========================================================================
 let isAdminMode = false;
 let pendingChanges = []; // 変更履歴: [{type: 'add'|'update'|'delete', skill_text: '...', effect_name: '...', data: {...}}]
+let expectedVersions = {}; // 編集を始めたスキルのversion: {skill_text: version}（適用時に他の管理者の変更を検出する）
+let pageSkillVersions = null; // ページのカタログのversion: {skill_text: version}（初回参照時にSKILL_VERSIONSから作る）
 
 // ==========================================================================
 //  アリーナモード関連のグローバル変数
@@ -5075,6 +5077,7 @@ async function logoutAdmin() {
         await fetch('/api/admin/logout', { method: 'POST' });
         isAdminMode = false;
         pendingChanges = [];
+        expectedVersions = {};
         updateAdminUI();
     } catch (error) {
         console.error('ログアウトエラー:', error);
@@ -5884,26 +5887,29 @@ async function openEffectReplaceModal(newEffectName) {
             const confirmMsg = `以下の効果を "${newEffectName}" に置換しますか？\n\n${Array.from(selectedTargets).join('\n')}`;
             if (!confirm(confirmMsg)) return;
 
+            // 選択した全効果を1回のリクエストでまとめて置換する
+            const renames = Array.from(selectedTargets).map(oldEffectName => ({
+                old_effect_name: oldEffectName,
+                new_effect_name: newEffectName,
+                skill_texts: skillTextsMap.get(oldEffectName) || []
+            }));
             let totalUpdated = 0;
-            for (const oldEffectName of selectedTargets) {
-                const skillTexts = skillTextsMap.get(oldEffectName) || [];
-                try {
-                    const response = await fetch('/api/admin/dictionary/mass-update', {
-                        method: 'POST',
-                        headers: { 'Content-Type': 'application/json' },
-                        body: JSON.stringify({
-                            old_effect_name: oldEffectName,
-                            new_effect_name: newEffectName,
-                            skill_texts: skillTexts
-                        })
-                    });
-                    const data = await response.json();
-                    if (data.success) {
-                        totalUpdated += data.updated_count || 0;
-                    }
-                } catch (error) {
-                    console.error(`置換エラー (${oldEffectName}):`, error);
+            try {
+                const response = await fetch('/api/admin/dictionary/bulk-rename', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ renames })
+                });
+                const data = await response.json();
+                if (!data.success) {
+                    alert(`置換に失敗しました: ${data.error}`);
+                    return;
                 }
+                totalUpdated = data.updated_count || 0;
+            } catch (error) {
+                console.error('置換エラー:', error);
+                alert('置換に失敗しました');
+                return;
             }
 
             alert(`${totalUpdated}件の置換が完了しました。ページをリロードします。`);
@@ -6231,8 +6237,64 @@ function addPendingChange(change) {
     }
 
     pendingChanges.push(change);
+    recordSkillVersion(change.skill_text);
     updateAdminUI(true); // pendingChangesの表示のみ更新（再描画スキップ）
 }
+
+/**
+ * 適用で返されたversionを再読み込み後に引き継ぐ（sessionStorageに {skill_text: version} で保存）
+ */
+function rememberAppliedVersions(versions) {
+    const applied = JSON.parse(sessionStorage.getItem('appliedSkillVersions') || '{}');
+    Object.assign(applied, versions || {});
+    sessionStorage.setItem('appliedSkillVersions', JSON.stringify(applied));
+}
+
+/**
+ * ページのカタログ（ALIEN_EFFECTSと同じスナップショット）に含まれるスキルのversion
+ *
+ * 自分が適用した後のversionの方が新しければそちらを使う（ページのカタログが
+ * 適用前のものだった場合に、続けて同じスキルを編集すると誤って競合になるため）
+ */
+function getPageSkillVersion(skillText) {
+    if (pageSkillVersions === null) {
+        pageSkillVersions = {};
+        const slots = [
+            ['skill_text1', 'skill_id1'], ['skill_text2', 'skill_id2'],
+            ['skill_text3', 'skill_id3'], ['s_skill_text', 's_skill_id']
+        ];
+        Object.values(ALL_ALIENS).forEach(alien => {
+            slots.forEach(([textKey, idKey]) => {
+                const version = SKILL_VERSIONS[String(alien[idKey])];
+                if (alien[textKey] && version !== undefined) {
+                    pageSkillVersions[alien[textKey]] = version;
+                }
+            });
+        });
+        const applied = JSON.parse(sessionStorage.getItem('appliedSkillVersions') || '{}');
+        Object.entries(applied).forEach(([text, version]) => {
+            if (pageSkillVersions[text] === undefined || pageSkillVersions[text] < version) {
+                pageSkillVersions[text] = version;
+            } else {
+                delete applied[text]; // ページのカタログに反映済み
+            }
+        });
+        sessionStorage.setItem('appliedSkillVersions', JSON.stringify(applied));
+    }
+    return pageSkillVersions[skillText];
+}
+
+/**
+ * スキルの編集を始めた時点のversionを記録（2回目以降の編集では記録し直さない）
+ *
+ * 編集画面はページに埋め込まれたALIEN_EFFECTSを表示しているため、versionも同じ
+ * カタログの値を使う（ページ読み込み後の他の管理者の変更も競合として検出される）
+ */
+function recordSkillVersion(skillText) {
+    if (!skillText || skillText in expectedVersions) return;
+    const version = getPageSkillVersion(skillText);
+    expectedVersions[skillText] = version === undefined ? null : version;
+}
 /**
  * 変更を一括でDBに適用
  */
@@ -6358,10 +6420,25 @@ async function applyChangesInternal() {
             return { success: true, applied_count: 0, change_details: [] };
         }
 
+        // versionが分からないスキルは競合を検出できないため適用しない
+        const changedSkillTexts = [...new Set(skillChanges.map(c => c.skill_text))];
+        const unknownVersions = changedSkillTexts.filter(skillText =>
+            expectedVersions[skillText] === undefined || expectedVersions[skillText] === null);
+        if (unknownVersions.length > 0) {
+            alert('編集を始めた時点のversionが分からないスキルがあるため適用できません。再読み込みしてください\n\n'
+                + unknownVersions.join('\n'));
+            return { success: false, error: 'versionが不明なスキルがあります' };
+        }
+
         const response = await fetch('/api/admin/apply-changes', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ changes: skillChanges })
+            body: JSON.stringify({
+                changes: skillChanges,
+                expected_versions: Object.fromEntries(
+                    changedSkillTexts.map(skillText => [skillText, expectedVersions[skillText]])
+                )
+            })
         });
         const data = await response.json();
 
@@ -6383,6 +6460,9 @@ async function applyChangesInternal() {
         const content = document.getElementById('apply-changes-content');
 
         if (data.success) {
+            // 適用後のversionを再読み込み後の編集の基準にする
+            rememberAppliedVersions(data.versions);
+
             // 成功メッセージをUI表示
             if (overlay && container && content) {
                 const typeMap = { add: '追加', update: '更新', delete: '削除', dictionary_update: '辞書更新' };
@@ -6457,7 +6537,14 @@ async function applyChangesInternal() {
             // エラーメッセージをUI表示
             if (overlay && container && content) {
                 let errorDetailHtml = '';
-                if (data.change_details && data.change_details.length > 0) {
+                if (data.stale && data.stale.length > 0) {
+                    // 他の管理者が先に変更したスキル
+                    data.stale.forEach(stale => {
+                        errorDetailHtml += `<div style="border: 1px solid #f87171; padding: 0.8vh; margin-bottom: 0.5vh; border-radius: 0.3vh; background-color: #2a3a4a;">`;
+                        errorDetailHtml += `<div style="font-size: 1.3vh; color: #f87171;">${stale.skill_text}</div>`;
+                        errorDetailHtml += `</div>`;
+                    });
+                } else if (data.change_details && data.change_details.length > 0) {
                     data.change_details.forEach((detail, index) => {
                         if (!detail.success) {
                             errorDetailHtml += `<div style="border: 1px solid #f87171; padding: 0.8vh; margin-bottom: 0.5vh; border-radius: 0.3vh; background-color: #2a3a4a;">`;
@@ -0,0 +1,29 @@
+"""
+テスト共通設定
+
+scripts/ 配下のモジュールは scripts/ をパスに追加して読み込む（各スクリプトの実行時と同じ）。
+PostgreSQL を使うテストは TEST_DATABASE_URL を設定した場合のみ実行する
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(PROJECT_ROOT / 'scripts'))
+
+
+@pytest.fixture
+def pg_conn():
+    """TEST_DATABASE_URL のPostgreSQLへの接続（未設定ならスキップ）"""
+    dsn = os.environ.get('TEST_DATABASE_URL')
+    if not dsn:
+        pytest.skip('TEST_DATABASE_URL が設定されていません')
+    psycopg2 = pytest.importorskip('psycopg2')
+    conn = psycopg2.connect(dsn)
+    try:
+        yield conn
+    finally:
+        conn.close()
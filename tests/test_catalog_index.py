@@ -0,0 +1,38 @@
+from utils.catalog_index import CatalogIndex
+
+
+def _catalog(all_effects, s_skill_effects=()):
+    return {
+        'all_aliens': {
+            '1': {'id': 1, 'name': 'A', 'skill_text1': 'skill-a', 'skill_text2': 'なし',
+                  'skill_text3': None, 's_skill_text': 'special-a'},
+        },
+        'alien_effects': {'1': {'1': [{'effect_name': '攻撃力UP'}]}},
+        'all_effects': list(all_effects),
+        's_skill_effects': list(s_skill_effects),
+    }
+
+
+def _entry(name, category, effect_type='buff'):
+    return {'correct_effect_names': name, 'effect_type': effect_type, 'category': category}
+
+
+def test_effect_options_with_null_category():
+    index = CatalogIndex(_catalog(
+        [_entry('攻撃力UP', None), _entry('攻撃力UP', 'ATK')],
+        [_entry('攻撃力UP', 'S_SKILL_ATK')],
+    ))
+    assert [o['category'] for o in index.effect_options('攻撃力UP')] == ['ATK', 'S_SKILL_ATK', None]
+
+
+def test_effect_options_unknown_name():
+    assert CatalogIndex(_catalog([])).effect_options('未登録') == []
+
+
+def test_skill_lookups():
+    index = CatalogIndex(_catalog([]))
+    assert index.is_special_skill('special-a')
+    assert not index.is_special_skill('skill-a')
+    assert index.aliens_using('skill-a') == [{'id': 1, 'name': 'A'}]
+    assert index.aliens_using('なし') == []
+    assert index.skills_with_effect('攻撃力UP') == {'skill-a': 1}
@@ -0,0 +1,102 @@
+import json
+
+import pytest
+
+from import_effects_jsonl import Importer, normalize_record
+
+BACKUP_FILE = 'backups/skill_list_fixed.jsonl'
+
+
+def test_normalize_record_keeps_empty_strings():
+    values = dict(zip(
+        ('skill_text', 'effect_name', 'effect_type', 'category', 'condition_target',
+         'requires_awakening', 'target', 'has_requirement', 'requirement_details', 'requirement_count'),
+        normalize_record({
+            'skill_text': ' スキル ', 'effect_name': '攻撃力UP', 'target': '',
+            'has_requirement': False, 'requirement_details': '', 'requirement_count': 1,
+        })
+    ))
+    assert values['skill_text'] == 'スキル'
+    assert values['target'] == ''
+    assert values['requirement_details'] == ''
+    assert values['condition_target'] is None
+
+
+def test_normalize_record_rejects_empty_keys():
+    with pytest.raises(ValueError):
+        normalize_record({'skill_text': '', 'effect_name': '攻撃力UP'})
+
+
+@pytest.fixture
+def effects_table(pg_conn):
+    """本番のテーブルを隠す一時テーブル skill_text_verified_effects（接続を閉じると消える）"""
+    with pg_conn.cursor() as cur:
+        cur.execute("""
+            CREATE TEMP TABLE skill_text_verified_effects (
+                id BIGSERIAL PRIMARY KEY,
+                skill_text TEXT NOT NULL,
+                effect_name TEXT NOT NULL,
+                effect_type TEXT,
+                category TEXT,
+                condition_target TEXT,
+                requires_awakening BOOLEAN,
+                target TEXT,
+                has_requirement BOOLEAN DEFAULT FALSE,
+                requirement_details TEXT,
+                requirement_count INTEGER
+            )
+        """)
+    pg_conn.commit()
+    return pg_conn
+
+
+def _import(conn, path):
+    importer = Importer([path])
+    with conn.cursor() as cur:
+        importer.load(cur)
+        assert importer.errors == []
+        deleted, inserted, _ = importer.merge(cur)
+    conn.commit()
+    return deleted, inserted
+
+
+def test_export_then_import_makes_no_changes(effects_table, tmp_path):
+    from run_automated_update import export_skill_list_backup
+
+    conn = effects_table
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO skill_text_verified_effects
+                (skill_text, effect_name, effect_type, category, condition_target,
+                 requires_awakening, target, has_requirement, requirement_details, requirement_count)
+            VALUES
+                ('s1', '攻撃力UP', 'buff', 'ATK', NULL, FALSE, '', FALSE, NULL, NULL),
+                ('s1', '攻撃力UP', 'buff', 'ATK', NULL, FALSE, '', FALSE, NULL, NULL),
+                ('s1', '防御力DOWN', 'debuff', 'DEF', '敵', TRUE, '全体', FALSE, '', 1),
+                ('s2', 'HP回復', 'heal', NULL, '', NULL, NULL, TRUE, 'a:3', 2)
+        """)
+    conn.commit()
+
+    exported = tmp_path / 'skill_list.jsonl'
+    export_skill_list_backup(conn, exported)
+    assert _import(conn, exported) == (0, 0)
+
+    # 1行だけ変えたファイルは、そのキーの行だけを置き換える
+    lines = [json.loads(line) for line in exported.read_text(encoding='utf-8').splitlines()]
+    lines[-1]['target'] = '味方'
+    changed = tmp_path / 'changed.jsonl'
+    changed.write_text(''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in lines), encoding='utf-8')
+    assert _import(conn, changed) == (1, 1)
+
+
+def test_backup_round_trip_makes_no_changes(effects_table, tmp_path):
+    from run_automated_update import PROJECT_ROOT, export_skill_list_backup
+
+    conn = effects_table
+    backup = PROJECT_ROOT / BACKUP_FILE
+    deleted, inserted = _import(conn, backup)
+    assert deleted == 0 and inserted > 0
+
+    exported = tmp_path / 'skill_list.jsonl'
+    export_skill_list_backup(conn, exported)
+    assert _import(conn, exported) == (0, 0)
@@ -0,0 +1,70 @@
+import json
+import os
+
+import pytest
+
+from utils import static_export
+from utils.static_export import export_static_site
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    static = tmp_path / 'static'
+    (static / 'js').mkdir(parents=True)
+    (static / 'js' / 'main.js').write_text('console.log(1);', encoding='utf-8')
+    return static
+
+
+def _export(output_dir, static_dir, version):
+    html = b'<html><script src="/static/js/main.js"></script></html>'
+    return export_static_site(output_dir, html, b'{}', version, '2026-01-01T00:00:00', static_dir)
+
+
+def _read_version(output_dir):
+    return json.loads((output_dir / 'version.json').read_text(encoding='utf-8'))['version']
+
+
+def test_freeze_into_fresh_directory(tmp_path, static_dir):
+    output_dir = tmp_path / 'dist'
+    manifest = _export(output_dir, static_dir, 'v1')
+    assert output_dir.is_symlink()
+    assert _read_version(output_dir) == 'v1'
+    assert (output_dir / manifest['catalog']).exists()
+
+
+def test_freeze_replaces_previous_build(tmp_path, static_dir):
+    output_dir = tmp_path / 'dist'
+    _export(output_dir, static_dir, 'v1')
+    _export(output_dir, static_dir, 'v2')
+    _export(output_dir, static_dir, 'v3')
+    assert _read_version(output_dir) == 'v3'
+    # 現在と直前のビルドだけを残す
+    assert len(list((tmp_path / 'dist.builds').iterdir())) == 2
+
+
+@pytest.fixture
+def no_symlinks(monkeypatch):
+    def fail(*args, **kwargs):
+        raise OSError('symlinks are not supported')
+    monkeypatch.setattr(static_export.os, 'symlink', fail)
+
+
+def test_freeze_into_fresh_directory_without_symlinks(tmp_path, static_dir, no_symlinks):
+    output_dir = tmp_path / 'dist'
+    _export(output_dir, static_dir, 'v1')
+    assert output_dir.is_dir() and not output_dir.is_symlink()
+    assert _read_version(output_dir) == 'v1'
+
+    _export(output_dir, static_dir, 'v2')
+    assert _read_version(output_dir) == 'v2'
+    assert not (tmp_path / 'dist.old').exists()
+
+
+def test_legacy_directory_is_replaced_by_symlink(tmp_path, static_dir):
+    output_dir = tmp_path / 'dist'
+    output_dir.mkdir()
+    (output_dir / 'stale.txt').write_text('old', encoding='utf-8')
+    _export(output_dir, static_dir, 'v1')
+    assert output_dir.is_symlink()
+    assert not (output_dir / 'stale.txt').exists()
+    assert os.path.exists(output_dir / 'index.html.gz')